@@ -0,0 +1,97 @@
+"""
+Synthetic tables of various shapes, written as CSV files or loaded into the SQLite stand-in database
+"""
+import os
+import numpy as np
+import pandas as pd
+
+SHAPES = ('narrow', 'wide', 'dates')
+_MISSING_RATE = 0.05
+
+
+def make_table(shape, num_rows, seed=0):
+    """
+    Synthetic table
+    - narrow: a few integer, float, boolean and text variables
+    - wide: 200 numeric and text variables
+    - dates: mostly date and timestamp variables, as text
+    Variables other than ID have missing values
+    :param shape: 'narrow', 'wide' or 'dates'
+    :param num_rows:
+    :param seed:
+    :return: (pandas.DataFrame, dict of SQL types by variable name)
+    """
+    rng = np.random.RandomState(seed)
+    columns = [('ID', np.arange(num_rows), 'INTEGER')]
+    if shape == 'narrow':
+        columns += [('AMOUNT', np.round(rng.lognormal(3, 1, num_rows), 2), 'FLOAT'),
+                    ('QUANTITY', rng.randint(0, 1000, num_rows), 'INTEGER'),
+                    ('IS_ACTIVE', rng.rand(num_rows) < 0.5, 'BOOLEAN'),
+                    ('ZIP', _codes(rng, num_rows, 5), 'VARCHAR(5)'),
+                    ('NAME', _words(rng, num_rows, 20), 'VARCHAR(20)')]
+    elif shape == 'wide':
+        columns += [('X{:03d}'.format(idx), np.round(rng.randn(num_rows), 4), 'FLOAT') for idx in range(100)]
+        columns += [('N{:03d}'.format(idx), rng.randint(0, 10 ** 6, num_rows), 'INTEGER') for idx in range(50)]
+        columns += [('C{:03d}'.format(idx), _codes(rng, num_rows, 8), 'VARCHAR(8)') for idx in range(50)]
+    elif shape == 'dates':
+        columns += [('D{}'.format(idx), _dates(rng, num_rows, '%Y-%m-%d'), 'DATE') for idx in range(6)]
+        columns += [('TS{}'.format(idx), _dates(rng, num_rows, '%Y-%m-%d %H:%M:%S'), 'TIMESTAMP') for idx in range(4)]
+        columns += [('AMOUNT', np.round(rng.lognormal(3, 1, num_rows), 2), 'FLOAT')]
+    else:
+        raise ValueError('Unknown shape: {}, should be any of {}'.format(shape, SHAPES))
+
+    df = pd.DataFrame(dict((name, values) for name, values, _ in columns), columns=[c[0] for c in columns])
+    for name in df.columns[1:]:
+        df[name] = df[name].astype(object).where(rng.rand(num_rows) >= _MISSING_RATE)
+    return df, dict((name, sql_type) for name, _, sql_type in columns)
+
+
+def write_csv(df, directory, name, num_files=1):
+    """
+    Write a table as CSV file(s), split by rows
+    :return: file pattern
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for idx, part in enumerate(np.array_split(np.arange(len(df)), num_files)):
+        df.iloc[part].to_csv(os.path.join(directory, '{}_{:03d}.csv'.format(name, idx)), index=False)
+    return os.path.join(directory, '{}_*.csv'.format(name))
+
+
+def load_table(conn, tbl_name, df, sql_types, chunksize=100000):
+    """
+    Create a table in the SQLite stand-in database and load a table into it
+    :param conn: SQLiteConnection
+    :param tbl_name: table name as [schema].[table]
+    """
+    create_table(conn, tbl_name, sql_types, list(df.columns))
+    backend_connection = conn.connect()
+    try:
+        for start in range(0, len(df), chunksize):
+            conn.copy_from(tbl_name, df.iloc[start:start + chunksize], backend_connection)
+        backend_connection.commit()
+    finally:
+        backend_connection.close()
+
+
+def create_table(conn, tbl_name, sql_types, var_name):
+    conn.create_schema(tbl_name.split('.')[0])
+    conn.execute('DROP TABLE IF EXISTS {}'.format(tbl_name))
+    conn.execute('CREATE TABLE {} ({})'.format(tbl_name, ', '.join(
+        ['"{}" {}'.format(v, sql_types[v]) for v in var_name])))
+
+
+def _codes(rng, num_rows, width):
+    """Numeric codes with leading zeros, e.g. zip codes"""
+    return pd.Series(rng.randint(0, 10 ** width, num_rows)).astype(str).str.zfill(width).values
+
+
+def _words(rng, num_rows, max_length):
+    letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    vocabulary = np.array([''.join(rng.choice(letters, rng.randint(3, max_length + 1))) for _ in range(1000)])
+    return vocabulary[rng.randint(0, len(vocabulary), num_rows)]
+
+
+def _dates(rng, num_rows, date_format):
+    seconds = rng.randint(0, 20 * 365 * 86400, num_rows).astype('m8[s]')
+    return pd.Series(np.datetime64('2000-01-01T00:00:00') + seconds).dt.strftime(date_format).values
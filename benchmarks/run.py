@@ -0,0 +1,159 @@
+"""
+Run the benchmark scenarios on synthetic data and compare the timings with a baseline
+
+Examples:
+    python benchmarks/run.py --sizes 10000 100000 --output results.json
+    python benchmarks/run.py --scenarios csv_read_all db_read_all --baseline baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Run from a checkout: the package is imported from the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from generators import SHAPES
+from scenarios import IMPORT_SCENARIOS, SCENARIOS, Environment, time_import
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+
+
+def run_benchmarks(scenarios, shapes, sizes, repeat, directory):
+    """
+    Time each scenario on tables of each shape and size
+    :return: list of results, one per scenario, shape and size
+    """
+    results = []
+    if not scenarios:
+        return results
+    for shape in shapes:
+        for num_rows in sizes:
+            env = Environment(os.path.join(directory, '{}_{}'.format(shape, num_rows)), shape, num_rows)
+            for name in scenarios:
+                setup, run = SCENARIOS[name]
+                times = []
+                num_rows_processed = None
+                for _ in range(repeat):
+                    state = setup(env)
+                    timer = time.perf_counter()
+                    num_rows_processed = run(state)
+                    times.append(time.perf_counter() - timer)
+                result = {'scenario': name, 'shape': shape, 'num_rows': num_rows, 'times': times,
+                          'min': min(times), 'median': float(np.median(times)),
+                          'num_rows_processed': int(num_rows_processed),
+                          'rows_per_second': num_rows / min(times) if min(times) > 0 else None}
+                results.append(result)
+                _print_result(result)
+    return results
+
+
+def run_import_benchmarks(scenarios, repeat):
+    """
+    Time each import scenario in fresh interpreters
+    :return: list of results, one per scenario
+    """
+    results = []
+    for name in scenarios:
+        times = [time_import(IMPORT_SCENARIOS[name]) for _ in range(repeat)]
+        result = {'scenario': name, 'shape': None, 'num_rows': None, 'times': times, 'min': min(times),
+                  'median': float(np.median(times)), 'num_rows_processed': None, 'rows_per_second': None}
+        results.append(result)
+        _print_result(result)
+    return results
+
+
+def compare(results, baseline, tolerance, min_difference=0.):
+    """
+    Compare median timings with a baseline
+    :param tolerance: relative slowdown above which a scenario is reported as a regression
+    :param min_difference: absolute slowdown (seconds) below which a scenario is not reported, as timings of short
+        scenarios are noisy
+    :return: comparison table, one row per scenario found in both results
+    """
+    baseline = dict(((r['scenario'], r['shape'], r['num_rows']), r) for r in baseline['results'])
+    rows = []
+    for r in results:
+        key = (r['scenario'], r['shape'], r['num_rows'])
+        if key not in baseline:
+            continue
+        ratio = r['median'] / baseline[key]['median'] if baseline[key]['median'] > 0 else float('nan')
+        is_significant = abs(r['median'] - baseline[key]['median']) >= min_difference
+        rows.append({'scenario': r['scenario'], 'shape': r['shape'], 'num_rows': r['num_rows'],
+                     'baseline': baseline[key]['median'], 'median': r['median'], 'ratio': ratio,
+                     'status': 'unchanged' if not is_significant else
+                     'regression' if ratio > 1 + tolerance else
+                     'improvement' if ratio < 1 / (1 + tolerance) else 'unchanged'})
+    return pd.DataFrame(rows, columns=['scenario', 'shape', 'num_rows', 'baseline', 'median', 'ratio', 'status'])
+
+
+def _print_result(result):
+    print('{:<26} {:<7} {:>9} rows  median {:8.3f}s  min {:8.3f}s'.format(
+        result['scenario'], result['shape'] or '-', result['num_rows'] or '-', result['median'], result['min']))
+
+
+def get_environment():
+    """Description of the environment the benchmarks were run in"""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                         stderr=subprocess.STDOUT).decode().strip()
+    except Exception:
+        commit = None
+    return {'format_version': _FORMAT_VERSION, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'pandas': pd.__version__, 'numpy': np.__version__, 'cpu_count': os.cpu_count()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark pyetl data sources on synthetic data')
+    all_scenarios = sorted(SCENARIOS) + sorted(IMPORT_SCENARIOS)
+    parser.add_argument('--scenarios', nargs='+', default=all_scenarios, choices=all_scenarios)
+    parser.add_argument('--shapes', nargs='+', default=list(SHAPES), choices=SHAPES)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000], help='numbers of rows')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each scenario, the median is compared')
+    parser.add_argument('--output', help='JSON file the results are written to')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative slowdown above which a scenario is reported as a regression')
+    parser.add_argument('--min-difference', type=float, default=0.01,
+                        help='absolute slowdown (seconds) below which a scenario is not reported as a regression')
+    parser.add_argument('--directory', help='working directory of the synthetic data, by default a temporary one')
+    args = parser.parse_args(argv)
+
+    directory = args.directory or tempfile.mkdtemp(prefix='pyetl_benchmarks_')
+    try:
+        results = run_import_benchmarks([s for s in args.scenarios if s in IMPORT_SCENARIOS], args.repeat)
+        results += run_benchmarks([s for s in args.scenarios if s in SCENARIOS], args.shapes, args.sizes, args.repeat,
+                                  directory)
+    finally:
+        if args.directory is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    output = {'environment': get_environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(results, json.load(f), args.tolerance, args.min_difference)
+        with pd.option_context('display.width', 200, 'display.max_rows', None):
+            print(comparison.to_string(index=False, float_format='{:.3f}'.format))
+        if (comparison['status'] == 'regression').any():
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
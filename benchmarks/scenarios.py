@@ -0,0 +1,129 @@
+"""
+Benchmark scenarios. Each scenario prepares its inputs in a setup function, which is not timed, and runs the
+operation being measured, which returns the number of rows processed
+"""
+import glob
+import os
+import shutil
+import subprocess
+import sys
+from pyetl.datasource import FileDataSource
+from pyetl.utils.rowcount import rowcount
+from generators import make_table, write_csv, load_table, create_table
+from sqlite_backend import SQLiteConnection, SQLiteDataSource, SQLiteDictionary
+
+_CHUNK_SIZE = 50000
+_CREDENTIALS = ('bench', '')
+_REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TIME_IMPORT = """
+import sys, time
+sys.path.insert(0, sys.argv[1])
+timer = time.perf_counter()
+exec(sys.argv[2])
+print(time.perf_counter() - timer)
+"""
+
+
+class Environment(object):
+    """Inputs shared by the scenarios of a given table shape and size: CSV files and a database table"""
+
+    def __init__(self, directory, shape, num_rows, seed=0):
+        self.directory = directory
+        self.shape = shape
+        self.num_rows = num_rows
+        self.df, self.sql_types = make_table(shape, num_rows, seed=seed)
+        self.name = '{}_{}'.format(shape, num_rows).upper()
+        self.csv_pattern = write_csv(self.df, os.path.join(directory, 'csv'), self.name, num_files=4)
+        self.conn_params = {'database': os.path.join(directory, 'db')}
+        if not os.path.isdir(self.conn_params['database']):
+            os.makedirs(self.conn_params['database'])
+        self.conn = SQLiteConnection(credentials=_CREDENTIALS, conn_params=self.conn_params)
+        self.tbl_name = 'BENCH.' + self.name
+        load_table(self.conn, self.tbl_name, self.df, self.sql_types)
+        self.output_directory = os.path.join(directory, 'output')
+
+    def csv_source(self):
+        return FileDataSource('read-only', self.csv_pattern, None, _CHUNK_SIZE, infer_dictionary=True)
+
+    def db_source(self, tbl_name=None, access_mode='read-only'):
+        return SQLiteDataSource(access_mode, tbl_name or self.tbl_name, SQLiteDictionary(), _CHUNK_SIZE, None,
+                                conn_params=self.conn_params, credentials=_CREDENTIALS)
+
+    def clean_output(self):
+        shutil.rmtree(self.output_directory, ignore_errors=True)
+        os.makedirs(self.output_directory)
+
+
+def _count_rows(iterator):
+    return sum([len(df) for df in iterator])
+
+
+def _setup_csv(env):
+    return env.csv_source()
+
+
+def _setup_csv_write(env):
+    env.clean_output()
+    return env.df, FileDataSource('create', os.path.join(env.output_directory, 'out.csv'), None, _CHUNK_SIZE)
+
+
+def _setup_db(env):
+    return env.db_source()
+
+
+def _setup_db_write(env):
+    tbl_name = env.tbl_name + '_COPY'
+    create_table(env.conn, tbl_name, env.sql_types, list(env.df.columns))
+    return env.df, env.db_source(tbl_name, access_mode='append')
+
+
+def _setup_db_write_locations(env, num_locations=4):
+    # One schema, i.e. one SQLite file, per location, so that locations can be loaded concurrently
+    tbl_name = ['BENCH_P{}.{}'.format(idx, env.name) for idx in range(num_locations)]
+    for t in tbl_name:
+        create_table(env.conn, t, env.sql_types, list(env.df.columns))
+    return env.df, env.db_source(tbl_name, access_mode='append')
+
+
+def _run_get_uniques(ds):
+    var_name = ds.get_variable_names()
+    var_name = [v for v in var_name if ds.get_metadata().get_type(v) == 'TEXT'][:1] or [var_name[0]]
+    uniques, row_count, num_missing = ds.get_uniques(var_name[0])
+    return int(sum(row_count)) + num_missing
+
+
+# Scenarios: name -> (setup function, run function)
+SCENARIOS = dict([
+    ('csv_construct', (lambda env: env, lambda env: env.csv_source().size(0))),
+    ('csv_read_all', (_setup_csv, lambda ds: len(ds.read_all()[0]))),
+    ('csv_read_all_parallel', (_setup_csv, lambda ds: len(ds.read_all(num_workers=4)[0]))),
+    ('csv_data_iterator', (_setup_csv, lambda ds: _count_rows(ds.get_data_iterator()))),
+    ('csv_row_count', (lambda env: sorted(glob.glob(env.csv_pattern)),
+                       lambda files: rowcount(files) - len(files))),
+    ('csv_write', (_setup_csv_write, lambda args: args[1].write(args[0], index=False))),
+    ('db_construct', (lambda env: env, lambda env: env.db_source().size(0))),
+    ('db_read_all', (_setup_db, lambda ds: len(ds.read_all()[0]))),
+    ('db_data_iterator', (_setup_db, lambda ds: _count_rows(ds.get_data_iterator()))),
+    ('db_get_uniques', (_setup_db, _run_get_uniques)),
+    ('db_row_count', (lambda env: env, lambda env: env.conn.row_count(env.tbl_name))),
+    ('db_write', (_setup_db_write, lambda args: args[1].write(args[0], num_workers=1))),
+    ('db_write_locations', (_setup_db_write_locations, lambda args: args[1].write(args[0], num_workers=4))),
+])
+
+
+# Import scenarios: name -> statement, timed in a fresh interpreter
+IMPORT_SCENARIOS = dict([
+    ('import_datasource', 'import pyetl.datasource'),
+    ('import_connections', 'import pyetl.connections'),
+    ('import_file_datasource', 'from pyetl.datasource import FileDataSource'),
+    ('import_vertica_datasource', 'from pyetl.datasource.vertica_datasource import VerticaDataSource'),
+])
+
+
+def time_import(statement):
+    """
+    Time an import statement in a fresh interpreter, where nothing is imported yet
+    :return: duration (seconds)
+    """
+    output = subprocess.check_output([sys.executable, '-c', _TIME_IMPORT, _REPOSITORY, statement])
+    return float(output.decode().strip().splitlines()[-1])
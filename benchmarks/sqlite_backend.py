@@ -0,0 +1,164 @@
+"""
+Local stand-in for a Vertica database, so that database data sources can be benchmarked without a cluster.
+
+Each schema is a SQLite database file of a directory, attached under the schema's name. The v_catalog.tables and
+v_catalog.columns system tables queried by VerticaConnection and VerticaDictionary are built from the SQLite schemas
+by each new connection. Vertica data sources, connections and dictionaries run on top of SQLite, except for the
+following substitutions:
+- SQLiteConnection.connect: SQLite connection to the schema files, with the v_catalog tables
+- SQLiteConnection.execute: statements are committed, as SQLite connections are not in autocommit mode
+- SQLiteConnection.copy_from: rows are inserted with executemany, SQLite has no COPY FROM STDIN
+- SQLiteConnection.row_count: accepts lists of tables and WHERE clauses, as database data sources pass them
+- SQLiteConnection.get_table_version: the row count, SQLite has no commit epochs
+- SQLiteDictionary.table_exist: accepts lists of tables, as database data sources pass them
+"""
+import glob
+import logging
+import os
+import re
+import sqlite3
+import numpy as np
+import pandas as pd
+from pyetl.connections.core import _auto_open_close
+from pyetl.connections.vertica_connection import VerticaConnection
+from pyetl.datasource.vertica_datasource import VerticaDataSource
+from pyetl.dictionary.vertica_dictionary import VerticaDictionary
+
+logger = logging.getLogger(__name__)
+
+_CATALOG_TABLES = """
+CREATE TABLE v_catalog.tables (table_schema TEXT, table_name TEXT, owner_name TEXT);
+CREATE TABLE v_catalog.columns (table_schema TEXT, table_name TEXT, column_name TEXT, data_type TEXT,
+    data_type_length INTEGER, ordinal_position INTEGER);
+"""
+# Length of the fixed-size types, as reported by Vertica
+_TYPE_LENGTHS = {'BOOLEAN': 1, 'INT': 8, 'INTEGER': 8, 'FLOAT': 8, 'DATE': 8, 'TIME': 8, 'TIMESTAMP': 8}
+
+
+class SQLiteConnection(VerticaConnection):
+    """
+    Connection to a directory of SQLite databases, one per schema, answering Vertica catalog queries
+
+    Example:
+    ```python
+    conn = SQLiteConnection(credentials=('bench', ''), conn_params={'database': '/tmp/bench'})
+    conn.create_schema('BENCH')
+    conn.execute('CREATE TABLE BENCH.T (ID INTEGER, NAME VARCHAR(20))')
+    conn.fetch('SELECT column_name, data_type FROM v_catalog.columns')
+    ```
+    """
+    _conn_params = {'database': '.'}
+
+    def connect(self):
+        directory = self._conn_params['database']
+        backend_connection = sqlite3.connect(os.path.join(directory, 'main.db'), timeout=60, check_same_thread=False)
+        for filename in sorted(glob.glob(os.path.join(directory, '*.db'))):
+            schema = os.path.splitext(os.path.basename(filename))[0]
+            if schema != 'main':
+                backend_connection.execute('ATTACH DATABASE ? AS "{}"'.format(schema), (filename,))
+        backend_connection.execute("ATTACH DATABASE ':memory:' AS v_catalog")
+        backend_connection.executescript(_CATALOG_TABLES)
+        _refresh_catalog(backend_connection)
+        # Read locks taken on the schemas are released, so that connections writing in parallel do not block
+        backend_connection.commit()
+        return backend_connection
+
+    def create_schema(self, schema):
+        """Create a schema, i.e. a database file attached by the next connections"""
+        sqlite3.connect(os.path.join(self._conn_params['database'], schema.upper() + '.db')).close()
+
+    @_auto_open_close
+    def execute(self, query):
+        self._backend_connection.execute(query)
+        self._backend_connection.commit()
+
+    def copy_from(self, tbl_name, df, backend_connection):
+        var_name = ', '.join(['"{}"'.format(v) for v in df.columns])
+        placeholders = ', '.join(['?'] * len(df.columns))
+        declared_types = _get_declared_types(backend_connection, tbl_name)
+        rows = zip(*_to_sql_values(df, [declared_types.get(v.upper()) for v in df.columns]))
+        backend_connection.executemany('INSERT INTO {} ({}) VALUES ({})'.format(tbl_name, var_name, placeholders),
+                                       rows)
+        return len(df)
+
+    def row_count(self, tbl_name, where_clause=None):
+        """Row count of a table, or of each table of a list"""
+        if not isinstance(tbl_name, str):
+            where_clause = where_clause if where_clause is not None else [None] * len(tbl_name)
+            return [self.row_count(t, w) for t, w in zip(tbl_name, where_clause)]
+        query = 'SELECT COUNT(*) AS ROW_COUNT FROM {}'.format(tbl_name)
+        if where_clause:
+            query += ' WHERE {}'.format(where_clause)
+        return int(self.fetch(query)['ROW_COUNT'].values[0])
+
+    def get_table_version(self, tbl_name):
+        return [self.row_count(tbl_name)]
+
+
+class SQLiteDictionary(VerticaDictionary):
+    """Vertica dictionary whose existence checks accept lists of tables, as database data sources use them"""
+
+    def table_exist(self, conn, tbl_name):
+        if isinstance(tbl_name, str):
+            return super(SQLiteDictionary, self).table_exist(conn, tbl_name)
+        tables = conn.fetch('SELECT UPPER(table_schema || \'.\' || table_name) AS TABLE_NAME FROM v_catalog.tables')
+        return np.isin([t.upper() for t in tbl_name], tables['TABLE_NAME'].values)
+
+
+class SQLiteDataSource(SQLiteConnection, VerticaDataSource):
+    """
+    Vertica data source running on SQLite
+
+    Example:
+    ```python
+    ds = SQLiteDataSource('read-only', 'BENCH.T', SQLiteDictionary(), 10000, None,
+                          conn_params={'database': '/tmp/bench'}, credentials=('bench', ''))
+    df, _ = ds.read_all()
+    ```
+    """
+    pass
+
+
+def _refresh_catalog(backend_connection):
+    """Rebuild the v_catalog tables from the schemas of the SQLite databases"""
+    backend_connection.execute('DELETE FROM v_catalog.tables')
+    backend_connection.execute('DELETE FROM v_catalog.columns')
+    schemas = [row[1] for row in backend_connection.execute('PRAGMA database_list') if row[1] not in
+               ('main', 'temp', 'v_catalog')]
+    for schema in schemas:
+        tables = [row[0] for row in backend_connection.execute(
+            'SELECT name FROM "{}".sqlite_master WHERE type = \'table\''.format(schema))]
+        for table in tables:
+            backend_connection.execute('INSERT INTO v_catalog.tables VALUES (?, ?, ?)', (schema, table, 'bench'))
+            columns = backend_connection.execute('PRAGMA "{}".table_info("{}")'.format(schema, table)).fetchall()
+            backend_connection.executemany('INSERT INTO v_catalog.columns VALUES (?, ?, ?, ?, ?, ?)', [
+                (schema, table, c[1], c[2].lower(), _get_type_length(c[2]), c[0] + 1) for c in columns])
+
+
+def _get_type_length(data_type):
+    data_type = data_type.upper()
+    match = re.match(r'\w+\((\d+)', data_type)
+    if match:
+        return int(match.group(1))
+    return _TYPE_LENGTHS.get(data_type)
+
+
+def _get_declared_types(backend_connection, tbl_name):
+    schema, table = tbl_name.split('.')
+    columns = backend_connection.execute('PRAGMA "{}".table_info("{}")'.format(schema, table)).fetchall()
+    return dict((c[1].upper(), c[2].upper()) for c in columns)
+
+
+def _to_sql_values(df, declared_types=None):
+    """Columns of a table as lists of values SQLite can bind: datetimes as text, missing values as None"""
+    declared_types = declared_types or [None] * len(df.columns)
+    columns = []
+    for name, declared_type in zip(df.columns, declared_types):
+        var = df[name]
+        if pd.api.types.is_datetime64_any_dtype(var):
+            var = var.dt.strftime('%Y-%m-%d' if declared_type == 'DATE' else '%Y-%m-%d %H:%M:%S')
+        is_missing = var.isnull().values
+        values = var.astype(object).values.copy()
+        values[is_missing] = None
+        columns.append(values.tolist())
+    return columns
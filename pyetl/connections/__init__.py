@@ -1 +1,7 @@
-from .vertica_connection import VerticaConnection
+from pyetl.utils.lazy import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, [
+    ('.pool', ['ConnectionPool']),
+    ('.singleflight', ['SingleFlight']),
+    ('.vertica_connection', ['VerticaConnection']),
+])
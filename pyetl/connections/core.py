@@ -1,7 +1,11 @@
 import logging
+import time
 from copy import deepcopy
+import numpy as np
 import pandas as pd
+from pyetl import tracing
 from pyetl.credentials.core import Credentials
+from pyetl.utils.sql import normalize_query
 
 logger = logging.getLogger(__name__)
 
@@ -61,6 +65,8 @@ class Connection(object):
 
 def _auto_open_close(func):
     def wrapper(*args, **kwargs):
+        if tracing.is_enabled():
+            return _traced_call(func, *args, **kwargs)
         # Connect to the data source if necessary
         args[0].open()
         try:
@@ -74,10 +80,67 @@ def _auto_open_close(func):
     return wrapper
 
 
+def _traced_call(func, *args, **kwargs):
+    """
+    Call a function on an auto-opened connection, tracing the time spent connecting and executing the query. The
+    execution time includes the transfer of the results and their conversion to a table
+    """
+    fields = {'source': args[0].__class__.__name__}
+    if len(args) > 1 and isinstance(args[1], str):
+        fields['query_hash'] = tracing.query_hash(args[1])
+    with tracing.span(func.__name__, **fields) as event:
+        timer = time.time()
+        args[0].open()
+        event['connect_time'] = time.time() - timer
+        try:
+            timer = time.time()
+            result = func(*args, **kwargs)
+            event['server_time'] = time.time() - timer
+        finally:
+            args[0].close()
+        event.update(tracing.describe_table(result))
+    return result
+
+
+def _single_flight(func):
+    """Share the result of identical fetches in flight on the same database, see SingleFlight"""
+    def wrapper(self, query, **kwargs):
+        group = self.get_single_flight()
+        if group is None or kwargs.get('chunksize') is not None:
+            # Chunk iterators cannot be shared
+            return func(self, query, **kwargs)
+        key = (self._get_connection_key(), normalize_query(query), repr(sorted(kwargs.items())))
+        return group.do(key, func, self, query, **kwargs)
+    return wrapper
+
+
 class DbConnection(Connection):
+    _single_flight_group = None  # group sharing identical concurrent fetches, None to always execute them
+
     def __init__(self, *args, **kwargs):
         super(DbConnection, self).__init__(*args, **kwargs)
 
+    def get_single_flight(self):
+        return self._single_flight_group
+
+    def set_single_flight(self, group):
+        """
+        Set the group sharing the results of identical concurrent fetches. Fetches are not shared unless a group is
+        set, as a fetch joining an identical one started before a write would not see the write
+
+        Params:
+        =======
+        group: SingleFlight
+            Group of calls, e.g. with a memo window. None to always execute fetches
+        """
+        self._single_flight_group = group
+
+    def _get_connection_key(self):
+        """Identifies the database and the user, whose fetches can be shared"""
+        conn_params = dict(self._conn_params or {})
+        conn_params['user'] = self._credentials.get('user') if self._credentials is not None else None
+        return repr(sorted((k, v) for k, v in conn_params.items() if k != 'password'))
+
     def open(self):
         raise NotImplementedError()
 
@@ -87,6 +150,7 @@ class DbConnection(Connection):
     def _test(self):
         raise NotImplementedError()
 
+    @_single_flight
     @_auto_open_close
     def fetch(self, query):
         """
@@ -102,7 +166,7 @@ class DbConnection(Connection):
         out: pandas.DataFrame
             The result table
         """
-        return pd.read_sql(query, self._backend_connection).replace({None: pd.np.nan})
+        return pd.read_sql(query, self._backend_connection).replace({None: np.nan})
 
     @_auto_open_close
     def execute(self, query):
@@ -152,5 +216,53 @@ class DbConnection(Connection):
     def drop_tables(self, tables):
         raise NotImplementedError()
 
+    def connect(self):
+        """
+        Open a new backend connection, independent of the one opened by open(), e.g. for a ConnectionPool
+
+        Return:
+        =======
+        out: backend connection
+        """
+        raise NotImplementedError()
+
+    def copy_from(self, tbl_name, df, backend_connection):
+        """
+        Bulk insert a table into an existing database table. The transaction is not committed
+
+        Params:
+        =======
+        tbl_name: str
+            Name of the table to insert into
+        df: pandas.DataFrame
+            Data, whose columns are variables of the table
+        backend_connection:
+            Backend connection, e.g. from a ConnectionPool
+
+        Return:
+        =======
+        out: int
+            Number of rows inserted
+        """
+        raise NotImplementedError()
+
     def row_count(self, tbl_name, where_clause=None):
         raise NotImplementedError()
+
+    def get_table_version(self, tbl_name):
+        """
+        Cheap probe of the version of a table, which changes whenever the table is loaded, e.g. to invalidate cached
+        query results. By default, the row count of the table
+
+        Params:
+        =======
+        tbl_name: str
+            Name of the table
+
+        Return:
+        =======
+        out: list
+            Version of the table
+        """
+        query = 'SELECT COUNT(*) AS ROW_COUNT FROM {}'.format(tbl_name)
+        return [None if pd.isnull(v) else int(v) for v in self.fetch(query).iloc[0].values]
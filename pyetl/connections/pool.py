@@ -0,0 +1,121 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool(object):
+    """
+    CONNECTIONPOOL Pool of backend connections shared by threads
+
+    Connections are opened on demand, up to a maximum number, and reused once released. A thread asking for a
+    connection while all of them are in use waits for one to be released, so that the maximum number of connections
+    also caps the number of concurrent operations.
+
+    Example:
+    ```python
+    from pyetl.connections import ConnectionPool, VerticaConnection
+
+    conn = VerticaConnection(conn_params=params)
+    pool = ConnectionPool(conn.connect, max_size=4)
+    with pool.connection() as backend_connection:
+        backend_connection.cursor().execute('SELECT 1')
+    pool.close()
+    ```
+    """
+
+    # properties (Access = private)
+    _connect = None  # function opening a new backend connection
+    _max_size = 1
+    _idle = None  # connections which are open but not in use
+    _num_open = 0
+    _condition = None
+    _closed = False
+
+    # methods (Access = public)
+    def __init__(self, connect, max_size=4):
+        """
+        :param connect: function opening a new backend connection
+        :param max_size: maximum number of open connections
+        """
+        if int(max_size) < 1:
+            raise ValueError('The pool size should be at least 1: {}'.format(max_size))
+        self._connect = connect
+        self._max_size = int(max_size)
+        self._idle = []
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_max_size(self):
+        return self._max_size
+
+    def get_num_open(self):
+        return self._num_open
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with block. Connections released after an error are closed
+        rather than reused, as their state is unknown
+        """
+        backend_connection = self._acquire()
+        try:
+            yield backend_connection
+        except Exception:
+            self._release(backend_connection, discard=True)
+            raise
+        self._release(backend_connection)
+
+    def close(self):
+        """Close idle connections, and connections in use once they are released"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._num_open -= len(idle)
+            self._condition.notify_all()
+        for c in idle:
+            _close_quietly(c)
+
+    # methods (Access = private)
+    def _acquire(self):
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise ValueError('The connection pool is closed')
+                if len(self._idle):
+                    return self._idle.pop()
+                if self._num_open < self._max_size:
+                    # Opened below, outside of the lock
+                    self._num_open += 1
+                    break
+                self._condition.wait()
+        try:
+            return self._connect()
+        except Exception:
+            with self._condition:
+                self._num_open -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, backend_connection, discard=False):
+        with self._condition:
+            if discard or self._closed:
+                self._num_open -= 1
+            else:
+                self._idle.append(backend_connection)
+            self._condition.notify()
+        if discard or self._closed:
+            _close_quietly(backend_connection)
+
+
+def _close_quietly(backend_connection):
+    try:
+        backend_connection.close()
+    except Exception as e:
+        logger.debug('Could not close connection: {}'.format(e))
@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight(object):
+    """
+    SINGLEFLIGHT Share the execution of identical concurrent calls
+
+    A call made while an identical call (same key) is in flight waits for it and shares its result, or its error,
+    instead of being executed again. With a memo window, results are also reused by identical calls made shortly
+    after they completed. Each caller gets its own copy of shared tables.
+
+    Connections deduplicate their fetches once a group is set on them, e.g. the catalog and row count queries issued
+    by data sources constructed in parallel over the same tables. Copies of a connection share its group.
+
+    Example:
+    ```python
+    from pyetl.connections import SingleFlight, VerticaConnection
+
+    conn = VerticaConnection(conn_params=params)
+    # Reuse results for 5 seconds
+    conn.set_single_flight(SingleFlight(memo_ttl=5.))
+    ```
+    """
+
+    # properties (Access = private)
+    _memo_ttl = 0.  # seconds during which completed results are reused
+    _calls = None  # calls in flight, or memoized, by key
+    _lock = None
+    _num_executions = 0
+    _num_shared = 0
+
+    # methods (Access = public)
+    def __init__(self, memo_ttl=0.):
+        """
+        :param memo_ttl: seconds during which results are reused once their call has completed, 0 to share results
+            of calls in flight only
+        """
+        if memo_ttl < 0:
+            raise ValueError('The memo window should be positive: {}'.format(memo_ttl))
+        self._memo_ttl = memo_ttl
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._num_executions = 0
+        self._num_shared = 0
+
+    def __deepcopy__(self, memo):
+        # Copies of a connection share its group
+        return self
+
+    def get_memo_ttl(self):
+        return self._memo_ttl
+
+    def get_stats(self):
+        return {'executions': self._num_executions, 'shared': self._num_shared}
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Execute a function, unless an identical call is in flight (or memoized) whose result is then shared
+        :param key: hashable identifier of the call
+        :param function:
+        :return: result of the function
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.is_expired():
+                del self._calls[key]
+                call = None
+            if call is None:
+                call = self._calls[key] = _Call()
+                is_leader = True
+                self._num_executions += 1
+            else:
+                call.num_followers += 1
+                is_leader = False
+                self._num_shared += 1
+
+        if not is_leader:
+            logger.debug('Sharing the result of a call in flight: {}'.format(key))
+            return call.wait()
+
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self._forget(key, call)
+            call.fail(e)
+            raise
+        with self._lock:
+            is_shared = call.num_followers > 0 or self._memo_ttl > 0
+            if self._memo_ttl > 0:
+                call.expiry = time.time() + self._memo_ttl
+            else:
+                self._forget(key, call)
+        # The caller gets the result itself, others a copy of a snapshot taken before the caller can modify it
+        call.succeed(_copy(result) if is_shared else None)
+        return result
+
+    def forget(self, key=None):
+        """
+        Forget memoized results, so that the next calls are executed
+        :param key: call identifier, None for all calls
+        """
+        with self._lock:
+            if key is None:
+                self._calls = dict((k, c) for k, c in self._calls.items() if not c.is_done())
+            elif key in self._calls and self._calls[key].is_done():
+                del self._calls[key]
+
+    # methods (Access = private)
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+class _Call(object):
+    """Call in flight, or memoized"""
+
+    def __init__(self):
+        self.num_followers = 0
+        self.expiry = None
+        self._event = threading.Event()
+        self._result = None
+        self._error = None
+
+    def is_done(self):
+        return self._event.is_set()
+
+    def is_expired(self):
+        return self.expiry is not None and time.time() >= self.expiry
+
+    def succeed(self, result):
+        self._result = result
+        self._event.set()
+
+    def fail(self, error):
+        self._error = error
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return _copy(self._result)
+
+
+def _copy(result):
+    """Independent copy of a result, e.g. of a pandas.DataFrame"""
+    return result.copy() if hasattr(result, 'copy') else result
@@ -1,14 +1,10 @@
+import numpy as np
 import pandas as pd
 import logging
-from pyetl.connections.core import DbConnection, _auto_open_close
+from pyetl.connections.core import DbConnection, _auto_open_close, _single_flight
 
 logger = logging.getLogger(__name__)
 
-try:
-    import vertica_python as vpy
-except ImportError:
-    logger.warning("vertica_python is not installed. VerticaClient won't be available")
-
 
 class VerticaConnection(DbConnection):
     """
@@ -30,7 +26,15 @@ class VerticaConnection(DbConnection):
 
     # Abstract functions
     def open(self):
-        self._backend_connection = vpy.connect(**self._get_conn_parameters())
+        self._backend_connection = self.connect()
+
+    def connect(self):
+        # The driver is imported on the first connection only, as it is slow to import
+        try:
+            import vertica_python as vpy
+        except ImportError:
+            raise ImportError("vertica_python is not installed. VerticaConnection can't connect")
+        return vpy.connect(**self._get_conn_parameters())
 
     def close(self):
         self._backend_connection.close()
@@ -45,8 +49,8 @@ class VerticaConnection(DbConnection):
             return True
 
     # Connection specific functions
-    @_auto_open_close
-    def fetch(self, query, **kwargs):
+    @_single_flight
+    def fetch(self, query, chunksize=None, **kwargs):
         """
         Executes the 'query' and returns the result as a dataframe
 
@@ -54,14 +58,30 @@ class VerticaConnection(DbConnection):
         =======
         query: str
             Query to execute
-        chunksize
+        chunksize: int
+            Number of rows of each chunk, None to fetch all rows at once
 
         Return:
         =======
-        out: pandas.DataFrame
-            The result table
+        out: pandas.DataFrame or iterator of pandas.DataFrame
+            The result table, or its chunks if chunksize is set
         """
-        return pd.read_sql(query, self._backend_connection, **kwargs).replace({None: pd.np.nan})
+        if chunksize is not None:
+            # Chunks are read after fetch returns: they are streamed over a connection of their own
+            return self._fetch_chunks(query, int(chunksize), **kwargs)
+        return self._fetch(query, **kwargs)
+
+    @_auto_open_close
+    def _fetch(self, query, **kwargs):
+        return pd.read_sql(query, self._backend_connection, **kwargs).replace({None: np.nan})
+
+    def _fetch_chunks(self, query, chunksize, **kwargs):
+        backend_connection = self.connect()
+        try:
+            for df in pd.read_sql(query, backend_connection, chunksize=chunksize, **kwargs):
+                yield df.replace({None: np.nan})
+        finally:
+            backend_connection.close()
 
     @_auto_open_close
     def execute(self, query):
@@ -195,6 +215,39 @@ class VerticaConnection(DbConnection):
             except Exception as e:
                 logger.error('Could not drop table {}: {}'.format(t, e))
 
+    def copy_from(self, tbl_name, df, backend_connection):
+        """
+        Bulk insert a table with COPY FROM STDIN. The transaction is not committed
+
+        Params:
+        =======
+        tbl_name: str
+            Name of the table to insert into
+        df: pandas.DataFrame
+            Data, whose columns are variables of the table
+        backend_connection:
+            Backend connection, e.g. from a ConnectionPool
+
+        Return:
+        =======
+        out: int
+            Number of rows inserted
+        """
+        var_name = ', '.join(['"{}"'.format(v) for v in df.columns])
+        data = df.to_csv(None, header=False, index=False)
+        cur = backend_connection.cursor()
+        cur.copy("COPY {} ({}) FROM STDIN DELIMITER ',' ENCLOSED BY '\"' ABORT ON ERROR".format(tbl_name, var_name),
+                 data)
+        return len(df)
+
     def row_count(self, tbl_name, where_clause=None):
         query = 'SELECT COUNT(*) AS ROW_COUNT FROM {} WHERE {}'.format(tbl_name, where_clause)
         return sum(self.fetch(query)['ROW_COUNT'].values)
+
+    def get_table_version(self, tbl_name):
+        """
+        Version of a table: its row count and the epoch of its last commit, so that deletions followed by as many
+        insertions are detected
+        """
+        query = 'SELECT COUNT(*) AS ROW_COUNT, MAX(EPOCH) AS LAST_EPOCH FROM {}'.format(tbl_name)
+        return [None if pd.isnull(v) else int(v) for v in self.fetch(query).iloc[0].values]
@@ -1,2 +1,6 @@
-from .file_location import FilesystemLocation
-from .database_location import DatabaseLocation, DatabaseTableLocation, DatabaseQueryLocation
+from pyetl.utils.lazy import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, [
+    ('.file_location', ['FilesystemLocation', 'HIVE_DEFAULT_PARTITION']),
+    ('.database_location', ['DatabaseLocation', 'DatabaseTableLocation', 'DatabaseQueryLocation']),
+])
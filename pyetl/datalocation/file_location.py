@@ -1,20 +1,157 @@
 from pyetl.datalocation.core import DataLocation
+from pyetl.utils.filters import normalize_filters, evaluate_predicate
+from collections import OrderedDict
+from copy import deepcopy
+import fnmatch
 import os
-from glob import glob
+from glob import glob, has_magic
+
+try:
+    from urllib.parse import unquote
+except ImportError:
+    from urllib import unquote
+
+# Partitioned datasets listed so far, by (root directory, file pattern)
+_PARTITION_CACHE = {}
+# Directory name of the partition of missing key values
+HIVE_DEFAULT_PARTITION = '__HIVE_DEFAULT_PARTITION__'
 
 
 class FilesystemLocation(DataLocation):
     """FILECOLLECTION Data location as collection of files"""
 
+    # properties (Access = protected)
+    _partitioning = None  # None or 'hive'
+    _partitions = None  # for partitioned datasets, partition values of each file as dict
+
     # methods (Access = public)
-    def __init__(self, location):
-        """FILECOLLECTION Construct an instance of this class"""
+    def __init__(self, location, partitioning=None, file_pattern='*', refresh=False):
+        """
+        FILECOLLECTION Construct an instance of this class
+        :param location: file path(s), wildcards are accepted. With hive partitioning, dataset root directories
+        :param partitioning: None or 'hive' for key=value/ directory layouts
+        :param file_pattern: with hive partitioning, pattern of the data files within the partitions
+        :param refresh: with hive partitioning, list the partitions again instead of using the cached listing
+        """
         # Process the input location
         location = self._get_list_from_input(location)
         # If it contains wildcards, convert the input to an actual list of files
+        # Paths without wildcards are kept as they are so that files can be created
         parsed_location = []
         for l in location:
-            parsed_location.extend(glob(os.path.abspath(l)))
+            l = os.path.abspath(l)
+            parsed_location.extend(glob(l) if has_magic(l) else [l])
+
+        if partitioning is not None:
+            if partitioning != 'hive':
+                raise ValueError('Unsupported partitioning: {}'.format(partitioning))
+            files, partitions = [], []
+            for root in parsed_location:
+                for f, p in self._list_partitions(root, file_pattern, refresh):
+                    files.append(f)
+                    partitions.append(p)
+            parsed_location = files
+            self._partitions = partitions
+        self._partitioning = partitioning
 
         # Call the super constructor
         super(FilesystemLocation, self).__init__(parsed_location)
+
+        # Check that all files share the same partition keys
+        if self.is_partitioned() and len({tuple(p) for p in self._partitions}) > 1:
+            raise ValueError('Inconsistent partition keys: {}'.format({tuple(p) for p in self._partitions}))
+
+    def is_partitioned(self):
+        return self._partitioning is not None
+
+    def get_partition_keys(self):
+        """
+        Names of the partition keys, i.e. of the virtual variables defined by the directory layout
+        :return: keys
+        """
+        if not self.is_partitioned() or not len(self._partitions):
+            return []
+        return list(self._partitions[0])
+
+    def get_partitions(self):
+        """
+        Partition values of each file
+        :return: list of dict
+        """
+        return self._partitions if self.is_partitioned() else [{} for _ in range(self.size())]
+
+    def prune(self, filters):
+        """
+        Remove the files whose partition values do not satisfy the filters. Filters on variables which are not
+        partition keys are ignored
+        :param filters: list of (column, operator, value) tuples
+        :return: location
+        """
+        keys = set(self.get_partition_keys())
+        filters = [f for f in normalize_filters(filters) if f[0] in keys]
+        is_kept = [all([_partition_matches(p[c], op, v) for c, op, v in filters]) for p in self.get_partitions()]
+
+        location = deepcopy(self)
+        location._location = [l for l, k in zip(self._location, is_kept) if k]
+        if self.is_partitioned():
+            location._partitions = [p for p, k in zip(self._partitions, is_kept) if k]
+        return location
+
+    @staticmethod
+    def clear_partition_cache():
+        _PARTITION_CACHE.clear()
+
+    # methods (Access = private)
+    @staticmethod
+    def _list_partitions(root, file_pattern, refresh=False):
+        """
+        List the data files of a hive partitioned dataset along with their partition values. Listings are cached
+        :param root: dataset root directory
+        :param file_pattern:
+        :param refresh:
+        :return: list of (file, partition)
+        """
+        key = (root, file_pattern)
+        if refresh or key not in _PARTITION_CACHE:
+            files = []
+            for dirpath, dirnames, filenames in os.walk(root):
+                # Skip hidden and metadata directories and files (e.g. _SUCCESS, .crc)
+                dirnames[:] = sorted([d for d in dirnames if not d.startswith(('.', '_'))])
+                partition = _parse_partition_path(os.path.relpath(dirpath, root))
+                for f in sorted(fnmatch.filter(filenames, file_pattern)):
+                    if not f.startswith(('.', '_')):
+                        files.append((os.path.join(dirpath, f), partition))
+            _PARTITION_CACHE[key] = files
+        return _PARTITION_CACHE[key]
+
+
+def _parse_partition_path(path):
+    """Parse partition values from a relative path such as 'year=2020/month=01'"""
+    partition = OrderedDict()
+    if path == os.curdir:
+        return partition
+    for component in path.split(os.sep):
+        if '=' in component:
+            key, value = component.split('=', 1)
+            partition[unquote(key)] = _parse_partition_value(unquote(value))
+    return partition
+
+
+def _partition_matches(value, op, operand):
+    try:
+        return evaluate_predicate(value, op, operand)
+    except TypeError:
+        # Default partitions (None) or values that cannot be compared with the operand
+        return False
+
+
+def _parse_partition_value(value):
+    """Partition values are converted to numbers whenever possible"""
+    if value == HIVE_DEFAULT_PARTITION:
+        return None
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
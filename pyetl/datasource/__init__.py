@@ -1 +1,8 @@
-from .file_datasource import FileDataSource
+from pyetl.utils.lazy import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, [
+    ('.file_datasource', ['FileDataSource']),
+    ('.columnar_datasource', ['ColumnarFileDataSource']),
+    ('.fixedwidth_datasource', ['FixedWidthDataSource']),
+    ('.cache', ['QueryResultCache']),
+])
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pyetl.utils.files import replace_file
+from pyetl.utils.sql import normalize_query
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+except ImportError:
+    logger.warning("pyarrow is not installed. QueryResultCache won't be available")
+
+# Increase when the layout of cached results changes, so that existing entries are ignored
+_CACHE_VERSION = 1
+_EXTENSION = '.arrow'
+
+
+class QueryResultCache(object):
+    """
+    QUERYRESULTCACHE Local cache of query results
+
+    Results are stored in Arrow IPC files, one per query, keyed by the normalized query. Each entry records the
+    version of the table(s) it was read from, e.g. their row count: entries whose version no longer matches are
+    discarded. Cached results are read back chunk by chunk from memory-mapped files. The total size of the cache is
+    bounded, the least recently used entries being evicted first.
+
+    Entries are written while the results are streamed, and only kept once they have been read entirely. Cache
+    failures are logged but not raised: the cache is an optimization only.
+
+    Example:
+    ```python
+    from pyetl.datasource import QueryResultCache
+    from pyetl.datasource.vertica_datasource import VerticaDataSource
+
+    cache = QueryResultCache('~/.cache/pyetl/results', max_size=20 * 1024 ** 3)
+    ds = VerticaDataSource('read-only', 'MYSCHEMA.MYTABLE', dictionary, 100000, None, result_cache=cache)
+    for df in ds.get_data_iterator():
+        ...
+    ```
+    """
+
+    # properties (Access = private)
+    _directory = None
+    _max_size = 0  # bytes
+    _lock = None
+    _num_hits = 0
+    _num_misses = 0
+
+    # methods (Access = public)
+    def __init__(self, directory, max_size=10 * 1024 ** 3):
+        """
+        :param directory: directory of the cache files, created if needed
+        :param max_size: maximum total size of the cache files (bytes)
+        """
+        self._directory = os.path.abspath(os.path.expanduser(directory))
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+        self._max_size = int(max_size)
+        self._lock = threading.Lock()
+        self._num_hits = 0
+        self._num_misses = 0
+
+    def __repr__(self):
+        return 'QueryResultCache({}, {} entries, {} bytes)'.format(self._directory, self.get_num_entries(),
+                                                                    self.get_size())
+
+    def __deepcopy__(self, memo):
+        # Copies of a data source share its cache
+        return self
+
+    def get_directory(self):
+        return self._directory
+
+    def get_max_size(self):
+        return self._max_size
+
+    def get_size(self):
+        """Total size of the cache files (bytes)"""
+        return sum([size for _, size, _ in self._list_entries()])
+
+    def get_num_entries(self):
+        return len(self._list_entries())
+
+    def get_stats(self):
+        return {'hits': self._num_hits, 'misses': self._num_misses}
+
+    def get(self, query, version):
+        """
+        Cached results of a query
+        :param query:
+        :param version: version of the queried table(s), any JSON serializable value
+        :return: iterator of pandas.DataFrame, None if the query results are not cached or outdated
+        """
+        filename = self._get_filename(query)
+        reader = None
+        try:
+            reader = pa.ipc.open_file(pa.memory_map(filename, 'r'))
+            entry = dict((k.decode('utf-8'), v.decode('utf-8')) for k, v in (reader.schema.metadata or {}).items())
+        except (IOError, OSError):
+            entry = None
+        except Exception as e:
+            logger.warning('Could not read cached results {}: {}'.format(filename, e))
+            entry = None
+        if entry is not None and (entry.get('pyetl.cache_version') != str(_CACHE_VERSION) or
+                                  entry.get('pyetl.query') != normalize_query(query)):
+            entry = None
+        if entry is not None and entry.get('pyetl.version') != _serialize_version(version):
+            logger.debug('Cached results {} are outdated'.format(filename))
+            self._remove(filename)
+            entry = None
+        if entry is None:
+            with self._lock:
+                self._num_misses += 1
+            return None
+
+        with self._lock:
+            self._num_hits += 1
+        # Entries are evicted from the least recently used
+        _touch(filename)
+        logger.debug('Results read from cache {}'.format(filename))
+        return self._iter_batches(reader)
+
+    def put(self, query, version, chunks):
+        """
+        Cache the results of a query while they are streamed. The entry is kept only if the results are read entirely
+        :param query:
+        :param version: version of the queried table(s)
+        :param chunks: iterable of pandas.DataFrame
+        :return: iterator of the input chunks
+        """
+        filename = self._get_filename(query)
+        metadata = {'pyetl.cache_version': str(_CACHE_VERSION), 'pyetl.query': normalize_query(query),
+                    'pyetl.version': _serialize_version(version)}
+        fd, tmp_file = tempfile.mkstemp(suffix='.tmp', dir=self._directory)
+        os.close(fd)
+        writer = None
+        schema = None
+        is_complete = False
+        try:
+            for df in chunks:
+                if tmp_file is not None:
+                    try:
+                        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+                        if writer is None:
+                            schema = table.schema.with_metadata(metadata)
+                            writer = pa.ipc.new_file(tmp_file, schema)
+                        writer.write_table(table)
+                    except Exception as e:
+                        # Chunks whose types differ from the first chunk's cannot be stored in the same file
+                        logger.warning('Query results will not be cached: {}'.format(e))
+                        writer = _close_quietly(writer)
+                        self._remove(tmp_file)
+                        tmp_file = None
+                yield df
+            is_complete = True
+        finally:
+            if tmp_file is not None:
+                self._commit(writer, tmp_file, filename, is_complete)
+
+    def invalidate(self, query):
+        """Discard the cached results of a query"""
+        self._remove(self._get_filename(query))
+
+    def clear(self):
+        """Discard all cached results"""
+        for filename, _, _ in self._list_entries():
+            self._remove(filename)
+
+    # methods (Access = private)
+    def _get_filename(self, query):
+        key = hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()
+        return os.path.join(self._directory, key + _EXTENSION)
+
+    def _list_entries(self):
+        """Cache files, as (filename, size, last access time)"""
+        entries = []
+        for name in os.listdir(self._directory):
+            if not name.endswith(_EXTENSION):
+                continue
+            filename = os.path.join(self._directory, name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                # Evicted meanwhile
+                continue
+            entries.append((filename, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _commit(self, writer, tmp_file, filename, is_complete):
+        """Move a new entry in place once all results have been written, and evict entries beyond the maximum size"""
+        try:
+            if writer is not None:
+                writer.close()
+            # Results without any chunk are not cached, as there is no schema to store
+            if is_complete and writer is not None:
+                replace_file(tmp_file, filename)
+                self._evict()
+        except Exception as e:
+            logger.warning('Could not write cached results {}: {}'.format(filename, e))
+        finally:
+            if os.path.exists(tmp_file):
+                self._remove(tmp_file)
+
+    def _evict(self):
+        """Remove the least recently used entries until the cache fits in its maximum size"""
+        with self._lock:
+            entries = sorted(self._list_entries(), key=lambda e: e[2])
+            size = sum([e[1] for e in entries])
+            for filename, entry_size, _ in entries:
+                if size <= self._max_size:
+                    break
+                logger.debug('Evicting cached results {}'.format(filename))
+                self._remove(filename)
+                size -= entry_size
+
+    @staticmethod
+    def _iter_batches(reader):
+        for idx in range(reader.num_record_batches):
+            yield reader.get_batch(idx).to_pandas()
+
+    @staticmethod
+    def _remove(filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+
+def _serialize_version(version):
+    return json.dumps(version, sort_keys=True, default=str)
+
+
+def _touch(filename):
+    try:
+        os.utime(filename, None)
+    except OSError:
+        pass
+
+
+def _close_quietly(writer):
+    if writer is not None:
+        try:
+            writer.close()
+        except Exception:
+            pass
+    return None
@@ -0,0 +1,275 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+from pyetl.datasource.core import DataSource, _traced_write
+from pyetl.datalocation import FilesystemLocation
+from pyetl.dictionary.core import MetadataCatalog
+from pyetl.utils.filters import normalize_filters, filter_columns, filter_mask, range_may_match
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    logger.warning("pyarrow is not installed. ColumnarFileDataSource won't be available")
+
+_DEFAULT_ROW_GROUP_SIZE = 100000
+
+
+class ColumnarFileDataSource(DataSource):
+    """
+    Data source as columnar file(s): Parquet or Feather (Arrow IPC).
+
+    Row counts are read from the file footers, data is streamed one row group (Parquet) or record batch (Feather) at
+    a time, and column projection and filters are pushed down into the reader. Parquet row groups whose statistics
+    cannot match the filters are skipped without being read.
+
+    Example:
+    ```python
+    from pyetl.datasource import ColumnarFileDataSource
+
+    ds = ColumnarFileDataSource('read-only', 'staging/*.parquet', columns=['ID', 'AMOUNT'],
+                                filters=[('AMOUNT', '>', 0)])
+    for df in ds.get_data_iterator():
+        ...
+    ```
+    """
+
+    # properties (Access = private)
+    _file_format = None  # 'parquet' or 'feather'
+    _columns = None  # projected columns, None to read all columns
+    _filters = None  # list of (column, operator, value) tuples
+    _skip_row_count = False
+
+    # methods (Access = public)
+    def __init__(self, source_type, filepath, dictionary=None, chunksize=None, columns=None, filters=None,
+                 file_format=None, skip_row_count=False, **kwargs):
+        """
+        Constructor for data source as columnar file(s)
+
+        :param source_type: access mode: read-only, append or create
+        :param filepath: file path(s), wildcards are accepted
+        :param dictionary: optional data dictionary, metadata is read from the file schema otherwise
+        :param chunksize: number of rows per row group when writing, or 'auto' (or a ChunkSizer) for row groups sized
+            to a memory budget
+        :param columns: columns to read
+        :param filters: list of (column, operator, value) tuples, combined with AND
+        :param file_format: 'parquet' or 'feather', inferred from the file extension by default
+        :param skip_row_count:
+        :param kwargs: parameters to be passed to the pyarrow writer
+        """
+        location = FilesystemLocation(filepath)
+        self._file_format = file_format or self._infer_file_format(location)
+        self._columns = None if columns is None else list(columns)
+        self._filters = normalize_filters(filters)
+        self._skip_row_count = skip_row_count
+        self._set_chunk_size(chunksize or _DEFAULT_ROW_GROUP_SIZE)
+        self._parameters = kwargs
+        super(ColumnarFileDataSource, self).__init__(source_type, True, location, dictionary, self._columns)
+
+    def num_data_locations(self):
+        """For files, there is only a single data location which itself is a collection of files"""
+        return 1
+
+    def exists(self):
+        """Check if the data source exists"""
+        return any([os.path.isfile(l) for l in self.get_location()])
+
+    def get_name(self, idx=None):
+        """Return file name as pattern"""
+        if idx is not None:
+            return os.path.splitext(os.path.basename(self.get_location()[idx]))
+        return [os.path.splitext(os.path.basename(l)) for l in self.get_location()]
+
+    @_traced_write
+    def write(self, data, **kwargs):
+        """
+        Write input data, one row group (or record batch) of at most chunksize rows at a time
+        :param data: pandas.DataFrame or iterable of pandas.DataFrame
+        :param kwargs: parameters to be passed to the pyarrow writer
+        :return: num_rows_inserted
+        """
+        if not self.mode_is_create():
+            raise ValueError('Columnar files can only be written in create mode')
+        if isinstance(data, pd.DataFrame):
+            data = [data]
+
+        params = dict(self._parameters, **kwargs)
+        filename = self.get_location()[0]
+        writer = None
+        schema = None
+        num_rows = 0
+        try:
+            for df in data:
+                chunk_size = self._get_batch_size(df)
+                for start in range(0, len(df), chunk_size):
+                    chunk = df.iloc[start:start + chunk_size]
+                    if writer is None:
+                        schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                        writer = self._open_writer(filename, schema, **params)
+                    table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                    if self._file_format == 'parquet':
+                        writer.write_table(table, row_group_size=chunk_size)
+                    else:
+                        for batch in table.to_batches():
+                            writer.write_batch(batch)
+                    num_rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        logger.info('Wrote {} observations to {}'.format(num_rows, filename))
+        return num_rows
+
+    # methods (Access = protected)
+    def compute_size(self):
+        """Get data source size from the file footers"""
+        if self._skip_row_count:
+            num_rows = -1
+        elif not self._filters:
+            num_rows = sum([self._footer_row_count(f) for f in self.get_location()])
+        else:
+            # Only the filter columns of the row groups that may match are read
+            num_rows = 0
+            columns = sorted(set(filter_columns(self._filters)))
+            for f in self.get_location():
+                for df in self._iter_file(f, columns):
+                    num_rows += int(filter_mask(df, self._filters).sum())
+
+        metadata = self.get_metadata()
+        return num_rows, -1 if metadata is None else len(metadata)
+
+    def fetch_metadata(self):
+        """Fetch metadata from the dictionary if any, from the schema of the first file otherwise"""
+        if self.get_dictionary() is not None:
+            md = self.get_dictionary().read_metadata()
+        else:
+            md = self._read_schema_metadata(self.get_location()[0])
+        if self._columns is not None:
+            md = md.extract_sub_catalog(self._columns)
+        return md
+
+    def technical_preprocessing(self, var, var_name=None):
+        """Columnar files store typed data: nothing to do"""
+        return var
+
+    def format_datetime_data(self, var_name, var_in):
+        """Datetime data is already typed in columnar files"""
+        return var_in
+
+    def _create_location_iterator(self):
+        """Initialize data source reader"""
+        for f in self.get_location():
+            yield self._iter_file(f, self._columns, self._filters)
+
+    # methods (Access = private)
+    def _iter_file(self, filename, columns=None, filters=None):
+        """
+        Read a single file one row group (or record batch) at a time
+        :param filename:
+        :param columns: columns to return
+        :param filters: rows not satisfying the filters are dropped
+        :return: iterator of pandas.DataFrame
+        """
+        # Filter columns have to be read even if they are not projected
+        read_columns = columns
+        if columns is not None and filters:
+            read_columns = list(columns) + [c for c in filter_columns(filters) if c not in columns]
+
+        if self._file_format == 'parquet':
+            blocks = self._iter_parquet_row_groups(filename, read_columns, filters)
+        else:
+            blocks = self._iter_feather_batches(filename, read_columns)
+
+        for df in blocks:
+            if filters:
+                df = df.loc[filter_mask(df, filters)]
+                if columns is not None:
+                    df = df[columns]
+            yield df
+
+    @staticmethod
+    def _iter_parquet_row_groups(filename, columns, filters):
+        pf = pq.ParquetFile(filename)
+        for idx in range(pf.num_row_groups):
+            if filters and not ColumnarFileDataSource._row_group_may_match(pf.metadata.row_group(idx), filters):
+                logger.debug('Skipping row group #{} of {}'.format(idx, filename))
+                continue
+            yield pf.read_row_group(idx, columns=columns).to_pandas()
+
+    @staticmethod
+    def _iter_feather_batches(filename, columns):
+        reader = pa.ipc.open_file(pa.memory_map(filename, 'r'))
+        for idx in range(reader.num_record_batches):
+            batch = reader.get_batch(idx)
+            if columns is not None:
+                batch = pa.RecordBatch.from_arrays(
+                    [batch.column(batch.schema.get_field_index(c)) for c in columns], columns)
+            yield batch.to_pandas()
+
+    @staticmethod
+    def _row_group_may_match(row_group, filters):
+        """Use row group statistics to decide whether the row group has to be read"""
+        stats = {}
+        for idx in range(row_group.num_columns):
+            col = row_group.column(idx)
+            if col.statistics is not None and col.statistics.has_min_max:
+                stats[col.path_in_schema] = (col.statistics.min, col.statistics.max)
+
+        for column, op, operand in filters:
+            if column in stats and not range_may_match(op, operand, *stats[column]):
+                return False
+        return True
+
+    def _footer_row_count(self, filename):
+        if self._file_format == 'parquet':
+            return pq.ParquetFile(filename).metadata.num_rows
+        reader = pa.ipc.open_file(pa.memory_map(filename, 'r'))
+        return sum([reader.get_batch(idx).num_rows for idx in range(reader.num_record_batches)])
+
+    def _read_schema_metadata(self, filename):
+        """Build a metadata catalog from the Arrow schema of a file"""
+        if self._file_format == 'parquet':
+            schema = pq.read_schema(filename)
+        else:
+            schema = pa.ipc.open_file(pa.memory_map(filename, 'r')).schema
+        # Drop the serialized pandas index, if any
+        fields = [f for f in schema if not f.name.startswith('__index_level_')]
+
+        md = pd.DataFrame(index=pd.Index([f.name for f in fields], name='NAME'))
+        md['TYPE_IN_SOURCE'] = [str(f.type) for f in fields]
+        md['NUM_BYTES'] = [f.type.bit_width // 8 if _has_bit_width(f.type) else np.nan for f in fields]
+        md['IS_BOOLEAN'] = [pa.types.is_boolean(f.type) for f in fields]
+        md['IS_INTEGER'] = [pa.types.is_integer(f.type) for f in fields]
+        md['IS_FLOAT'] = [pa.types.is_floating(f.type) or pa.types.is_decimal(f.type) for f in fields]
+        md['IS_DATE'] = [pa.types.is_date(f.type) for f in fields]
+        md['IS_TIME'] = [pa.types.is_time(f.type) for f in fields]
+        md['IS_TIMESTAMP'] = [pa.types.is_timestamp(f.type) for f in fields]
+        md['IS_TEXT'] = ~(md['IS_BOOLEAN'] | md['IS_INTEGER'] | md['IS_FLOAT'] | md['IS_DATE'] | md['IS_TIME'] |
+                          md['IS_TIMESTAMP'])
+        md['DATETIME_FORMAT'] = ''
+        return MetadataCatalog(md, is_case_sensitive=True)
+
+    def _open_writer(self, filename, schema, **kwargs):
+        if self._file_format == 'parquet':
+            return pq.ParquetWriter(filename, schema, **kwargs)
+        return pa.ipc.new_file(filename, schema, **kwargs)
+
+    @staticmethod
+    def _infer_file_format(location):
+        extensions = {os.path.splitext(l)[1].lower() for l in location}
+        if extensions <= {'.parquet', '.pq'}:
+            return 'parquet'
+        elif extensions <= {'.feather', '.arrow', '.ipc'}:
+            return 'feather'
+        raise ValueError('Cannot infer columnar file format from extensions: {}'.format(extensions))
+
+
+def _has_bit_width(arrow_type):
+    try:
+        return arrow_type.bit_width > 0
+    except ValueError:
+        # Variable-width types (strings, binaries, ...)
+        return False
@@ -1,18 +1,38 @@
 from pyetl.connections.core import Connection, DbConnection
 from pyetl.datalocation import DatabaseQueryLocation, DatabaseTableLocation
+import functools
 import time
 import pandas as pd
 import numpy as np
 from copy import deepcopy
 import logging
-from pyetl.utils.datetime import str_to_date
+from pyetl import tracing
+from pyetl.pipeline import Pipeline
+from pyetl.utils.checksum import TableChecksum
+from pyetl.utils.chunking import ChunkSizer, estimate_row_size
+from pyetl.utils.dateparse import DatetimeParser
 from pyetl.utils.string import string_concat
+from pyetl.utils.sql import get_referenced_tables, render_in_list
 from pyetl.utils.iterables import is_listlike
 
 
 logger = logging.getLogger(__name__)
 
 
+def _traced_write(func):
+    """Trace writes to a data source: number of rows written and duration"""
+    @functools.wraps(func)
+    def wrapper(self, data, *args, **kwargs):
+        if not tracing.is_enabled():
+            return func(self, data, *args, **kwargs)
+        with tracing.span('write', source=self.__class__.__name__) as event:
+            if isinstance(data, pd.DataFrame):
+                event.update(tracing.describe_table(data))
+            event['rows'] = func(self, data, *args, **kwargs)
+        return event['rows']
+    return wrapper
+
+
 class DataSource(object):
     """
     DATASOURCE Abstract data source representation
@@ -26,7 +46,11 @@ class DataSource(object):
     _md = None  # metadata catalog
     _is_case_sensitive = True  # flag indicating if the data source is case sensitive when handling variable names
     _location_iterator = None  # object for iteratively reading data from the data source
-    _chunk_size = 1e4  # number of rows to read/write at each step
+    _chunk_size = 10000  # number of rows to read/write at each step
+    _chunk_sizer = None  # adaptive chunk size, instead of a fixed number of rows
+    _has_multiple_output_locations = False  # flag indicating if data can be written to several locations at once
+    _copy_write_parameters = {}  # parameters of the write method when data is copied to the data source
+    _datetime_parsers = None  # datetime parser of each variable, for the current location iterator
 
     def __init__(self, access_mode, is_case_sensitive, location, dictionary, var_name, flag_read_metadata=True,
                  **kwargs):
@@ -59,8 +83,10 @@ class DataSource(object):
         if flag_read_metadata and (self.mode_is_read_only() or self.mode_is_append()):
             self._md = self.fetch_metadata()
 
-        # In append and create modes, there can be only a single output data location
-        if (self.mode_is_append() or self.mode_is_create()) and len(self.get_location()) != 1:
+        # In append and create modes, there can be only a single output data location unless the data source
+        # splits written data between its locations
+        max_locations = float('inf') if self._has_multiple_output_locations else 1
+        if (self.mode_is_append() or self.mode_is_create()) and not 1 <= len(self.get_location()) <= max_locations:
             msg = 'Only a single location is supported for output operations'
             logger.error(msg)
             raise ValueError(msg)
@@ -139,28 +165,25 @@ class DataSource(object):
     def get_data_iterator(self):
         # Read data
         for li in self.get_location_iterator():
-            for df in li:
-                if self.has_metadata():
-                    # Get variable names
-                    var_name = df.columns
-                    if set(self.get_variable_names()) == set(var_name):
-                        msg = 'Variable names are not consistent with metadata'
-                        logger.error(msg)
-                        raise ValueError(msg)
-
-                    # Loop through columns
-                    for idx, name in enumerate(df.colums):
-                        col = df[name]
-                        # Run technical pre-processing
-                        col = self.technical_preprocessing(col, var_name[idx])
-                        # Transform datetime data and apply datetime formats
-                        col = self.format_datetime_data(var_name[idx], col)
-                        # Replace data in the table
-                        df[name] = col
-
-                logger.info('Read {} observations'.format(len(df)))
+            for df in self._process_chunks(li):
                 yield df
 
+    def get_location_data_iterators(self):
+        """
+        Iterators of processed chunks, one per data location. They are independent of the data source's own iterator
+        so that locations can be read concurrently
+        :return: iterator of iterators
+        """
+        for li in self._create_location_iterator():
+            yield self._process_chunks(li)
+
+    def get_location_costs(self):
+        """
+        Estimated cost of reading each data location, used to schedule parallel reads and writes
+        :return: costs
+        """
+        return [1.] * len(self.get_location())
+
     # # methods (Access = public)
     def size(self, dim=None):
         """
@@ -189,6 +212,59 @@ class DataSource(object):
         """
         return len(self.get_location())
 
+    def _process_chunks(self, chunks_iterator):
+        """
+        Process the chunks read from a data location. When tracing is enabled, the time spent reading (and parsing)
+        each chunk is traced separately from the time spent processing it
+        :param chunks_iterator:
+        :return: iterator of processed chunks
+        """
+        if not tracing.is_enabled():
+            for df in chunks_iterator:
+                yield self._process_chunk(df)
+            return
+        source = self.__class__.__name__
+        chunks_iterator = iter(chunks_iterator)
+        while True:
+            timer = time.time()
+            df = next(chunks_iterator, None)
+            if df is None:
+                return
+            parse_time = time.time() - timer
+            timer = time.time()
+            df = self._process_chunk(df)
+            tracing.emit('chunk', source=source, parse_time=parse_time, conversion_time=time.time() - timer,
+                         **tracing.describe_table(df))
+            yield df
+
+    def _process_chunk(self, df):
+        """
+        Process a chunk of data read from a data location: check variable names, run technical pre-processing and
+        transform datetime data
+        :param df:
+        :return: df
+        """
+        if self.has_metadata():
+            # Get variable names
+            var_name = df.columns
+            if set(self.get_variable_names()) != set(var_name):
+                msg = 'Variable names are not consistent with metadata'
+                logger.error(msg)
+                raise ValueError(msg)
+
+            # Loop through columns
+            for idx, name in enumerate(df.columns):
+                col = df[name]
+                # Run technical pre-processing
+                col = self.technical_preprocessing(col, var_name[idx])
+                # Transform datetime data and apply datetime formats
+                col = self.format_datetime_data(var_name[idx], col)
+                # Replace data in the table
+                df[name] = col
+
+        logger.info('Read {} observations'.format(len(df)))
+        return df
+
     def requires_connection(self):
         """
         :return: flag indicating if the data source requires a connection
@@ -208,6 +284,8 @@ class DataSource(object):
         """
         logger.info('Initializing iterator')
         self._location_iterator = self._create_location_iterator()
+        # Datetime parsing methods are decided again for the new iterator
+        self._datetime_parsers = {}
 
     def read_all(self):
         """
@@ -215,35 +293,140 @@ class DataSource(object):
         :return: df, elapsedTime
         """
         timer = time.time()
+        with tracing.span('read_all', source=self.__class__.__name__) as event:
+            # Initialize the reader(s)
+            if not self.has_location_iterator():
+                self.init_location_iterator()
+
+            # Read data
+            result_buffer = []
+            for chunk in self.get_data_iterator():
+                if len(chunk):
+                    result_buffer.append(chunk)
+
+            df = self._concat_chunks(result_buffer)
+            event.update(tracing.describe_table(df), chunks=len(result_buffer))
+        elapsed_time = time.time() - timer
+        return df, elapsed_time
 
-        # Initialize the reader(s)
-        if not self.has_location_iterator():
-            self.init_location_iterator()
+    def _deepcopy(self):
+        """Deep copy of the data source, without its location iterator which cannot be copied"""
+        location_iterator, self._location_iterator = self._location_iterator, None
+        try:
+            return deepcopy(self)
+        finally:
+            self._location_iterator = location_iterator
 
-        # Read data
-        result_buffer = []
-        for chunk in self.get_data_iterator():
-            if len(chunk):
-                result_buffer.append(chunk)
+    def _get_verification_copy(self):
+        """Read-only copy of the data source, to read back data which was written to it"""
+        return self.to_read_only()
 
+    def _get_variable_mapping(self, target):
+        """
+        Map variables to the ones of a target data source, if both have metadata
+        :param target:
+        :return: dict or None
+        """
+        if not self.has_metadata() or not target.has_metadata():
+            return None
+        return self.get_metadata().map_variables(target.get_metadata())
+
+    def _verify_copy(self, target, checksum, num_rows_before=0):
+        """
+        Read a target data source back and compare it with the data which was written to it
+        :param target:
+        :param checksum: TableChecksum of the data written
+        :param num_rows_before: number of rows of the target before data was appended to it
+        """
+        written = target._get_verification_copy()
+        if target.mode_is_append():
+            num_rows = written.size(0) - num_rows_before
+            if num_rows_before >= 0 and written.size(0) >= 0 and num_rows != checksum.get_num_rows():
+                msg = 'Copy verification failed: {} rows appended but {} read'.format(num_rows, checksum.get_num_rows())
+                logger.error(msg)
+                raise ValueError(msg)
+            logger.info('Copy verified: {} rows appended'.format(checksum.get_num_rows()))
+            return
+
+        kinds = checksum.get_kinds() or {}
+        names = dict((str(v).upper(), v) for v in kinds)
+        written_checksum = TableChecksum(kinds)
+        for df in written.get_data_iterator():
+            # Variable names might have changed case, e.g. in a database
+            df = df.rename(columns=dict((c, names.get(str(c).upper(), c)) for c in df.columns))
+            extra_columns = [c for c in df.columns if c not in kinds]
+            if len(kinds) and len(extra_columns):
+                msg = 'Copy verification failed: unexpected variable(s) in the target: {}'.format(extra_columns)
+                logger.error(msg)
+                raise ValueError(msg)
+            written_checksum.update(df.loc[:, [c for c in df.columns if c in kinds]])
+        if written_checksum != checksum:
+            msg = 'Copy verification failed: read {} but found {} in the target'.format(checksum, written_checksum)
+            logger.error(msg)
+            raise ValueError(msg)
+        logger.info('Copy verified: {}'.format(checksum))
+
+    def _concat_chunks(self, result_buffer):
+        """
+        Concatenate all chunks read from the data source and check the size of the result
+        :param result_buffer:
+        :return: df
+        """
         df = pd.concat(result_buffer, axis=0)
 
-        # Check size
-        if len(df) != self.size(0):
+        # Check size, unless it is unknown
+        if self.size(0) >= 0 and len(df) != self.size(0):
             msg = 'Size mismatch: read {} rows but expected {}'.format(len(df), self.size(0))
             logger.error(msg)
             raise ValueError(msg)
-
-        elapsed_time = time.time() - timer
-        return df, elapsed_time
+        return df
+
+    def copy_to(self, target, num_readers=1, num_writers=1, verify=True, queue_size=4, **kwargs):
+        """
+        Copy all data to another data source. Chunks are mapped to the target's variables and written while the next
+        ones are being read, so that the data never lives in memory all at once
+        :param target: data source in create or append mode
+        :param num_readers: number of data locations read at the same time
+        :param num_writers: number of workers of the target's write method
+        :param verify: read the target back and compare its number of rows and checksum with the data read. Only the
+            number of rows is verified when appending
+        :param queue_size: maximum number of chunks waiting to be written
+        :param kwargs: parameters to be passed to the target's write method
+        :return: num_rows_inserted
+        """
+        if target.mode_is_read_only():
+            raise ValueError('Cannot copy to a read-only data source')
+        mapping = self._get_variable_mapping(target)
+        checksum = TableChecksum()
+        num_rows_before = target.size(0) if target.mode_is_append() else 0
+
+        def map_variables(df):
+            if mapping is not None:
+                # Source variables missing from the target are left out
+                columns = dict((c, mapping.get(c, mapping.get(str(c).upper()))) for c in df.columns)
+                df = df.loc[:, [c for c in df.columns if columns[c] is not None]].rename(columns=columns)
+            if verify:
+                checksum.update(df)
+            return df
+
+        kwargs = dict(target._copy_write_parameters, **kwargs)
+        if num_writers > 1:
+            kwargs['num_workers'] = num_writers
+        pipeline = Pipeline(self, target, queue_size=queue_size, num_readers=num_readers)
+        pipeline.add_transform(map_variables, name='map_variables')
+        num_rows = pipeline.run(**kwargs)
+        logger.info('Copied {} observations'.format(num_rows))
+
+        if verify:
+            self._verify_copy(target, checksum, num_rows_before)
+        return num_rows
 
     def to_read_only(self):
         """
         Get a read-only clone of the current data source
         """
-        ds = deepcopy(self)
+        ds = self._deepcopy()
         ds._access_mode = 'read-only'
-        ds._location_iterator = None
         ds._md = ds.fetch_metadata()
         ds.init_location_iterator()
         ds._shape = ds.compute_size()
@@ -276,11 +459,22 @@ class DataSource(object):
 
     def get_chunk_size(self):
         """
-        Chunk size getter
+        Chunk size getter. With adaptive chunk sizes, the size of the next chunk, first estimated from the metadata
         :param self: 
-        :return: dict
+        :return: number of rows
         """
-        return self._chunk_size
+        if self._chunk_sizer is None:
+            return self._chunk_size
+        if not self._chunk_sizer.is_initialized() and self.has_metadata():
+            self._chunk_sizer.initialize(estimate_row_size(self.get_metadata()))
+        return self._chunk_sizer.get_chunk_size()
+
+    def get_chunk_sizer(self):
+        """
+        Adaptive chunk size getter
+        :return: ChunkSizer, None if chunks have a fixed number of rows
+        """
+        return self._chunk_sizer
 
     def format_datetime_data(self, var_name, var_in):
         """
@@ -290,7 +484,22 @@ class DataSource(object):
         :param var_in: numpy.array
         :return: var_out
         """
-        return self._md.format_datetime_data(var_name, var_in)
+        return self._md.format_datetime_data(var_name, var_in, parser=self._get_datetime_parser(var_name))
+
+    def _get_datetime_parser(self, var_name, input_format=None):
+        """
+        Get the parser of a datetime variable. Parsers are shared by all the chunks read by the location iterator
+        :param var_name:
+        :param input_format: strptime format, by default the compiled datetime format of the variable in the metadata
+        :return: parser, None if the variable has no supported datetime format
+        """
+        if self._datetime_parsers is None:
+            self._datetime_parsers = {}
+        key = (var_name, input_format)
+        if key not in self._datetime_parsers:
+            self._datetime_parsers[key] = DatetimeParser(input_format) if input_format is not None \
+                else self.get_metadata().get_datetime_parser(var_name)
+        return self._datetime_parsers[key]
 
     def read_only_copy(self, metadata, size, data_location=None, location_reader=None):
         """
@@ -301,9 +510,8 @@ class DataSource(object):
         :param location_reader:
         :return: ds
         """
-        ds = deepcopy(self)
+        ds = self._deepcopy()
         ds._access_mode = 'read-only'
-        ds._location_iterator = None
         ds._md = metadata
         ds._shape = size
 
@@ -346,11 +554,53 @@ class DataSource(object):
             logger.error(msg)
             raise ValueError(msg)
 
+    def _set_chunk_size(self, chunksize):
+        """
+        Set the chunk size
+        :param chunksize: number of rows, None, 'auto' or a ChunkSizer for chunks sized to a memory budget
+        """
+        if isinstance(chunksize, ChunkSizer):
+            self._chunk_sizer, self._chunk_size = chunksize, None
+        elif isinstance(chunksize, str):
+            if chunksize.lower().strip() != 'auto':
+                raise ValueError('Unsupported chunk size: {}'.format(chunksize))
+            self._chunk_sizer, self._chunk_size = ChunkSizer(), None
+        else:
+            self._chunk_sizer, self._chunk_size = None, None if chunksize is None else int(chunksize)
+
+    def _get_batch_size(self, df, chunksize=None):
+        """
+        Number of rows written at once
+        :param df: table to be written
+        :param chunksize: number of rows, by default the chunk size of the data source
+        :return: number of rows, None to write the table at once
+        """
+        if chunksize is not None:
+            return int(chunksize)
+        if self._chunk_sizer is not None:
+            return self._chunk_sizer.get_batch_size(df)
+        return self._chunk_size
+
+
+class WriteError(ValueError):
+    """
+    Writing to some of the locations of a data source failed. The report lists, for each location, its status, the
+    number of rows loaded and the error if any
+    """
+
+    def __init__(self, msg, report):
+        super(WriteError, self).__init__(msg)
+        self.report = report
+
 
 class DatabaseDataSource(DataSource, DbConnection):
     # DATABASEDATASOURCE Summary of this class goes here
     #    Detailed explanation goes here
 
+    # properties (Access = private)
+    _max_in_list_size = 1000  # maximum number of values of an IN list, longer lists being split
+    _result_cache = None  # local cache of query results, see QueryResultCache
+
     # methods (Abstract, Access = public)
     def sql_date_formatter(self, date_format=None):
         """
@@ -388,12 +638,14 @@ class DatabaseDataSource(DataSource, DbConnection):
 
     # methods (Access = public)
     def __init__(self, access_mode, location, dictionary, chunksize, metadata, conn_params=None, credentials=None,
-                 **kwargs):
+                 result_cache=None, **kwargs):
         """
         Construct a database data source object
         The input location might be either a collection of tables or of queries.
         Queries are expected to start with a SELECT statement.
 
+        :param result_cache: QueryResultCache, to read query results from local files as long as the tables have not
+            changed
         :return: self
         """
         location, variable_names = DatabaseDataSource._process_location(location)
@@ -405,7 +657,8 @@ class DatabaseDataSource(DataSource, DbConnection):
                                                  location=location, dictionary=dictionary, var_name=variable_names,
                                                  flag_read_metadata=False)
         self._parameters = kwargs
-        self._chunk_size = chunksize
+        self._set_chunk_size(chunksize)
+        self._result_cache = result_cache
         # Do some checks
         # The input location might a collection of queries only in read-only mode
         if isinstance(self._location, DatabaseQueryLocation) and not self.mode_is_read_only():
@@ -432,6 +685,19 @@ class DatabaseDataSource(DataSource, DbConnection):
             self.create_table(metadata)
             self._md = self.fetch_metadata(variable_names)
 
+        # The size is computed once metadata are read, as by the super constructor for other data sources
+        self._shape = self.compute_size()
+
+    def get_result_cache(self):
+        return self._result_cache
+
+    def set_result_cache(self, result_cache):
+        """
+        Set the local cache of query results
+        :param result_cache: QueryResultCache, None to always read from the database
+        """
+        self._result_cache = result_cache
+
     def exists(self):
         """
         Check data source existence
@@ -453,20 +719,43 @@ class DatabaseDataSource(DataSource, DbConnection):
         values of this variable
 
         :param var_name:
-        :param list_missing_values_in_sql_format:
+        :param list_missing_values_in_sql_format: values to be treated as missing, either as a list of values or as
+            an SQL list, e.g. "('', 'N/A')"
         :return: uniques, row_count, num_missing
         """
-        num_missing = 0
-        # The values contained in the treatAsMissing input have to be
-        # added to the SQL query as a list of values the variable should
-        # not take
         is_missing_stmt = '{} IS NULL'.format(var_name)
         is_not_missing_stmt = '{} IS NOT NULL'.format(var_name)
+        if list_missing_values_in_sql_format is None:
+            return self._get_uniques(var_name, is_missing_stmt, is_not_missing_stmt)
 
-        if list_missing_values_in_sql_format is not None:
-            is_missing_stmt += ' OR {v} IN {miss}'.format(v=var_name, miss=list_missing_values_in_sql_format)
-            is_not_missing_stmt += ' AND {v} NOT IN {miss}'.format(v=var_name, miss=list_missing_values_in_sql_format)
+        # The values contained in the treatAsMissing input have to be
+        # added to the SQL query as a list of values the variable should
+        # not take
+        is_in_stmt = self.in_condition(var_name, list_missing_values_in_sql_format)
+        return self._get_uniques(var_name, '{} OR {}'.format(is_missing_stmt, is_in_stmt),
+                                 '{} AND NOT {}'.format(is_not_missing_stmt, is_in_stmt))
 
+    def in_condition(self, var_name, values):
+        """
+        IN condition on a variable, values being rendered as SQL literals. Long lists are split into several IN lists
+        of at most _max_in_list_size values, so that no table has to be created to hold them. The statement is as
+        long as the values: splitting keeps each list within the limits of the parser, not the statement short
+        :param var_name:
+        :param values: list-like of values or SQL list
+        :return: condition, within parentheses
+        """
+        if isinstance(values, str):
+            return '({} IN {})'.format(var_name, values)
+        values = pd.Series(values).dropna().drop_duplicates()
+        if not len(values):
+            return '(1 = 0)'
+        return '({})'.format(' OR '.join([
+            '{} IN {}'.format(var_name, render_in_list(values.iloc[start:start + self._max_in_list_size]))
+            for start in range(0, len(values), self._max_in_list_size)]))
+
+    def _get_uniques(self, var_name, is_missing_stmt, is_not_missing_stmt):
+        """Get unique values given the conditions identifying missing and non-missing values"""
+        num_missing = 0
         # Set database preferenecs and connect to the database
         tbl_name = self.get_location().get_table_name()
         uniques = pd.DataFrame()
@@ -484,7 +773,7 @@ class DatabaseDataSource(DataSource, DbConnection):
             else:
                 uniques = (uniques
                            .join(self.fetch(query_uniques), how='outer', on='UNIQUE_VALUES', lsuffix='_1', rsuffix='_2')
-                           .fill(0)
+                           .fillna(0)
                            .assign(ROW_COUNT=lambda x: x['ROW_COUNT_1'] + x['ROW_COUNT_2'])
                            .drop(['ROW_COUNT_1', 'ROW_COUNT_2'], axis=1))
             # Compute the number of missing values
@@ -492,7 +781,7 @@ class DatabaseDataSource(DataSource, DbConnection):
 
         row_count, uniques = uniques['ROW_COUNT'], uniques['UNIQUE_VALUES']
         # Apply some preprocessing
-        uniques = self.technical_preprocessing(uniques)
+        uniques = self.technical_preprocessing(uniques, var_name)
         uniques = self.format_datetime_data(var_name, uniques)
         # Check results: the sum of all row counts and the number of
         # NULL values is expected to be equal to the data source size
@@ -530,10 +819,8 @@ class DatabaseDataSource(DataSource, DbConnection):
         """
         # Fetch metadata for all the tables where data is located
         tbl_name = self.get_location().get_table_name()
-        md = []
-        for idx in range(len(tbl_name)):
-            md.append(self.get_dictionary().read_metadata(self, tbl_name[idx], var_name))
-        # Check metadata consistency
+        md = self.get_dictionary().read_metadata_bulk(self, tbl_name, var_name)
+        # Check metadata consistency: catalogs are compared through their signatures
         for idx in range(1, len(md)):
             if md[idx] != md[0]:
                 msg = 'Inconsistent metadata between the following tables: {} and {}'.format(tbl_name[0], tbl_name[idx])
@@ -558,18 +845,18 @@ class DatabaseDataSource(DataSource, DbConnection):
             raise ValueError('Cannot found the following variable in the metadata catalog: {}'.format(var_name))
         # This function only applies to date, time and timestamp data
         md = self.get_metadata()
-        check_missing_values = True
         if md.is_date_variable(var_name):
-            var_out = str_to_date(var_in, input_format='%Y-%m-%d')
+            input_format = '%Y-%m-%d'
         elif md.is_time_variable(var_name):
-            var_out = str_to_date(var_in, input_format='%H:%M:%S')
+            input_format = '%H:%M:%S'
         elif md.is_timestamp_variable(var_name):
-            var_out = str_to_date(var_in, input_format='Y-%m-%d %H:%M:%S')
+            input_format = '%Y-%m-%d %H:%M:%S'
         else:
-            var_out = var_in
-            check_missing_values = False
+            return var_in
+        var_out = self._get_datetime_parser(var_name, input_format)(var_in)
         # Check the count of missing values
-        if check_missing_values and sum(var_out.isnull()) != sum(var_in == ''):
+        is_missing = pd.isnull(var_in) | (np.asarray(var_in, dtype=object) == '')
+        if np.count_nonzero(pd.isnull(var_out)) != np.count_nonzero(is_missing):
             raise ValueError('Error with datetime formatting: mismatch in the number of missing values')
 
         return var_out
@@ -586,8 +873,8 @@ class DatabaseDataSource(DataSource, DbConnection):
         if var_name is None:
             var_name = self.get_variable_names()
         # Form the select statement
-        where_clause = np.array(self.get_location().get_where_clause())
-        where_clause[where_clause != ''] = np.core.defchararray.add(' WHERE ', where_clause[where_clause != ''])
+        # Strings are concatenated into new arrays: assigning longer strings to the array would truncate them
+        where_clause = np.array([' WHERE ' + w if len(w) else '' for w in self.get_location().get_where_clause()])
         select_stmt = string_concat('SELECT ', ', '.join(var_name),
                                     ' FROM ', self.get_location().get_table_name(),
                                     where_clause)
@@ -602,17 +889,46 @@ class DatabaseDataSource(DataSource, DbConnection):
         Initialize data reader, i.e. database cursor
         :return: reader
         """
+        # Result sets are fetched in chunks of a fixed number of rows: adaptive chunk sizes are estimated from the
+        # metadata only
+        chunk_size = self.get_chunk_size()
+        cache = self.get_result_cache()
         for query in self.generate_select_statement():
+            version = self._get_result_version(query) if cache is not None else None
+            if version is not None:
+                cached_chunks = cache.get(query, version)
+                if cached_chunks is not None:
+                    yield cached_chunks
+                    continue
             try:
-                df = self.fetch(query, chunksize=self._chunk_size, **self._parameter)
+                df = self.fetch(query, chunksize=chunk_size, **self._parameters)
             except Exception as e:
                 logger.error('The SELECT statement could not be issued: {}'.format(query))
                 raise e
             else:
+                if version is not None:
+                    df = cache.put(query, version, [df] if isinstance(df, pd.DataFrame) else df)
                 yield df
 
     # methods (Access = private)
-    
+    def _get_result_version(self, query):
+        """
+        Version of cached query results: the database and user they come from, and the version of each table the
+        query reads
+        :return: version, None if the results cannot be cached, e.g. when the tables read cannot be determined
+        """
+        tbl_name = get_referenced_tables(query)
+        if tbl_name is None:
+            logger.debug('Query results are not cached, the tables read are unknown: {}'.format(query))
+            return None
+        try:
+            version = [[t, self.get_table_version(t)] for t in tbl_name]
+        except Exception as e:
+            logger.warning('Query results are not cached, the versions of {} could not be read: {}'.format(
+                tbl_name, e))
+            return None
+        return {'connection': self._get_connection_key(), 'tables': version}
+
     def _check_table_existence(self):
         """
         Check if input tables exist in the database, throw an error otherwise
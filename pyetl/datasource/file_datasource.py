@@ -1,12 +1,33 @@
 import pandas as pd
 import numpy as np
 import os
-from pyetl.datasource.core import DataSource
-from pyetl.datalocation import FilesystemLocation
+import logging
+import tempfile
+import time
+import multiprocessing
+from collections import OrderedDict, deque
+from pyetl.datasource.core import DataSource, _traced_write
+from pyetl.datalocation import FilesystemLocation, HIVE_DEFAULT_PARTITION
+from pyetl.dictionary import InferredDictionary
 import functools
+from pyetl import tracing
 from pyetl.utils.rowcount import rowcount
-from multiprocessing.dummy import Pool as ThreadPool
-from functools import partial
+from pyetl.utils.chunking import iterate_adaptively
+from pyetl.utils.cmd import CommandPipeline
+from pyetl.utils.compression import detect_compression, open_compressed, open_stream
+from pyetl.utils.filters import filter_columns
+from pyetl.utils.iterables import is_listlike
+from pyetl.utils.files import replace_file, set_default_mode
+from pyetl.utils.parallel import ParallelProcessor
+from pyetl.utils.scheduler import Schedule
+from pyetl.utils.string import str_to_bool
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+logger = logging.getLogger(__name__)
 
 
 class FileDataSource(DataSource):
@@ -16,23 +37,62 @@ class FileDataSource(DataSource):
     # properties (Access = private)
     _skip_row_count = False
     _read_numeric_data_as_string = True
+    _compression = 'infer'  # input compression: 'infer', None, 'gzip', 'bz2', 'zstd' or 'xz'
+    _command = None  # external command(s) each file is piped through before being parsed
+    _has_multiple_output_locations = True
+    _copy_write_parameters = {'index': False}  # the index of chunks read is not data
 
     # methods (Access = public)
-    def __init__(self, source_type, filepath, dictionary, chunksize, skip_row_count=False, **kwargs):
+    def __init__(self, source_type, filepath, dictionary, chunksize, skip_row_count=False, compression='infer',
+                 partitioning=None, filters=None, infer_dictionary=False, sample_size=10000, command=None, **kwargs):
         """
         FILEDATASOURCE Constructor for data source as file(s)
 
         :param source_type:
         :param filepath:
-        :param dictionary:
+        :param dictionary: data dictionary, None for files without metadata (see infer_dictionary)
+        :param chunksize: number of rows to read/write at each step, None for whole files, or 'auto' (or a
+            ChunkSizer) for chunks sized to a memory budget from the size of the rows
         :param skip_row_count:
+        :param compression: input compression, by default detected from the file extension or magic number.
+            Compressed files are decompressed on the fly in a separate thread
+        :param partitioning: None or 'hive' if filepath points to key=value/ partitioned directories. Partition keys
+            are exposed as variables
+        :param filters: list of (column, operator, value) tuples on partition keys. Partitions not satisfying the
+            filters are not read
+        :param infer_dictionary: without dictionary, infer metadata from a sample of the existing files so that data is
+            typed. Otherwise, files without dictionary are read as pandas parses them
+        :param sample_size: number of rows sampled to infer metadata
+        :param command: external command(s) each file is piped through before being parsed, e.g.
+            "zcat | grep -v DELETED | cut -d, -f1-5". Files are fed as they are to the first command, compression
+            being left to the commands, and their output is parsed while they run. As the number of rows is then
+            unknown until files are read, it is not computed, and metadata is not inferred
         :param kwargs: parameters to be passed to pandas read_csv function
         """
-        location = FilesystemLocation(filepath)
-        super(FileDataSource, self).__init__(source_type, True, location, dictionary, [], flag_read_metadata=False)
+        location = FilesystemLocation(filepath, partitioning=partitioning)
+        if filters is not None:
+            unknown_keys = set(filter_columns(filters)) - set(location.get_partition_keys())
+            if len(unknown_keys):
+                raise ValueError('Filters are only supported on partition keys: {}'.format(unknown_keys))
+            location = location.prune(filters)
+        # Set properties first: inferred metadata is fetched and the size computed by the super constructor
         self._skip_row_count = skip_row_count
-        self._chunk_size = chunksize
+        self._compression = compression
+        self._command = command
+        self._set_chunk_size(chunksize)
         self._parameters = kwargs
+        if command is not None:
+            self._skip_row_count = True
+        is_inferred = dictionary is None and infer_dictionary and command is None and \
+            source_type.lower().strip() != 'create'
+        if is_inferred:
+            dictionary = InferredDictionary(location, sample_size=sample_size, **kwargs)
+        # Metadata, given or inferred, is read in read-only and append modes, unless files are piped through commands
+        super(FileDataSource, self).__init__(source_type, True, location, dictionary, [],
+                                             flag_read_metadata=dictionary is not None and command is None)
+        if command is not None and not self.has_metadata():
+            # The number of rows is unknown until the commands are run
+            self._shape = (-1, -1)
 
     def num_data_locations(self):
         """NUMDATALOCATIONS For files, there is only a single data"""
@@ -48,43 +108,120 @@ class FileDataSource(DataSource):
         """GETNAME Return file name as pattern"""
         if idx is not None:
             filename = self.get_location()[idx]
-            filename, extension = os.path.basename(filename).split('.')
+            filename, extension = os.path.basename(filename).split('.', 1)
             name = (filename, extension)
         else:
-            name = [tuple(os.path.basename(filename).split('.')) for filename in self.get_location()]
+            name = [tuple(os.path.basename(filename).split('.', 1)) for filename in self.get_location()]
         return name
 
-    def write(self, data, num_workers=1, **kwargs):
-        # Verify input
+    def read_all(self, num_workers=1):
+        """
+        Read all data from source
+        :param num_workers: number of files read at the same time. Files are started by decreasing size so that
+            workers end up with balanced loads
+        :return: df, elapsed_time
+        """
+        if num_workers <= 1 or len(self.get_location()) <= 1:
+            return super(FileDataSource, self).read_all()
+        timer = time.time()
+        with tracing.span('read_all', source=self.__class__.__name__) as event:
+            processor = ParallelProcessor(num_workers, backend='thread')
+            for chunks_iterator in self._create_location_iterator():
+                processor.submit(self._read_location, chunks_iterator)
+            schedule = Schedule(self.get_location_costs(), processor.get_num_workers())
+            results = processor.run(schedule=schedule)
+            logger.debug('Parallel read of {} files: {}'.format(len(results), schedule.report(processor)))
+
+            chunks = [chunk for r in results for chunk in r.result]
+            df = self._concat_chunks(chunks)
+            event.update(tracing.describe_table(df), chunks=len(chunks))
+        elapsed_time = time.time() - timer
+        return df, elapsed_time
+
+    def get_location_costs(self):
+        """Files are read at a speed roughly proportional to their size"""
+        return [os.path.getsize(l) if os.path.isfile(l) else 0 for l in self.get_location()]
+
+    @_traced_write
+    def write(self, data, num_workers=1, compression='infer', compression_level=None, partition_by=None,
+              partition_filename='part-00000.csv', **kwargs):
+        """
+        Write input data as CSV file(s). Files are written to temporary files which are renamed once complete
+        :param data: pandas.DataFrame, list of pandas.DataFrame (one per location) or any iterator of
+            pandas.DataFrame (e.g. another data source's get_data_iterator()) whose chunks are streamed to the
+            locations in turn
+        :param num_workers: number of processes formatting CSV data
+        :param compression: output compression, by default inferred from the file extension
+        :param compression_level:
+        :param partition_by: variable(s) to partition by. The location is then the root directory of a hive
+            partitioned dataset, data being written to <location>/<key>=<value>/<partition_filename>. When appending,
+            rows are appended to the files of existing partitions
+        :param partition_filename:
+        :param kwargs: parameters to be passed to pandas to_csv function
+        :return: num_rows_inserted
+        """
+        if partition_by is not None:
+            return self._write_partitioned(data, partition_by, partition_filename, compression=compression,
+                                           compression_level=compression_level, **kwargs)
+
         locations = self.get_location()
-        if isinstance(data, pd.DataFrame):
-            # Split data in as many chunks as locations
-            n = len(data) // len(locations)
-            data = [df for _, df in data.groupby(np.arange(len(data)) // n)]
-        else:
-            # Verify that all elements in data are pandas.DataFrame objects
-            assert len(locations) == len(data), 'There should be as many input tables as locations'
-            for d in data:
-                assert isinstance(d, pd.DataFrame), 'Wrong input type'
-
-        if (len(data) > 1) and (num_workers > 1):
-            # Run in separated threads
-            def write_in_location(data_plus_location, **kwargs):
-                data_plus_location[0].to_csv(data_plus_location[1], **kwargs)
-
-            pool = ThreadPool(num_workers)
-            _ = pool.map(partial(write_in_location, **kwargs), zip(data, locations))
-        else:
-            for idx, l in enumerate(locations):
-                data[idx].to_csv(l, **kwargs)
-    
+        is_appending = self.mode_is_append()
+        header = kwargs.pop('header', True)
+        # The header is written with the first chunk of each location, unless appending to a non-empty file
+        needs_header = [header and not (is_appending and os.path.isfile(l) and os.path.getsize(l) > 0)
+                        for l in locations]
+
+        def tasks():
+            for idx, chunk in self._split_for_locations(data, len(locations)):
+                yield idx, chunk, needs_header[idx]
+                needs_header[idx] = False
+
+        # Formatting CSV data is CPU-bound: chunks are formatted in worker processes and written in order
+        pool = multiprocessing.Pool(num_workers) if num_workers > 1 else None
+        writers = []
+        num_rows = 0
+        try:
+            writers = [_AtomicFileWriter(l, compression, compression_level, is_appending) for l in locations]
+            for idx, num_chunk_rows, content in _format_csv_chunks(tasks(), pool, 2 * num_workers, **kwargs):
+                writers[idx].write(content)
+                num_rows += num_chunk_rows
+            for w in writers:
+                w.commit()
+        except Exception:
+            for w in writers:
+                w.abort()
+            raise
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+        logger.info('Wrote {} observations to {} location(s)'.format(num_rows, len(locations)))
+        return num_rows
+
     # methods (Access = protected)
+    def _get_verification_copy(self):
+        """Files without metadata are read back as text, e.g. so that codes keep their leading zeros"""
+        ds = self
+        if self._get_partitioned_output() is not None:
+            # Data written with partition_by is read back as a hive partitioned dataset
+            ds = self._deepcopy()
+            ds._location = self._get_partitioned_output()
+        ds = ds.to_read_only()
+        if not ds.has_metadata():
+            ds._parameters = dict(ds._parameters, dtype=str)
+            ds.init_location_iterator()
+        return ds
+
     def compute_size(self):
         """COMPUTESIZE Get data source size"""
         # Get the number of rows
-        data_file = self.get_location()
+        data_file = self._get_partitioned_output() or self.get_location()
         if not self._skip_row_count:
-            num_rows = rowcount(data_file) - (1 + self._parameters.get('header', 0) * len(data_file))
+            # Each file starts with its header lines
+            header = self._parameters.get('header', 0)
+            num_header_lines = header + 1 if isinstance(header, int) else int(header is not None)
+            num_rows = rowcount(data_file) - num_header_lines * len(data_file)
         else:
             num_rows = -1
 
@@ -94,20 +231,273 @@ class FileDataSource(DataSource):
     def _create_location_iterator(self):
         """INITREADERINTERN Initialize data source reader"""
         # Create a datastore selfect and set it propertoes
-        read_function = functools.partial(pd.read_csv, iterator=True, chunksize=self._chunk_size, **self._parameters)
+        parameters = dict(self._parameters)
+        if self.has_metadata() and 'dtype' not in parameters:
+            # Non-numeric variables are kept as text, e.g. codes with leading zeros or dates
+            md = self.get_metadata()
+            parameters['dtype'] = {v: str for v in md.get_variable_names() if not md.is_numeric_variable(v)}
+        if self.get_chunk_sizer() is None:
+            read_function = functools.partial(pd.read_csv, iterator=True, chunksize=self._chunk_size, **parameters)
+        else:
+            self.get_chunk_size()  # initial estimate from the metadata, if any
+            read_function = functools.partial(self._read_csv_adaptively, self.get_chunk_sizer(), parameters)
 
-        for file in self.get_location():
-            chunks_iterator = read_function(file)
+        location = self.get_location()
+        for file, partition in zip(location, location.get_partitions()):
+            compression = detect_compression(file) if self._compression == 'infer' else self._compression
+            if self._command is not None:
+                chunks_iterator = self._read_command_output(read_function, file, self._command)
+            elif compression is None:
+                chunks_iterator = read_function(file)
+            else:
+                chunks_iterator = self._read_compressed(read_function, file, compression)
+            if len(partition):
+                chunks_iterator = self._add_partition_variables(chunks_iterator, partition)
             yield chunks_iterator
 
+    @staticmethod
+    def _read_csv_adaptively(chunk_sizer, parameters, filepath_or_buffer):
+        """Read a CSV file in chunks sized by a ChunkSizer, adjusted after each chunk"""
+        with pd.read_csv(filepath_or_buffer, iterator=True, chunksize=chunk_sizer.get_chunk_size(),
+                         **parameters) as reader:
+            for chunk in iterate_adaptively(reader, chunk_sizer):
+                yield chunk
+
+    @staticmethod
+    def _read_compressed(read_function, filename, compression):
+        """Read a compressed file chunk by chunk while it is being decompressed"""
+        with open_stream(filename, compression) as f:
+            for chunk in read_function(f):
+                yield chunk
+
+    @staticmethod
+    def _read_command_output(read_function, filename, command):
+        """Read the output of external command(s) fed with a file chunk by chunk, while the commands are running"""
+        with CommandPipeline(command, stdin=filename) as pipeline:
+            try:
+                for chunk in read_function(pipeline.stdout):
+                    yield chunk
+            except pd.errors.EmptyDataError:
+                # Failed commands typically output nothing: report their error rather than the parser's
+                pipeline.check()
+                raise
+
+    def _split_for_locations(self, data, num_locations):
+        """
+        Assign chunks of the input data to the locations
+        - a table is split by position in as many contiguous slices as locations
+        - a list with one table per location is written as it is
+        - any other iterable of tables is streamed, chunks being assigned to locations in turn
+        :param data:
+        :param num_locations:
+        :return: iterator of (location index, chunk)
+        """
+        if isinstance(data, pd.DataFrame):
+            chunk_size = self._get_batch_size(data)
+            q, r = divmod(len(data), num_locations)
+            bounds = np.cumsum([0] + [q + 1] * r + [q] * (num_locations - r))
+            for idx in range(num_locations):
+                start, stop = bounds[idx], bounds[idx + 1]
+                step = chunk_size or max(stop - start, 1)
+                # Slices are views, the last one might be empty so that all locations get a header
+                for pos in range(start, max(stop, start + 1), step):
+                    yield idx, data.iloc[pos:min(pos + step, stop)]
+        elif isinstance(data, (list, tuple)) and len(data) == num_locations:
+            if not all([isinstance(df, pd.DataFrame) for df in data]):
+                raise ValueError('Wrong input type: {}'.format([type(df) for df in data]))
+            # The largest tables are formatted first so that formatting workers end up with balanced loads
+            for idx in Schedule([len(df) for df in data], num_locations).get_order():
+                yield idx, data[idx]
+        else:
+            for idx, df in enumerate(data):
+                yield idx % num_locations, df
+
+    def _read_location(self, chunks_iterator):
+        """Read and process all chunks of a single file"""
+        return [df for df in self._process_chunks(df for df in chunks_iterator if len(df))]
+
+    @staticmethod
+    def _add_partition_variables(chunks_iterator, partition):
+        """Add the partition keys of a file as constant variables"""
+        for chunk in chunks_iterator:
+            for key, value in partition.items():
+                chunk[key] = value
+            yield chunk
+
+    def _get_partitioned_output(self):
+        """Location of the files written with partition_by, if the location is a directory"""
+        location = self.get_location()
+        if location.is_partitioned() or len(location) != 1 or not os.path.isdir(location[0]):
+            return None
+        return FilesystemLocation(location[0], partitioning='hive', refresh=True)
+
+    def _write_partitioned(self, data, partition_by, partition_filename, compression='infer', compression_level=None,
+                           **kwargs):
+        """
+        Write a table or an iterator of tables in a hive partitioned layout, one file per partition. Each chunk is
+        split by partition, rows of a partition being appended to its file. When appending, files of existing
+        partitions are appended to
+        :return: num_rows_inserted
+        """
+        _, partition_by = is_listlike(partition_by)
+        partition_by = list(partition_by)
+        root = self.get_location()[0]
+        is_appending = self.mode_is_append()
+        header = kwargs.pop('header', True)
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+
+        writers = OrderedDict()
+        num_rows = 0
+        try:
+            for chunk in chunks:
+                for keys, group in chunk.groupby(partition_by, sort=False, dropna=False):
+                    keys = keys if isinstance(keys, tuple) else (keys,)
+                    filename = os.path.join(root, *[
+                        '{}={}'.format(k, HIVE_DEFAULT_PARTITION if pd.isnull(v) else quote(str(v), safe=''))
+                        for k, v in zip(partition_by, keys)] + [partition_filename])
+                    needs_header = False
+                    if filename not in writers:
+                        needs_header = header and not (is_appending and os.path.isfile(filename) and
+                                                       os.path.getsize(filename) > 0)
+                        writers[filename] = _AtomicFileWriter(filename, compression, compression_level, is_appending)
+                    writers[filename].write(_format_csv(group.drop(partition_by, axis=1), header=needs_header,
+                                                        **kwargs))
+                    num_rows += len(group)
+            for w in writers.values():
+                w.commit()
+        except Exception:
+            for w in writers.values():
+                w.abort()
+            raise
+        finally:
+            # Listings of the dataset are outdated
+            FilesystemLocation.clear_partition_cache()
+
+        logger.info('Wrote {} observations to {} partition(s)'.format(num_rows, len(writers)))
+        return num_rows
+
+    def _partition_metadata(self):
+        """Metadata of the partition keys: integers, floats or text depending on their values"""
+        partitions = self.get_location().get_partitions()
+        md = []
+        for key in self.get_location().get_partition_keys():
+            values = pd.Series([p[key] for p in partitions]).dropna()
+            is_integer = pd.api.types.is_integer_dtype(values)
+            is_float = not is_integer and pd.api.types.is_numeric_dtype(values)
+            md.append({'NAME': key, 'NUM_BYTES': values.astype(str).str.len().max(),
+                       'TYPE_IN_SOURCE': 'PARTITION', 'DATETIME_FORMAT': '',
+                       'IS_BOOLEAN': False, 'IS_INTEGER': is_integer, 'IS_FLOAT': is_float,
+                       'IS_DATE': False, 'IS_TIME': False, 'IS_TIMESTAMP': False,
+                       'IS_TEXT': not (is_integer or is_float)})
+        return pd.DataFrame(md).set_index('NAME')
+
     def fetch_metadata(self):
         """FETCHMETADATAINTERN Specialized def for fetching metadata"""
-        return self.get_dictionary().read_metadata()
+        if self.get_dictionary() is None:
+            return None
+        md = self.get_dictionary().read_metadata()
+        # Partition keys are virtual variables of the data source
+        if md is not None and len(self.get_location().get_partition_keys()):
+            md = md.add_variables(self._partition_metadata())
+        return md
     
     def technical_preprocessing(self, var, var_name):
         """TECHNICALPREPROCESSING Data source specific preprocessing"""
-        # Since all fields are read as text data, numeric fields have to
-        # be converted to numeric data
-        # TODO: implement data class DataDictionary
-        if self.get_metadata().is_numeric_variable(var_name):
-            return var.astype(float)
+        # Numeric fields might be read as text data and have to be converted to numeric data
+        md = self.get_metadata()
+        var_type = md.get_type(var_name)
+        if var_type == 'BOOLEAN':
+            if not pd.api.types.is_bool_dtype(var):
+                var = str_to_bool(var) if not pd.api.types.is_numeric_dtype(var) else var.astype(float)
+            # Booleans with missing values are kept as floats
+            return var.astype(bool) if not var.isnull().any() else var.astype(float)
+        if var_type == 'INTEGER':
+            var = _to_numeric(var, var_name)
+            return var.astype(np.int64) if not var.isnull().any() else var.astype(float)
+        if md.is_numeric_variable(var_name):
+            return _to_numeric(var, var_name).astype(float)
+        return var
+
+
+class _AtomicFileWriter(object):
+    """
+    Write a (possibly compressed) file through a temporary file of the same directory, which is renamed to the
+    target file on commit. Readers never see partially written files
+    """
+
+    def __init__(self, filename, compression='infer', compression_level=None, append=False):
+        if compression == 'infer':
+            compression = detect_compression(filename, use_magic_number=False)
+        directory, basename = os.path.split(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._filename = filename
+        if append:
+            # Appending cannot be made atomic: write to the target file directly
+            self._tmp_filename = None
+            self._fileobj = open_compressed(filename, 'ab', compression, compression_level)
+        else:
+            fd, self._tmp_filename = tempfile.mkstemp(prefix='.{}.'.format(basename), suffix='.tmp',
+                                                      dir=directory or None)
+            os.close(fd)
+            self._fileobj = open_compressed(self._tmp_filename, 'wb', compression, compression_level)
+
+    def write(self, content):
+        self._fileobj.write(content)
+
+    def commit(self):
+        self._fileobj.close()
+        if self._tmp_filename is not None:
+            set_default_mode(self._tmp_filename, self._filename)
+            replace_file(self._tmp_filename, self._filename)
+            self._tmp_filename = None
+
+    def abort(self):
+        self._fileobj.close()
+        if self._tmp_filename is not None and os.path.exists(self._tmp_filename):
+            os.remove(self._tmp_filename)
+            self._tmp_filename = None
+
+
+def _to_numeric(var, var_name):
+    """Convert values to numbers, failing on values which are not numbers rather than making them missing"""
+    if pd.api.types.is_numeric_dtype(var):
+        return var
+    numbers = pd.to_numeric(var, errors='coerce')
+    is_invalid = numbers.isnull() & var.notnull()
+    if is_invalid.any():
+        msg = '{} value(s) of {} are not numbers, e.g. {!r}'.format(is_invalid.sum(), var_name,
+                                                                    var[is_invalid].iloc[0])
+        logger.error(msg)
+        raise ValueError(msg)
+    return numbers
+
+
+def _format_csv(df, header=True, encoding='utf-8', **kwargs):
+    """Format a table as encoded CSV data"""
+    return df.to_csv(None, header=header, **kwargs).encode(encoding)
+
+
+def _format_csv_chunks(tasks, pool=None, max_pending=1, **kwargs):
+    """
+    Format chunks as CSV data, in worker processes if a pool is provided. Results are returned in order and at most
+    max_pending chunks are being formatted at the same time
+    :param tasks: iterator of (location index, chunk, header)
+    :param pool: multiprocessing.Pool
+    :param max_pending:
+    :param kwargs: parameters to be passed to pandas to_csv function
+    :return: iterator of (location index, number of rows, content)
+    """
+    pending = deque()
+    for idx, df, header in tasks:
+        if pool is None:
+            yield idx, len(df), _format_csv(df, header, **kwargs)
+            continue
+        pending.append((idx, len(df), pool.apply_async(_format_csv, (df, header), kwargs)))
+        if len(pending) >= max_pending:
+            idx, num_rows, result = pending.popleft()
+            yield idx, num_rows, result.get()
+    while pending:
+        idx, num_rows, result = pending.popleft()
+        yield idx, num_rows, result.get()
@@ -0,0 +1,190 @@
+import os
+import logging
+import mmap
+import time
+import numpy as np
+import pandas as pd
+from pyetl.datasource.core import DataSource
+from pyetl.datalocation import FilesystemLocation
+
+logger = logging.getLogger(__name__)
+
+
+class FixedWidthDataSource(DataSource):
+    """
+    Data source as fixed-width file(s), e.g. mainframe or SAS extracts.
+
+    The record layout is given by the dictionary: variables are laid out in the order of their position in the
+    dictionary (or of the input layout) and each one takes NUM_BYTES bytes. Files are memory-mapped, the number of
+    records is derived from the file size and only the requested columns are sliced and decoded.
+
+    Example:
+    ```python
+    from pyetl.datasource import FixedWidthDataSource
+    from pyetl.dictionary import ExcelDictionary
+
+    dictionary = ExcelDictionary('layout.xlsx', 'EXTRACT')
+    ds = FixedWidthDataSource('read-only', 'extract_*.dat', dictionary, 100000, columns=['ID', 'AMOUNT'])
+    df, _ = ds.read_all()
+    ```
+    """
+
+    # properties (Access = private)
+    _layout = None  # list of (variable name, offset, width) in record order
+    _record_length = None  # number of bytes per record, including the line terminator
+    _columns = None  # variables to read, None to read all variables
+    _line_terminator = b'\n'
+    _encoding = 'latin-1'
+
+    # methods (Access = public)
+    def __init__(self, source_type, filepath, dictionary, chunksize, columns=None, layout=None, line_terminator='\n',
+                 encoding='latin-1'):
+        """
+        Constructor for data source as fixed-width file(s)
+
+        :param source_type: access mode, only read-only is supported
+        :param filepath: file path(s), wildcards are accepted
+        :param dictionary: data dictionary providing variable types and sizes (NUM_BYTES)
+        :param chunksize: number of records to read at each step, or 'auto' (or a ChunkSizer) for chunks sized to a
+            memory budget
+        :param columns: variables to read
+        :param layout: variable names in record order, by default the order of the variables in the dictionary
+        :param line_terminator: record terminator, '' if records are not separated
+        :param encoding: encoding of text variables
+        """
+        location = FilesystemLocation(filepath)
+        self._columns = None if columns is None else list(columns)
+        self._layout = None if layout is None else list(layout)
+        self._line_terminator = line_terminator.encode('ascii') if not isinstance(line_terminator, bytes) \
+            else line_terminator
+        self._encoding = encoding
+        self._set_chunk_size(chunksize)
+        super(FixedWidthDataSource, self).__init__(source_type, True, location, dictionary, self._columns)
+        if not self.mode_is_read_only():
+            raise ValueError('Fixed-width data sources are read-only')
+
+    def num_data_locations(self):
+        """For files, there is only a single data location which itself is a collection of files"""
+        return 1
+
+    def exists(self):
+        """Check if the data source exists"""
+        return any([os.path.isfile(l) for l in self.get_location()])
+
+    def get_name(self, idx=None):
+        """Return file name as pattern"""
+        if idx is not None:
+            return os.path.splitext(os.path.basename(self.get_location()[idx]))
+        return [os.path.splitext(os.path.basename(l)) for l in self.get_location()]
+
+    # methods (Access = protected)
+    def compute_size(self):
+        """Get data source size: the number of records is the file size divided by the record length"""
+        num_rows = sum([self._num_records(f) for f in self.get_location()])
+        metadata = self.get_metadata()
+        return num_rows, -1 if metadata is None else len(metadata)
+
+    def fetch_metadata(self):
+        """Fetch metadata from the dictionary and derive the record layout"""
+        md = self.get_dictionary().read_metadata()
+        self._compute_layout(md)
+        if self._columns is not None:
+            md = md.extract_sub_catalog(self._columns)
+        return md
+
+    def technical_preprocessing(self, var, var_name=None):
+        """Variables are converted while being sliced from the records: nothing to do"""
+        return var
+
+    def _create_location_iterator(self):
+        """Initialize data source reader"""
+        for f in self.get_location():
+            yield self._iter_file(f)
+
+    # methods (Access = private)
+    def _compute_layout(self, md):
+        """Compute the offset and width of each variable within a record"""
+        if self._layout is not None:
+            var_name = self._layout
+        else:
+            position = md.get_variable_positions()
+            if position is None:
+                raise ValueError('The dictionary does not provide variable positions, a layout is required')
+            var_name = list(position.sort_values(kind='mergesort').index)
+
+        width = md.get_variable_sizes(var_name)
+        if pd.isnull(width).any():
+            raise ValueError('Missing sizes for variables: {}'.format(list(width.index[pd.isnull(width)])))
+        width = width.astype(int).values
+        offset = np.concatenate([[0], np.cumsum(width)[:-1]])
+
+        self._layout = [(v, int(o), int(w)) for v, o, w in zip(var_name, offset, width)]
+        self._record_length = int(width.sum()) + len(self._line_terminator)
+
+    def _num_records(self, filename):
+        size = os.path.getsize(filename)
+        if size % self._record_length:
+            # Tolerate a missing terminator after the last record
+            if (size + len(self._line_terminator)) % self._record_length:
+                raise ValueError('Size of {} ({} bytes) is not a multiple of the record length ({} bytes)'.format(
+                    filename, size, self._record_length))
+            size += len(self._line_terminator)
+        return size // self._record_length
+
+    def _iter_file(self, filename):
+        """Read a single file chunk by chunk, decoding the requested columns only"""
+        num_records = self._num_records(filename)
+        if not num_records:
+            return
+        with open(filename, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = block = records = field = None
+        try:
+            data = np.frombuffer(mapping, dtype=np.uint8)
+            usable_length = min(len(data), num_records * self._record_length)
+            columns = self._layout if self._columns is None else [l for l in self._layout if l[0] in self._columns]
+            md = self.get_metadata()
+
+            chunk_sizer = self.get_chunk_sizer()
+            start = 0
+            while start < num_records:
+                timer = time.time()
+                stop = min(start + (self.get_chunk_size() or num_records), num_records)
+                block = data[start * self._record_length:min(stop * self._record_length, usable_length)]
+                if len(block) < (stop - start) * self._record_length:
+                    # The last record is not followed by a line terminator
+                    block = np.concatenate([block, np.zeros((stop - start) * self._record_length - len(block),
+                                                            dtype=np.uint8)])
+                records = block.reshape(stop - start, self._record_length)
+
+                df = pd.DataFrame(index=pd.RangeIndex(start, stop))
+                for var_name, offset, width in columns:
+                    # Copy the column bytes only and view them as fixed-size strings
+                    field = np.ascontiguousarray(records[:, offset:offset + width]).view('S{}'.format(width)).ravel()
+                    df[var_name] = self._decode(field, md.get_type(var_name))
+                if chunk_sizer is not None:
+                    chunk_sizer.update(df, time.time() - timer)
+                start = stop
+                yield df
+        finally:
+            # Views of the mapping are released before it is closed, also when reading stops early
+            data = block = records = field = None
+            mapping.close()
+
+    def _decode(self, field, var_type):
+        """Vectorized conversion of fixed-size byte strings, blank fields being missing values"""
+        if var_type in ('BOOLEAN', 'INTEGER', 'FLOAT'):
+            field = np.char.strip(field)
+            is_present = field != b''
+            if var_type == 'INTEGER':
+                # Integers are not converted through floats so that large identifiers keep their precision
+                values = np.zeros(len(field), dtype=np.int64)
+                values[is_present] = field[is_present].astype(np.int64)
+                return values if is_present.all() else pd.arrays.IntegerArray(values, ~is_present)
+            values = np.full(len(field), np.nan)
+            values[is_present] = field[is_present].astype(float)
+            return values
+        # Text and datetime data: only trailing blanks are padding, blank fields are missing as in CSV files
+        values = np.char.decode(np.char.rstrip(field), self._encoding).astype(object)
+        values[values == ''] = np.nan
+        return values
@@ -1,9 +1,14 @@
+import itertools
+import threading
 import pandas as pd
 import numpy as np
 from pyetl.connections.vertica_connection import VerticaConnection
 from pyetl.utils.datetime import date_to_str
-from pyetl.utils.iterables import chunker
-from pyetl.datasource.core import DatabaseDataSource
+from pyetl.connections.pool import ConnectionPool
+from pyetl.datasource.core import DatabaseDataSource, WriteError, _traced_write
+from pyetl.pipeline import Pipeline
+from pyetl.utils.parallel import ParallelProcessor
+from pyetl.utils.scheduler import Schedule
 import logging
 
 logger = logging.getLogger(__name__)
@@ -38,6 +43,9 @@ class VerticaDataSource(DatabaseDataSource, VerticaConnection):
     ```
     """
 
+    # properties (Access = private)
+    _has_multiple_output_locations = True  # rows are split between locations, see write
+
     def __init__(self, *args, **kwargs):
         """
         Vezrtica data source
@@ -113,53 +121,50 @@ class VerticaDataSource(DatabaseDataSource, VerticaConnection):
             raise e
         return create_table_stmt
 
-    def write(self, tbl, chunksize=None, group_variable=None):
+    @_traced_write
+    def write(self, tbl, chunksize=None, group_variable=None, num_workers=4):
         """
-        Write input data to data source through the optional connection
+        Write input data to data source. With several locations, rows are split between the locations which are
+        loaded concurrently, each one on its own connection and in its own transaction
+        :param tbl: pandas.DataFrame, or any iterable of pandas.DataFrame (e.g. another data source's
+            get_data_iterator()) whose chunks are loaded concurrently, in turn to each location
+        :param chunksize: number of rows sent at once, by default the chunk size of the data source
+        :param group_variable: variable name(s), or group index of each row, splitting rows in as many groups as
+            locations. By default, rows are split by position in contiguous slices
+        :param num_workers: maximum number of locations (or chunks) loaded at the same time, i.e. of open connections
         :return: num_rows_inserted
         """
-        chunksize = chunksize or self.get_chunk_size()
-        location = self.get_location()
-        if len(location) > 1:
-            # Insert grouping by group_variable or split the table equally in the number of locations
+        tbl_name = self.get_location().get_table_name()
+        if not isinstance(tbl, pd.DataFrame):
             if group_variable is not None:
-                # Insert grouping by group_variable
-                if isinstance(group_variable, str) or (
-                        isinstance(group_variable, (tuple, list)) and len(group_variable) < len(tbl)):
-                    # Verify that the grouping variable(s) exist(s) in ALL the locations
-                    if not all([v in self.get_metadata().get_variable_names() for v in group_variable]):
-                        raise ValueError('Grouping variable does not exist in the table')
-                    else:
-                        pass
-                elif len(group_variable) == len(tbl):
-                    # Use the grouping variable as a group index
-                    pass
-                else:
-                    raise ValueError('Wrong group_variable')
-
-                # Create grouped data
-                grouped = tbl.groupby(group_variable)
-
-                if len(grouped) != len(location):
-                    raise ValueError('The number of locations do not match with the number of groups ({} != {}'.format(
-                        len(location), len(grouped)))
-
-                # Insert each group in a location
-                for idx, (_, group) in enumerate(tbl.groupby(group_variable)):
-                    schema, tbl_name = location[idx].split('.')
-                    group.to_sql(name=tbl_name, con=self._backend_connection, chunksize=chunksize, schema=schema,
-                                 if_exists='append', index=True, index_label=None, dtype=None, method='multi')
-            else:
-                # Split rows in locations. /!\ The last table might get less rows
-                for idx, chunk in enumerate(chunker(tbl, len(location))):
-                    schema, tbl_name = location[idx].split('.')
-                    chunk.to_sql(name=tbl_name, con=self._backend_connection, chunksize=chunksize, schema=schema,
-                                 if_exists='append', index=True, index_label=None, dtype=None, method='multi')
-        else:
-            # Insert the entire table in the location
-            schema, tbl_name = location[0].split('.')
-            tbl.to_sql(name=tbl_name, con=self._backend_connection, chunksize=chunksize, schema=schema,
-                       if_exists='append', index=True, index_label=None, dtype=None, method='multi')
+                raise ValueError('Grouping variables are only supported when writing a single table')
+            return self._write_chunks(tbl, tbl_name, chunksize, num_workers)
+        parts = self._split_for_locations(tbl, len(tbl_name), group_variable)
+
+        report = [{'location': l, 'status': 'pending', 'num_rows': 0, 'num_rows_sent': 0, 'error': None}
+                  for l in tbl_name]
+        with ConnectionPool(self.connect, max_size=max(min(num_workers, len(parts)), 1)) as pool:
+            processor = ParallelProcessor(pool.get_max_size(), backend='thread', fail_fast=False)
+            for idx, part in enumerate(parts):
+                processor.submit(self._load_location, pool, tbl_name[idx], part, chunksize, report[idx])
+            # The largest parts are loaded first
+            results = processor.run(raise_errors=False, schedule=Schedule([len(p) for p in parts], len(parts)))
+
+        for r, result in zip(report, results):
+            r['status'] = result.status
+            r['error'] = result.error
+            if result.is_successful():
+                r['num_rows'] = result.result
+        failed = [r for r in report if r['status'] != 'done']
+        if len(failed):
+            msg = 'Writing failed for {} location(s) out of {}: {}'.format(
+                len(failed), len(report), ', '.join(['{} ({})'.format(r['location'], r['error']) for r in failed]))
+            logger.error(msg)
+            raise WriteError(msg, report)
+
+        num_rows = sum([r['num_rows'] for r in report])
+        logger.info('Wrote {} observations to {} location(s)'.format(num_rows, len(report)))
+        return num_rows
 
     def split(self, num_splits, var_name_split):
         """
@@ -170,3 +175,93 @@ class VerticaDataSource(DatabaseDataSource, VerticaConnection):
         """
         # TODO: Implement split function
         raise NotImplementedError()
+
+    # methods (Access = private)
+    def _split_for_locations(self, tbl, num_locations, group_variable=None):
+        """
+        Split a table between locations, in a single pass over the data
+        :param tbl:
+        :param num_locations:
+        :param group_variable: see write
+        :return: list of tables, one per location
+        """
+        if num_locations == 1:
+            return [tbl]
+        if group_variable is None:
+            # Contiguous slices of (nearly) the same size
+            bounds = np.linspace(0, len(tbl), num_locations + 1).astype(int)
+            return [tbl.iloc[bounds[idx]:bounds[idx + 1]] for idx in range(num_locations)]
+
+        if isinstance(group_variable, str):
+            group_variable = [group_variable]
+        if isinstance(group_variable, (tuple, list)) and len(group_variable) < len(tbl):
+            # Verify that the grouping variable(s) exist(s)
+            if not all([v in tbl.columns for v in group_variable]):
+                raise ValueError('Grouping variable does not exist in the table')
+            group_variable = list(group_variable)
+        elif len(group_variable) != len(tbl):
+            raise ValueError('Wrong group_variable')
+
+        parts = [group for _, group in tbl.groupby(group_variable, sort=True)]
+        if len(parts) != num_locations:
+            raise ValueError('The number of locations do not match with the number of groups ({} != {})'.format(
+                num_locations, len(parts)))
+        return parts
+
+    def _write_chunks(self, chunks, tbl_name, chunksize, num_workers):
+        """
+        Load chunks concurrently, each one in its own transaction, while the next ones are being read
+        :return: num_rows_inserted
+        """
+        report = [{'location': l, 'status': 'done', 'num_rows': 0, 'num_rows_sent': 0, 'error': None}
+                  for l in tbl_name]
+        locations = itertools.cycle(range(len(tbl_name)))
+        lock = threading.Lock()
+
+        with ConnectionPool(self.connect, max_size=max(num_workers, 1)) as pool:
+            def load(df):
+                with lock:
+                    idx = next(locations)
+                chunk_report = {'num_rows_sent': 0}
+                try:
+                    num_rows = self._load_location(pool, tbl_name[idx], df, chunksize, chunk_report)
+                except Exception as e:
+                    with lock:
+                        report[idx].update(status='failed', error=e)
+                        report[idx]['num_rows_sent'] += chunk_report['num_rows_sent']
+                    raise
+                with lock:
+                    report[idx]['num_rows'] += num_rows
+                    report[idx]['num_rows_sent'] += num_rows
+                return df
+
+            pipeline = Pipeline(chunks, queue_size=max(num_workers, 1), preserve_order=False)
+            pipeline.add_transform(load, num_workers=max(num_workers, 1), name='load')
+            try:
+                pipeline.run()
+            except Exception as e:
+                msg = 'Writing failed after {} observations: {}'.format(sum([r['num_rows'] for r in report]), e)
+                logger.error(msg)
+                raise WriteError(msg, report)
+
+        num_rows = sum([r['num_rows'] for r in report])
+        logger.info('Wrote {} observations to {} location(s)'.format(num_rows, len(report)))
+        return num_rows
+
+    def _load_location(self, pool, tbl_name, tbl, chunksize, report):
+        """
+        Load a table into a location by chunks, in a single transaction
+        :return: num_rows_inserted
+        """
+        chunksize = self._get_batch_size(tbl, chunksize) or max(len(tbl), 1)
+        with pool.connection() as backend_connection:
+            try:
+                for start in range(0, len(tbl), chunksize):
+                    self.copy_from(tbl_name, tbl.iloc[start:start + chunksize], backend_connection)
+                    report['num_rows_sent'] = min(start + chunksize, len(tbl))
+                backend_connection.commit()
+            except Exception:
+                backend_connection.rollback()
+                raise
+        logger.debug('Loaded {} observations into {}'.format(len(tbl), tbl_name))
+        return len(tbl)
@@ -1,2 +1,7 @@
-from .excel_dictionary import ExcelDictionary
-from .vertica_dictionary import VerticaDictionary
+from pyetl.utils.lazy import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, [
+    ('.excel_dictionary', ['ExcelDictionary']),
+    ('.vertica_dictionary', ['VerticaDictionary']),
+    ('.inferred_dictionary', ['InferredDictionary']),
+])
@@ -0,0 +1,96 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import stat
+import tempfile
+import pandas as pd
+from pyetl.utils.files import replace_file
+
+logger = logging.getLogger(__name__)
+
+# Increase when the layout of cached metadata changes, so that existing cache files are ignored
+_CACHE_VERSION = 2
+
+
+def get_cache_directory():
+    """Directory of the metadata cache files of the current user: $XDG_CACHE_HOME/pyetl or ~/.cache/pyetl"""
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'pyetl', 'metadata')
+
+
+def get_cache_file(source, name=''):
+    """
+    Cache file of the metadata read from a source, in the cache directory of the current user so that reading
+    metadata never writes next to the data
+    :param source: path of the file the metadata is read from
+    :param name: distinguishes the metadata read from the same file, e.g. a sheet name
+    :return: path of the cache file
+    """
+    source = os.path.abspath(source)
+    digest = hashlib.sha1('\x1f'.join([source, str(name)]).encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_directory(), '{}.{}.json'.format(os.path.basename(source), digest[:16]))
+
+
+def read_cached_metadata(cache_file, key):
+    """
+    Read a metadata table from a cache file. Files which other users could have written are ignored
+    :param cache_file:
+    :param key: identifies the source the metadata has been read from, e.g. file path and modification time
+    :return: metadata table, None if the cache file is missing, outdated, unsafe or unreadable
+    """
+    if not os.path.isfile(cache_file):
+        return None
+    try:
+        if not _is_private(cache_file):
+            logger.warning('Ignoring metadata cache {}: owned or writable by another user'.format(cache_file))
+            return None
+        with io.open(cache_file, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+        if content.get('version') != _CACHE_VERSION or content.get('key') != _normalize_key(key):
+            logger.debug('Metadata cache {} is outdated'.format(cache_file))
+            return None
+        md = pd.read_json(io.StringIO(content['md']), orient='table')
+    except Exception as e:
+        logger.warning('Could not read metadata cache {}: {}'.format(cache_file, e))
+        return None
+    logger.debug('Metadata read from cache {}'.format(cache_file))
+    return md
+
+
+def write_cached_metadata(cache_file, key, md):
+    """
+    Write a metadata table to a cache file. Failures are logged but not raised: the cache is an optimization only
+    :param cache_file:
+    :param key:
+    :param md: metadata table
+    """
+    tmp_file = None
+    try:
+        directory = os.path.dirname(cache_file)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        content = {'version': _CACHE_VERSION, 'key': _normalize_key(key), 'md': md.to_json(orient='table')}
+        # Temporary files are only readable and writable by their owner
+        fd, tmp_file = tempfile.mkstemp(suffix='.tmp', dir=directory or None)
+        with io.open(fd, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(content))
+        replace_file(tmp_file, cache_file)
+    except Exception as e:
+        logger.warning('Could not write metadata cache {}: {}'.format(cache_file, e))
+        if tmp_file is not None and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def _normalize_key(key):
+    """Keys are compared as read back from JSON, e.g. tuples as lists"""
+    return json.loads(json.dumps(key))
+
+
+def _is_private(filename):
+    """Indicate if a file is owned by the current user and not writable by group or others"""
+    if not hasattr(os, 'getuid'):
+        return True
+    st = os.stat(filename)
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
@@ -1,19 +1,47 @@
+import hashlib
+import numpy as np
 import pandas as pd
 from pyetl.utils.iterables import is_listlike
+from pyetl.utils.dateparse import DatetimeParser, compile_datetime_format
+
+# Types which values of a type can be converted to without loss, besides text
+_COMPATIBLE_TYPES = {'BOOLEAN': ('INTEGER', 'FLOAT'), 'INTEGER': ('FLOAT',), 'DATE': ('TIMESTAMP',)}
 
 
 def _check_varname(func):
     def wrapper(*args, **kwargs):
         self = args[0]
+        records = self._records
+        try:
+            # Fast path: a single variable name
+            if args[1] in records:
+                return func(*args, **kwargs)
+        except TypeError:
+            # Unhashable input, i.e. a list of variable names
+            pass
         _, var_name = is_listlike(args[1])
-        var_in_md = pd.Index(var_name).isin(self.get_variable_names())
-        if not var_in_md.all():
-            raise ValueError('Unknown variable(s): {}'.format(pd.Index(var_name)[~var_in_md]))
-        else:
-            return func(*args, **kwargs)
+        unknown = [str(v) for v in var_name if v not in records]
+        if len(unknown):
+            raise ValueError('Unknown variable(s): {}'.format(unknown))
+        return func(*args, **kwargs)
     return wrapper
 
 
+class _VariableRecord(object):
+    """Compact description of a single variable of a metadata catalog"""
+    __slots__ = ('name', 'type', 'num_bytes', 'datetime_format')
+
+    def __init__(self, name, type, num_bytes, datetime_format):
+        self.name = name
+        self.type = type
+        self.num_bytes = num_bytes
+        self.datetime_format = datetime_format
+
+    def __repr__(self):
+        return '{}({}, {}, {}, {})'.format(self.__class__.__name__, self.name, self.type, self.num_bytes,
+                                           self.datetime_format)
+
+
 class DataDictionary(object):
     """DATADICTIONARY Abstract representation of a data dictionary"""
 
@@ -69,8 +97,19 @@ class DatabaseDictionary(DataDictionary):
         """READMETADATA Read all metadata from dictionary"""
         md = self._read_metadata(conn, tbl_name)
         # Extract only the required metadata
-        if var_name is None:
-            return md.extract_sub_catalog(var_name)
+        if var_name is None or not len(var_name):
+            return md
+        return md.extract_sub_catalog(var_name)
+
+    def read_metadata_bulk(self, conn, tbl_names, var_name=None):
+        """
+        READMETADATABULK Read metadata for several tables. By default, tables are processed one by one
+        :param conn:
+        :param tbl_names:
+        :param var_name:
+        :return: list of metadata catalogs, one per table
+        """
+        return [self.read_metadata(conn, t, var_name) for t in tbl_names]
 
 
 class MetadataCatalog(object):
@@ -83,6 +122,9 @@ class MetadataCatalog(object):
     _is_time = None          # flag indicating time variables
     _is_timestamp = None     # flag indicating timestamp variables
     _is_case_sensitive = None # flag indicating if the metadata catalog is case sensitive
+    _records = None  # variable name -> _VariableRecord, for constant-time lookups
+    _names_by_type = None  # type(s) -> frozenset of variable names
+    _signature = None  # content hash over variable names, types, sizes and datetime formats
 
     # methods (Access = private)
 
@@ -91,6 +133,29 @@ class MetadataCatalog(object):
         var_names = self.get_variable_names()
         return var_names[flag_array]
 
+    def _is_variable_name(self, var_name):
+        """Indicate if the input is a single variable name of the catalog, as opposed to a list of names"""
+        try:
+            return var_name in self._records
+        except TypeError:
+            return False
+
+    def _compute_signature(self):
+        """Hash sorted variable descriptions, with sizes and formats normalized so that e.g. 8 and 8.0 match"""
+        def normalize(value):
+            if value is None or (not isinstance(value, str) and pd.isnull(value)):
+                return ''
+            if isinstance(value, (int, float, np.number)) and float(value).is_integer():
+                return str(int(value))
+            return str(value)
+
+        sha = hashlib.sha1()
+        for name in sorted(self._records):
+            r = self._records[name]
+            sha.update('\x1f'.join([str(name), normalize(r.type), normalize(r.num_bytes),
+                                    normalize(r.datetime_format)]).encode('utf-8') + b'\x1e')
+        return sha.hexdigest()
+
     def _check_type(self):
         """CHECKTYPE Check if each variable has a single associated type"""
         has_one_type_only = self._md.loc[:, ['IS_BOOLEAN', 'IS_INTEGER', 'IS_FLOAT', 'IS_DATE', 'IS_TIME', 'IS_TIMESTAMP', 'IS_TEXT']]
@@ -106,16 +171,16 @@ class MetadataCatalog(object):
             raise ValueError('Invalid metadata table')
 
         # Determine each variable's type
-        md['TYPE'] = pd.np.nan
+        md['TYPE'] = pd.Series(np.nan, index=md.index, dtype=object)
         for t in {'BOOLEAN', 'INTEGER', 'FLOAT', 'DATE', 'TIME', 'TIMESTAMP', 'TEXT'}:
-            md.loc[md[t], 'TYPE'] = t
+            md.loc[md['IS_' + t], 'TYPE'] = t
 
         # Set properties
         self._md = md
         self._is_case_sensitive = is_case_sensitive
         # If the metadata is not case sensitive, convert variable names
         # to upper characters
-        if ~self._is_case_sensitive:
+        if not self._is_case_sensitive:
             self._md.index = self._md.index.str.upper()
 
         # Sort the catalog according to variable names
@@ -125,11 +190,88 @@ class MetadataCatalog(object):
         self._is_time = self._md['IS_TIME']
         self._is_date = self._md['IS_DATE']
         self._is_timestamp = self._md['IS_TIMESTAMP']
+        # Index variables by name and by type. The catalog is not modified afterwards
+        num_var = len(self._md)
+        num_bytes = self._md['NUM_BYTES'] if 'NUM_BYTES' in self._md else [None] * num_var
+        datetime_format = self._md['DATETIME_FORMAT'] if 'DATETIME_FORMAT' in self._md else [None] * num_var
+        self._records = dict((n, _VariableRecord(n, t, b, f)) for n, t, b, f in zip(
+            self._md.index, self._md['TYPE'], num_bytes, datetime_format))
+        self._names_by_type = dict(((t,), frozenset(names)) for t, names in self._md.groupby('TYPE').groups.items())
+        self._signature = self._compute_signature()
 
     def __repr__(self):
         """DISP Display catalog"""
         return self._md.__repr__()
 
+    def __eq__(self, other):
+        """Catalogs are equal if they describe the same variables with the same types, sizes and formats"""
+        if not isinstance(other, MetadataCatalog):
+            return NotImplemented
+        return self._signature == other._signature
+
+    def __ne__(self, other):
+        is_equal = self.__eq__(other)
+        return is_equal if is_equal is NotImplemented else not is_equal
+
+    def __hash__(self):
+        return int(self._signature[:16], 16)
+
+    def get_signature(self):
+        """
+        GETSIGNATURE Stable content hash over variable names, types, sizes and datetime formats. It does not depend
+        on the order of the variables nor on the process, and can be used as a cache key
+        """
+        return self._signature
+
+    def is_compatible_with(self, other):
+        """
+        ISCOMPATIBLEWITH Indicate if data described by this catalog can be moved to a data source described by the
+        input catalog: all variables have to exist in the input catalog with the same type, and text variables
+        must fit in the target sizes
+        """
+        if self._signature == other.get_signature():
+            return True
+        for name, record in self._records.items():
+            try:
+                if other.get_type(name) != record.type:
+                    return False
+            except ValueError:
+                # Unknown variable in the target catalog
+                return False
+            if record.type == 'TEXT':
+                target_size = other.get_variable_sizes(name)
+                if not pd.isnull(record.num_bytes) and not pd.isnull(target_size) and \
+                        record.num_bytes > target_size:
+                    return False
+        return True
+
+    def map_variables(self, other):
+        """
+        MAPVARIABLES Map the variables of this catalog to the variables of the input catalog, e.g. of a target data
+        source. Names are matched regardless of case and variables missing from the input catalog are left out.
+        Types have to be compatible: booleans and integers fit in floats, dates in timestamps and anything in text
+        Returns a dict: variable name -> variable name in the input catalog
+        """
+        target_names = dict((str(n).upper(), n) for n in other.get_variable_names())
+        mapping = {}
+        errors = []
+        for name, record in self._records.items():
+            target_name = target_names.get(str(name).upper())
+            if target_name is None:
+                continue
+            mapping[name] = target_name
+            target_type = other.get_type(target_name)
+            if record.type != target_type and target_type != 'TEXT' and \
+                    target_type not in _COMPATIBLE_TYPES.get(record.type, ()):
+                errors.append('{} ({} -> {})'.format(name, record.type, target_type))
+
+        missing = sorted(set(target_names.values()) - set(mapping.values()))
+        if len(missing):
+            raise ValueError('Variable(s) missing from the source: {}'.format(missing))
+        if len(errors):
+            raise ValueError('Incompatible types: {}'.format(', '.join(errors)))
+        return mapping
+
     def size(self, dim=None):
         # SIZE Return size of the metadata catalog
         return self._md.shape if dim is None else self._md.shape[dim]
@@ -147,12 +289,29 @@ class MetadataCatalog(object):
         GETTYPE Get type of the input given variable
         Returns BOOLEAN, INTEGER, FLOAT, DATE, TIME, TIMESTAMP or TEXT
         """
-        return self._md.loc[var_name, 'TYPE']
+        if not self._is_variable_name(var_name):
+            return self.types_of(var_name)
+        return self._records[var_name].type
+
+    @_check_varname
+    def types_of(self, var_name):
+        """TYPESOF Get types of the input given variables, as a list"""
+        records = self._records
+        return [records[v].type for v in var_name]
 
     @_check_varname
     def get_datetime_format(self, var_name):
         """GETDATETIMEFORMAT Get datetime format of the input given variable"""
-        return self._md.loc[var_name, 'DATETIME_FORMAT']
+        if not self._is_variable_name(var_name):
+            return [self._records[v].datetime_format for v in var_name]
+        return self._records[var_name].datetime_format
+
+    def get_variables_of_type(self, *var_type):
+        """GETVARIABLESOFTYPE Names of the variables of the input given type(s), as a set"""
+        if var_type not in self._names_by_type:
+            self._names_by_type[var_type] = frozenset().union(
+                *[self._names_by_type.get((t,), frozenset()) for t in var_type])
+        return self._names_by_type[var_type]
 
     # Type-based variable getters
     def get_boolean_vars(self):
@@ -177,27 +336,40 @@ class MetadataCatalog(object):
         return self._variable_getter(self._md['IS_TEXT'])
 
     # Type checkers
+    # A single variable name returns a boolean, a list of variable names returns a boolean array
+    def _has_type(self, var_name, var_type):
+        names = self.get_variables_of_type(*var_type)
+        if self._is_variable_name(var_name):
+            return var_name in names
+        return np.array([v in names for v in var_name], dtype=bool)
+
     @_check_varname
     def is_date_variable(self, var_name):
-        return self._is_date[self.get_variable_names() == var_name]
+        return self._has_type(var_name, ('DATE',))
 
     @_check_varname
     def is_timestamp_variable(self, var_name):
-        return self._is_timestamp[self.get_variable_names() == var_name]
+        return self._has_type(var_name, ('TIMESTAMP',))
 
     @_check_varname
     def is_time_variable(self, var_name):
-        return self._is_time[self.get_variable_names() == var_name]
+        return self._has_type(var_name, ('TIME',))
 
     @_check_varname
     def is_numeric_variable(self, var_name):
-        return self._is_numeric[self.get_variable_names() == var_name]
+        return self._has_type(var_name, ('BOOLEAN', 'INTEGER', 'FLOAT'))
 
     @_check_varname
     def get_variable_sizes(self, var_name):
         """GETVARIABLESIZES Return the size (number of bytes) of the input given variables"""
         return self._md.loc[var_name, 'NUM_BYTES']
 
+    def get_variable_positions(self):
+        """GETVARIABLEPOSITIONS Return the position of each variable in the source layout, None if unknown"""
+        if 'POSITION' not in self._md:
+            return None
+        return self._md.loc[:, 'POSITION']
+
     def get_type_in_source(self):
         """GETTYPEINSOURCE Return the type in the data source along with the variable name"""
         return self._md.loc[:, 'TYPE_IN_SOURCE']
@@ -206,13 +378,18 @@ class MetadataCatalog(object):
     def extract_sub_catalog(self, var_name):
         """EXTRACTSUBCATALOG Extract a subcatalog of metadata for the input given list of variables"""
         # If the input list is empty, return the current object
-        if len(var_name):
+        if not len(var_name):
             return self.__class__(self._md.copy(), self._is_case_sensitive)
 
         # Extract the subcatalog
         return self.__class__(self._md.loc[var_name, :].copy(), self._is_case_sensitive)
 
-    def check_metadata_completeness(self):
+    def add_variables(self, md):
+        """ADDVARIABLES Return a new catalog including the variables described by the input metadata table"""
+        md = pd.concat([self._md.drop('TYPE', axis=1), md], axis=0, sort=False)
+        return self.__class__(md, self._is_case_sensitive)
+
+    def check_metadata_completeness(self, raise_error=True):
         """
         CHECKMETADATACOMPLETENESS Checks metadata completeness, i.e.
         that each variable is associated to one and exactly ony data
@@ -222,31 +399,46 @@ class MetadataCatalog(object):
         # Make sure each variable has exactly one associated type
         has_one_type_only = self._check_type()
         # Check datetime formats
-        requires_datetime_format = self._is_date | self._is_time | self._is_timestamp
-        has_datetime_format = ~requires_datetime_format or (self._md['DATETIME_FORMAT'] != '')
+        requires_datetime_format = (self._is_date | self._is_time | self._is_timestamp).values
+        has_datetime_format = ~requires_datetime_format | (self._md['DATETIME_FORMAT'] != '').values
         # Final output
-        is_complete = has_one_type_only and has_datetime_format
-        # If the def is called without any output argument, throw
-        # an error if the metadata catalog is not complete
-        if not all(is_complete):
+        is_complete = has_one_type_only & has_datetime_format
+        # Throw an error if the metadata catalog is not complete, unless the caller handles it
+        if raise_error and not all(is_complete):
             var_name = self.get_variable_names()
-            var_name = var_name(~is_complete)
+            var_name = var_name[~is_complete]
             raise ValueError('Invalid metadata detected for variables: {}'.format(var_name))
+        return is_complete
+
+    @_check_varname
+    def get_datetime_parser(self, var_name):
+        """
+        GETDATETIMEPARSER Return a parser of the input datetime variable, built from its datetime format
+        :return: parser, None if the variable is not a datetime variable or if its format is not supported
+        """
+        if not self._has_type(var_name, ('DATE', 'TIME', 'TIMESTAMP')):
+            return None
+        compiled_format = compile_datetime_format(self.get_datetime_format(var_name))
+        if compiled_format is None:
+            return None
+        input_format, is_fixed_width = compiled_format
+        return DatetimeParser(input_format, fixed_width=is_fixed_width)
 
     @_check_varname
-    def format_datetime_data(self, var_name, var_in):
-        """FORMATDATETIMEDATA Apply datetime format to input variable"""
-        # Get the associated row
-        datetime_format = self._md.get_datetime_format(var_name)
-        # Convert relevant variables to datetime
+    def format_datetime_data(self, var_name, var_in, parser=None):
+        """
+        FORMATDATETIMEDATA Apply datetime format to input variable
+        :param var_name:
+        :param var_in:
+        :param parser: parser of the variable, by default built from its datetime format
+        """
         # This function only applies to date, time and timestamp data
-        if self._md.is_date_variable(var_name):
-            var_out = pd.to_datetime(var_in, errors='coerce', format=datetime_format)
-        elif self._md.is_time_variable(var_name):
-            var_out = pd.to_timedelta(var_in, errors='coerce')
-        elif self._md.is_timestamp_variable(var_name):
-            var_out = pd.to_datetime(var_in, errors='coerce', unit=datetime_format)
-        else:
-            var_out = var_in
-
-        return var_out
+        parser = parser or self.get_datetime_parser(var_name)
+        if parser is not None:
+            return parser(var_in)
+        # Unsupported datetime formats: let pandas infer them
+        if self.is_date_variable(var_name) or self.is_timestamp_variable(var_name):
+            return pd.to_datetime(var_in, errors='coerce')
+        elif self.is_time_variable(var_name):
+            return pd.to_timedelta(var_in, errors='coerce')
+        return var_in
@@ -0,0 +1,219 @@
+import io
+import logging
+import os
+import numpy as np
+import pandas as pd
+from multiprocessing.pool import ThreadPool
+from pyetl.datalocation import FilesystemLocation
+from pyetl.dictionary.core import DataDictionary, MetadataCatalog
+from pyetl.dictionary.cache import get_cache_file, read_cached_metadata, write_cached_metadata
+from pyetl.utils.compression import detect_compression
+from pyetl.utils.string import BOOLEAN_STRINGS
+
+logger = logging.getLogger(__name__)
+
+# Candidate datetime formats, tried in order: (dictionary format, strptime format, type)
+_DATETIME_CANDIDATES = [
+    ('yyyy-MM-dd', '%Y-%m-%d', 'DATE'),
+    ('dd/MM/yyyy', '%d/%m/%Y', 'DATE'),
+    ('dd.MM.yyyy', '%d.%m.%Y', 'DATE'),
+    ('yyyy/MM/dd', '%Y/%m/%d', 'DATE'),
+    ('ddMMMyyyy', '%d%b%Y', 'DATE'),
+    ('yyyy-MM-dd HH:mm:ss', '%Y-%m-%d %H:%M:%S', 'TIMESTAMP'),
+    ("yyyy-MM-dd'T'HH:mm:ss", '%Y-%m-%dT%H:%M:%S', 'TIMESTAMP'),
+    ('dd/MM/yyyy HH:mm:ss', '%d/%m/%Y %H:%M:%S', 'TIMESTAMP'),
+    ('ddMMMyyyy:HH:mm:ss', '%d%b%Y:%H:%M:%S', 'TIMESTAMP'),
+    ('HH:mm:ss', '%H:%M:%S', 'TIME'),
+    ('HH:mm', '%H:%M', 'TIME'),
+]
+# Number of distinct values datetime formats are first tried on, before being tried on all values
+_NUM_HEAD_VALUES = 5
+# Integers, without leading zeros which denote codes (e.g. postal codes) to be kept as text
+_INTEGER_PATTERN = r'[+-]?(0|[1-9][0-9]*)$'
+_LEADING_ZERO_PATTERN = r'[+-]?0[0-9]'
+_TYPES = ['BOOLEAN', 'INTEGER', 'FLOAT', 'DATE', 'TIME', 'TIMESTAMP', 'TEXT']
+# Options of pandas read_csv function which are relevant when parsing a sample
+_CSV_PARSING_OPTIONS = ('sep', 'delimiter', 'encoding', 'quotechar', 'escapechar', 'decimal', 'thousands',
+                        'na_values', 'keep_default_na')
+# Files smaller than this are sampled from their first rows
+_MIN_SIZE_FOR_BLOCK_SAMPLING = 4 * 1024 * 1024
+_NUM_BLOCKS = 32
+
+
+class InferredDictionary(DataDictionary):
+    """
+    INFERREDDICTIONARY Data dictionary inferred from a sample of the rows of CSV file(s)
+
+    Types (boolean, integer, float, date, time, timestamp or text), maximum byte lengths and datetime formats are
+    inferred from rows sampled at random or evenly spaced offsets of each file. Files are sampled in parallel and
+    the inferred metadata is cached in the user's cache directory, as long as the files are unchanged.
+
+    Example:
+    ```python
+    from pyetl.dictionary import InferredDictionary
+
+    md = InferredDictionary('extract_*.csv', sample_size=50000, sep=';').read_metadata()
+    ```
+    """
+
+    # properties (Access = private)
+    _location = None
+    _sample_size = 10000
+    _sampling = 'random'
+    _num_workers = 4
+    _random_state = 0
+    _use_cache = True
+    _cache_file = None
+    _parameters = None
+
+    # methods (Access = public)
+    def __init__(self, filepath, sample_size=10000, sampling='random', num_workers=4, random_state=0,
+                 use_cache=True, cache_file=None, **kwargs):
+        """
+        INFERREDDICTIONARY Data dictionary inferred from the data itself
+        :param filepath: file path(s), wildcards are accepted
+        :param sample_size: total number of rows to sample across all files
+        :param sampling: 'random' (blocks of rows at random offsets), 'stride' (blocks of rows at evenly spaced
+            offsets) or 'head' (first rows of each file). Compressed files are always sampled from their first rows
+        :param num_workers: number of files sampled at the same time
+        :param random_state: seed of the random sampling, so that the inferred metadata is reproducible
+        :param use_cache: store inferred metadata in a cache file, reused as long as the files are unchanged
+        :param cache_file: path of the cache file, by default in the user's cache directory (see
+            pyetl.dictionary.cache.get_cache_directory)
+        :param kwargs: CSV parsing parameters of pandas read_csv function, e.g. sep or encoding
+        """
+        if sampling not in ('random', 'stride', 'head'):
+            raise ValueError('Unsupported sampling: {}'.format(sampling))
+        self._location = filepath if isinstance(filepath, FilesystemLocation) else FilesystemLocation(filepath)
+        self._sample_size = int(sample_size)
+        self._sampling = sampling
+        self._num_workers = max(int(num_workers), 1)
+        self._random_state = random_state
+        self._use_cache = use_cache
+        self._cache_file = cache_file
+        self._parameters = {k: v for k, v in kwargs.items() if k in _CSV_PARSING_OPTIONS}
+
+    def read_metadata(self):
+        files = [f for f in self._location if os.path.isfile(f)]
+        if not len(files):
+            logger.warning('No file to infer metadata from: {}'.format(self._location))
+            return None
+
+        # Reuse inferred metadata as long as the files and the sampling parameters are unchanged
+        cache_file = self._cache_file or get_cache_file(files[0], 'inferred')
+        cache_key = (tuple([(f, os.path.getmtime(f), os.path.getsize(f)) for f in files]), self._sample_size,
+                     self._sampling, self._random_state, sorted([(k, repr(v)) for k, v in self._parameters.items()]))
+        md = read_cached_metadata(cache_file, cache_key) if self._use_cache else None
+        if md is None:
+            md = self._infer_metadata(self._sample_files(files))
+            if self._use_cache:
+                write_cached_metadata(cache_file, cache_key, md)
+        return MetadataCatalog(md, is_case_sensitive=True)
+
+    # methods (Access = private)
+    def _sample_files(self, files):
+        """Sample all files, in parallel, and stack the samples"""
+        num_rows = -(-self._sample_size // len(files))
+        tasks = [(f, num_rows, self._random_state + idx) for idx, f in enumerate(files)]
+        num_workers = min(self._num_workers, len(files))
+        if num_workers > 1:
+            # Sampling is I/O bound and parsing releases the GIL: threads avoid copying samples between processes
+            pool = ThreadPool(num_workers)
+            try:
+                samples = pool.map(lambda t: self._sample_file(*t), tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            samples = [self._sample_file(*t) for t in tasks]
+        return pd.concat(samples, axis=0, ignore_index=True, sort=False)
+
+    def _sample_file(self, filename, num_rows, seed):
+        """
+        Sample rows of a file as text data. Large uncompressed files are sampled by blocks of consecutive rows
+        read at several offsets, without reading the whole file
+        """
+        read_function = self._read_csv
+        compression = detect_compression(filename)
+        size = os.path.getsize(filename)
+        if self._sampling == 'head' or compression is not None or size < _MIN_SIZE_FOR_BLOCK_SAMPLING:
+            return read_function(filename, nrows=num_rows, compression=compression)
+
+        columns = list(read_function(filename, nrows=0).columns)
+        with open(filename, 'rb') as f:
+            f.readline()
+            data_start = f.tell()
+            if self._sampling == 'stride':
+                offsets = np.linspace(data_start, size, _NUM_BLOCKS, endpoint=False)
+            else:
+                offsets = np.sort(np.random.RandomState(seed).randint(data_start, size, _NUM_BLOCKS))
+            rows_per_block = -(-num_rows // _NUM_BLOCKS)
+
+            lines = []
+            for offset in offsets.astype(np.int64):
+                if offset < f.tell():
+                    # Blocks do not overlap
+                    continue
+                f.seek(offset)
+                if offset > data_start:
+                    # Skip the partial line the offset falls in
+                    f.readline()
+                for _ in range(rows_per_block):
+                    line = f.readline()
+                    if not line:
+                        break
+                    lines.append(line if line.endswith(b'\n') else line + b'\n')
+
+        try:
+            return read_function(io.BytesIO(b''.join(lines)), header=None, names=columns)
+        except (pd.errors.ParserError, UnicodeDecodeError) as e:
+            # Typically quoted fields containing line breaks, which cannot be sampled from arbitrary offsets
+            logger.warning('Could not sample {} by blocks ({}), sampling its first rows instead'.format(filename, e))
+            return read_function(filename, nrows=num_rows)
+
+    def _read_csv(self, filepath_or_buffer, **kwargs):
+        """Read CSV data as text, missing values being NaN"""
+        kwargs.update(self._parameters)
+        return pd.read_csv(filepath_or_buffer, dtype=str, **kwargs)
+
+    @staticmethod
+    def _infer_metadata(sample):
+        """Infer the type, size and datetime format of each variable of a sample"""
+        md = pd.DataFrame(index=pd.Index(sample.columns, name='NAME'))
+        md['POSITION'] = range(len(md))
+        md['TYPE_IN_SOURCE'] = 'INFERRED'
+        inferred = [_infer_variable(sample[c]) for c in sample.columns]
+        md['NUM_BYTES'] = [num_bytes for _, num_bytes, _ in inferred]
+        for t in _TYPES:
+            md['IS_' + t] = [var_type == t for var_type, _, _ in inferred]
+        md['DATETIME_FORMAT'] = [datetime_format for _, _, datetime_format in inferred]
+        return md
+
+
+def _infer_variable(values):
+    """
+    Infer the type of a variable from sampled text values. Types are tried from the most to the least specific
+    :return: type, number of bytes, datetime format
+    """
+    values = values.dropna().astype(str)
+    # Only distinct values need to be checked
+    uniques = pd.Series(values.unique()).str.strip()
+    uniques = uniques[uniques != '']
+    num_bytes = int(uniques.str.encode('utf-8').str.len().max()) if len(uniques) else 1
+    if not len(uniques):
+        return 'TEXT', num_bytes, ''
+
+    if uniques.str.lower().isin(list(BOOLEAN_STRINGS)).all():
+        return 'BOOLEAN', num_bytes, ''
+    has_leading_zero = uniques.str.match(_LEADING_ZERO_PATTERN).any()
+    if not has_leading_zero and uniques.str.match(_INTEGER_PATTERN).all():
+        return 'INTEGER', num_bytes, ''
+    if not has_leading_zero and pd.to_numeric(uniques, errors='coerce').notnull().all():
+        return 'FLOAT', num_bytes, ''
+    # Most formats are rejected on the first values, without parsing all of them
+    head = uniques.iloc[:_NUM_HEAD_VALUES]
+    for datetime_format, strptime_format, var_type in _DATETIME_CANDIDATES:
+        if pd.to_datetime(head, format=strptime_format, errors='coerce').notnull().all() and \
+                pd.to_datetime(uniques, format=strptime_format, errors='coerce').notnull().all():
+            return var_type, num_bytes, datetime_format
+    return 'TEXT', num_bytes, ''
@@ -1,5 +1,5 @@
+import pandas as pd
 from pyetl.dictionary.core import DatabaseDictionary, MetadataCatalog
-import numpy as np
 
 
 class VerticaDictionary(DatabaseDictionary):
@@ -34,6 +34,43 @@ class VerticaDictionary(DatabaseDictionary):
         df = conn.table_owner(name, schema)
         return (True, df['owner_name'][0]) if len(df) > 0 else (False, None)
     
+    def read_metadata_bulk(self, conn, tbl_names, var_name=None):
+        """
+        READMETADATABULK Read metadata for several tables with a single query. Tables sharing the same column/type
+        signature share the same metadata catalog, which is built only once
+        :param conn: pydatabase.vertica.VerticaClient
+        :param tbl_names: table names as [schema name].[table name]
+        :param var_name:
+        :return: list of metadata catalogs, one per table
+        """
+        tbl_names = [t.upper() for t in tbl_names]
+        query = """
+        SELECT UPPER(table_schema || '.' || table_name) AS TABLE_NAME, column_name as NAME, data_type as TYPE,
+            data_type_length AS LENGTH
+        FROM v_catalog.columns
+        WHERE UPPER(table_schema || '.' || table_name) IN ({})
+        """.format(', '.join(["'{}'".format(t) for t in sorted(set(tbl_names))]))
+        md = conn.fetch(query)
+
+        # Group columns by table and identify tables by their column/type signature, i.e. their sorted column
+        # descriptions (lengths being normalized so that missing lengths, 8 and 8.0 match). A single catalog is built
+        # per signature
+        signature = {}
+        catalogs = {}
+        for tbl, group in md.groupby('TABLE_NAME', sort=False):
+            signature[tbl] = tuple(sorted(zip(group['NAME'].str.upper(), group['TYPE'].str.upper(),
+                                              [_normalize_length(l) for l in group['LENGTH']])))
+            if signature[tbl] not in catalogs:
+                catalog = self._build_metadata_catalog(group.drop('TABLE_NAME', axis=1))
+                if var_name is not None and len(var_name):
+                    catalog = catalog.extract_sub_catalog(var_name)
+                catalogs[signature[tbl]] = catalog
+
+        missing_tbl = [t for t in tbl_names if t not in signature]
+        if len(missing_tbl):
+            raise ValueError('No metadata for table(s) {}'.format(missing_tbl))
+        return [catalogs[signature[t]] for t in tbl_names]
+
     # methods (Access = protected)
     def _read_metadata(self, conn, tbl_name):
         """
@@ -55,7 +92,15 @@ class VerticaDictionary(DatabaseDictionary):
         md = conn.fetch(query)
         if not len(md):
             raise ValueError('No metadata for table {}'.format(tbl_name))
+        return self._build_metadata_catalog(md)
 
+    @staticmethod
+    def _build_metadata_catalog(md):
+        """
+        Build the metadata catalog of a table from its columns, as found in v_catalog.columns
+        :param md: table with NAME, TYPE and LENGTH variables
+        :return: md
+        """
         md = (md
               # Use variable names as row names, then remove the NAME column
               .set_index('NAME', inplace=False)
@@ -72,7 +117,7 @@ class VerticaDictionary(DatabaseDictionary):
         md['IS_TIMESTAMP'] = type_upper == 'TIMESTAMP'
         md['IS_TIME'] = type_upper == 'TIME'
         # Determine datetime formats for date and time data
-        md['DATETIME_FORMAT'] = np.nan
+        md['DATETIME_FORMAT'] = ''
         md.loc[md['IS_DATE'], 'DATETIME_FORMAT'] = 'yyyy-MM-dd'
         md.loc[md['IS_TIME'], 'DATETIME_FORMAT'] = 'HH:mm:ss'
         # Determine datetime formats for timestamp data
@@ -86,9 +131,16 @@ class VerticaDictionary(DatabaseDictionary):
         # Create the metadata catalog
         md = MetadataCatalog(md, is_case_sensitive=False)
         # Check that all formats have been correctly processed
-        format_check = md.check_metadata_completeness()
+        format_check = md.check_metadata_completeness(raise_error=False)
         if not all(format_check):
             unsupported_format = md.get_type_in_source()
             unsupported_format = unsupported_format[~format_check].unique()
             raise ValueError('Unsupported Vertica format: {}'.format(unsupported_format))
         return md
+
+
+def _normalize_length(length):
+    """Column length comparable between tables: None when missing, an integer when integral"""
+    if length is None or pd.isnull(length):
+        return None
+    return int(length) if float(length).is_integer() else float(length)
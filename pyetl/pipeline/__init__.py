@@ -0,0 +1,5 @@
+from pyetl.utils.lazy import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, [
+    ('.core', ['Pipeline', 'PipelineAborted', 'StageMetrics']),
+])
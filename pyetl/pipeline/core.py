@@ -0,0 +1,404 @@
+import logging
+import threading
+import time
+from pyetl import tracing
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger(__name__)
+
+# End of a stream of chunks, sent by the last worker of a stage to each worker of the next stage
+_END = object()
+# Period at which blocked workers check whether the pipeline has been aborted
+_POLL_INTERVAL = 0.1
+
+
+class PipelineAborted(Exception):
+    """Raised within the stages of a pipeline which is being stopped because another stage failed"""
+    pass
+
+
+class StageMetrics(object):
+    """
+    STAGEMETRICS Throughput of a pipeline stage
+
+    busy_time is the time spent within the stage's function, summed over its workers, while input_wait_time and
+    output_wait_time are the times spent waiting for chunks from the previous stage and for room in the next queue.
+    A stage with a high output wait time is faster than the ones after it, and conversely.
+    """
+
+    def __init__(self, name, num_workers):
+        self.name = name
+        self.num_workers = num_workers
+        self.num_chunks = 0
+        self.num_rows = 0
+        self.busy_time = 0.
+        self.input_wait_time = 0.
+        self.output_wait_time = 0.
+        self.start_time = None
+        self.end_time = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'StageMetrics({})'.format(self.to_dict())
+
+    def add(self, num_rows=0, busy_time=0., input_wait_time=0., output_wait_time=0., num_chunks=1):
+        with self._lock:
+            self.num_chunks += num_chunks
+            self.num_rows += num_rows
+            self.busy_time += busy_time
+            self.input_wait_time += input_wait_time
+            self.output_wait_time += output_wait_time
+
+    def start(self):
+        with self._lock:
+            if self.start_time is None:
+                self.start_time = time.time()
+
+    def stop(self):
+        with self._lock:
+            self.end_time = time.time()
+
+    @property
+    def elapsed_time(self):
+        if self.start_time is None:
+            return 0.
+        return (self.end_time or time.time()) - self.start_time
+
+    def to_dict(self):
+        elapsed_time = self.elapsed_time
+        return {
+            'name': self.name,
+            'num_workers': self.num_workers,
+            'num_chunks': self.num_chunks,
+            'num_rows': self.num_rows,
+            'elapsed_time': elapsed_time,
+            'busy_time': self.busy_time,
+            'input_wait_time': self.input_wait_time,
+            'output_wait_time': self.output_wait_time,
+            # Rows per second of wall time, and per second actually spent by the workers
+            'throughput': self.num_rows / elapsed_time if elapsed_time > 0 else float('nan'),
+            'worker_throughput': self.num_rows / self.busy_time if self.busy_time > 0 else float('nan'),
+            'utilization': self.busy_time / (elapsed_time * self.num_workers) if elapsed_time > 0 else float('nan'),
+        }
+
+
+class Pipeline(object):
+    """
+    PIPELINE Streaming extract -> transform -> load pipeline
+
+    Chunks are read from a source, go through a sequence of transform functions and are written to a sink. Every
+    stage runs concurrently, in its own thread(s), and stages are connected by bounded queues: a stage which is
+    faster than the next one blocks once the queue is full, so that at most a few chunks are in memory at any time
+    instead of the whole table.
+
+    Stages run in threads: reading, parsing and writing mostly release the GIL, and chunks are not copied between
+    stages. Chunks are written in the order they are read, unless the pipeline is built with preserve_order=False.
+
+    Example:
+    ```python
+    from pyetl.datasource import FileDataSource
+    from pyetl.pipeline import Pipeline
+
+    src = FileDataSource('read-only', 'extract_*.csv', 'dictionary.xlsx', chunksize=100000)
+    dst = FileDataSource('create', 'result.csv.gz', 'dictionary.xlsx', chunksize=100000)
+    pipeline = Pipeline(src, dst, queue_size=4, num_readers=2)
+    pipeline.add_transform(lambda df: df[df['AMOUNT'] > 0], num_workers=4, name='filter')
+    num_rows = pipeline.run()
+    print(pipeline.get_metrics())
+    ```
+    """
+
+    # properties (Access = private)
+    _source = None  # DataSource or iterable of pandas.DataFrame
+    _sink = None  # DataSource (or any object with a write method), or function called on each chunk
+    _queue_size = 4  # maximum number of chunks waiting between two stages
+    _num_readers = 1  # number of data locations of the source read at the same time
+    _preserve_order = True
+    _stages = None  # transform stages: (name, function, num_workers)
+    _metrics = None
+
+    # methods (Access = public)
+    def __init__(self, source, sink=None, queue_size=4, num_readers=1, preserve_order=True):
+        """
+        :param source: DataSource or any iterable of pandas.DataFrame, e.g. a generator
+        :param sink: DataSource, or any object whose write method accepts an iterable of pandas.DataFrame, or a
+            function called on each chunk. Without a sink, chunks are only counted
+        :param queue_size: maximum number of chunks waiting between two stages
+        :param num_readers: number of data locations (e.g. files) of a DataSource read at the same time. Chunks of
+            different locations are then interleaved
+        :param preserve_order: write chunks in the order they are read even when transforms run with several
+            workers. Chunks then wait for the ones read before them, reading being paused when queue_size chunks
+            (plus one per worker) are in flight. Otherwise chunks are written as soon as they are transformed
+        """
+        if int(queue_size) < 1:
+            raise ValueError('Queue size should be at least 1: {}'.format(queue_size))
+        self._source = source
+        self._sink = sink
+        self._queue_size = int(queue_size)
+        self._num_readers = max(int(num_readers), 1)
+        self._preserve_order = preserve_order
+        self._stages = []
+        self._metrics = []
+
+    def add_transform(self, function, num_workers=1, name=None):
+        """
+        Add a transform stage, run after the previously added ones
+        :param function: function taking a chunk and returning the transformed chunk, or None to drop it
+        :param num_workers: number of chunks transformed at the same time
+        :param name: stage name, reported in the metrics
+        :return: pipeline, so that calls can be chained
+        """
+        if not callable(function):
+            raise ValueError('Transforms should be callable: {}'.format(function))
+        name = name or getattr(function, '__name__', None) or 'transform'
+        self._stages.append((name, function, max(int(num_workers), 1)))
+        return self
+
+    def run(self, **kwargs):
+        """
+        Run the pipeline until the source is exhausted. If any stage fails, the other ones are stopped and the error
+        is raised
+        :param kwargs: parameters to be passed to the sink's write method
+        :return: number of rows written
+        """
+        stop_event = threading.Event()
+        errors = []
+        queues = [queue.Queue(self._queue_size) for _ in range(len(self._stages) + 1)]
+        num_consumers = [num_workers for _, _, num_workers in self._stages] + [1]
+
+        readers = self._get_readers()
+        self._metrics = [StageMetrics('extract', len(readers))] + \
+            [StageMetrics(name, num_workers) for name, _, num_workers in self._stages] + \
+            [StageMetrics('load', 1)]
+        # Chunks are numbered as they are read, so that the load stage can restore their order
+        counter = _Counter()
+        # Chunks are reordered before being loaded: bound the number of chunks in flight, so that a slow chunk does
+        # not make all the following ones pile up while waiting for it
+        window = None
+        if self._preserve_order:
+            window = queue.Queue(self._queue_size + max([1] + [n for _, _, n in self._stages]))
+
+        threads = []
+        finished = _Counter()
+        for reader in readers:
+            threads.append(threading.Thread(target=self._run_worker, name='pipeline-extract', args=(
+                self._extract, (reader, counter, window, stop_event), None, queues[0], self._metrics[0], len(readers),
+                finished, num_consumers[0], stop_event, errors)))
+        for idx, (name, function, num_workers) in enumerate(self._stages):
+            finished = _Counter()
+            for _ in range(num_workers):
+                threads.append(threading.Thread(target=self._run_worker, name='pipeline-' + name, args=(
+                    self._transform, (function,), queues[idx], queues[idx + 1], self._metrics[idx + 1], num_workers,
+                    finished, num_consumers[idx + 1], stop_event, errors)))
+        for t in threads:
+            t.daemon = True
+            t.start()
+
+        num_rows = 0
+        try:
+            num_rows = self._load(self._iterate_output(queues[-1], self._metrics[-1], stop_event, errors, window),
+                                  **kwargs)
+        except PipelineAborted:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            # Upstream stages blocked on full queues stop as well
+            stop_event.set()
+            for t in threads:
+                t.join()
+            self._metrics[-1].stop()
+        if tracing.is_enabled():
+            # Time spent waiting on the queues, to find the stage bounding the throughput
+            for m in self._metrics:
+                tracing.emit('pipeline_stage', stage=m.name, rows=m.num_rows, chunks=m.num_chunks,
+                             duration=m.elapsed_time, busy_time=m.busy_time, input_wait_time=m.input_wait_time,
+                             output_wait_time=m.output_wait_time)
+
+        if len(errors):
+            logger.error('Pipeline failed: {}'.format(errors[0]))
+            raise errors[0]
+        logger.info('Pipeline wrote {} observations'.format(num_rows))
+        for m in self._metrics:
+            logger.debug('Pipeline stage {name}: {num_rows} rows in {elapsed_time:.3f}s, '
+                         '{throughput:.0f} rows/s, utilization {utilization:.2f}'.format(**m.to_dict()))
+        return num_rows
+
+    def get_metrics(self):
+        """
+        Metrics of each stage of the last run, from extract to load
+        :return: list of dict
+        """
+        return [m.to_dict() for m in self._metrics]
+
+    # methods (Access = private)
+    def _get_readers(self):
+        """Iterators of chunks of the source, each one to be consumed by its own thread"""
+        if not hasattr(self._source, 'get_location_data_iterators'):
+            return [iter(self._source)]
+        # Locations are spread between the readers, each location being read from its start
+        location_iterators = self._source.get_location_data_iterators()
+        lock = threading.Lock()
+
+        def read():
+            while True:
+                with lock:
+                    li = next(location_iterators, None)
+                if li is None:
+                    return
+                for df in li:
+                    yield df
+        return [read() for _ in range(max(min(self._num_readers, len(self._source.get_location())), 1))]
+
+    def _load(self, chunks, **kwargs):
+        if self._sink is None:
+            return sum([len(df) for df in chunks])
+        if hasattr(self._sink, 'write'):
+            return self._sink.write(chunks, **kwargs)
+        num_rows = 0
+        for df in chunks:
+            self._sink(df, **kwargs)
+            num_rows += len(df)
+        return num_rows
+
+    @staticmethod
+    def _extract(reader, counter, window, stop_event):
+        """Stage function of the readers: generate numbered chunks, once the window of chunks in flight has room"""
+        for df in reader:
+            if window is not None:
+                # Each chunk in flight holds a slot of the window until it is loaded
+                _put(window, None, stop_event)
+            yield counter.next(), df
+
+    @staticmethod
+    def _transform(item, function):
+        seq, df = item
+        return seq, function(df) if df is not None else None
+
+    @staticmethod
+    def _run_worker(function, args, input_queue, output_queue, metrics, num_workers, finished, num_consumers,
+                    stop_event, errors):
+        """
+        Run a worker of a stage: take chunks from the input queue (or generate them if there is none), process them
+        and put the results in the output queue. The last worker of the stage to finish signals the end of the
+        stream to each worker of the next stage
+        """
+        metrics.start()
+        try:
+            if input_queue is None:
+                items = function(*args)
+                while True:
+                    timer = time.time()
+                    item = next(items, _END)
+                    if item is _END:
+                        break
+                    busy_time = time.time() - timer
+                    output_wait_time = _put(output_queue, item, stop_event)
+                    metrics.add(_num_rows(item[1]), busy_time=busy_time, output_wait_time=output_wait_time)
+            else:
+                while True:
+                    input_wait_time, item = _get(input_queue, stop_event)
+                    if item is _END:
+                        break
+                    timer = time.time()
+                    result = function(item, *args)
+                    busy_time = time.time() - timer
+                    output_wait_time = _put(output_queue, result, stop_event)
+                    metrics.add(_num_rows(result[1]), busy_time=busy_time, input_wait_time=input_wait_time,
+                                output_wait_time=output_wait_time)
+        except PipelineAborted:
+            return
+        except Exception as e:
+            logger.error('Pipeline stage {} failed: {}'.format(metrics.name, e))
+            errors.append(e)
+            stop_event.set()
+            return
+
+        if finished.next() == num_workers - 1:
+            metrics.stop()
+            try:
+                for _ in range(num_consumers):
+                    _put(output_queue, _END, stop_event)
+            except PipelineAborted:
+                pass
+
+    def _iterate_output(self, output_queue, metrics, stop_event, errors, window=None):
+        """Chunks coming out of the last stage, in the order they were read unless order is not preserved"""
+        metrics.start()
+        pending = {}
+        next_seq = 0
+        while True:
+            try:
+                input_wait_time, item = _get(output_queue, stop_event)
+            except PipelineAborted:
+                if len(errors):
+                    raise errors[0]
+                raise
+            if item is _END:
+                break
+            if not self._preserve_order:
+                ready = [item]
+            else:
+                pending[item[0]] = item
+                ready = []
+                while next_seq in pending:
+                    ready.append(pending.pop(next_seq))
+                    next_seq += 1
+                    window.get_nowait()
+
+            metrics.add(0, input_wait_time=input_wait_time, num_chunks=0)
+            for _, df in ready:
+                if df is None or not len(df):
+                    continue
+                timer = time.time()
+                yield df
+                # Time spent by the sink before asking for the next chunk
+                metrics.add(len(df), busy_time=time.time() - timer)
+
+
+class _Counter(object):
+    """Thread-safe counter"""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            value = self._value
+            self._value += 1
+            return value
+
+
+def _num_rows(df):
+    return len(df) if hasattr(df, '__len__') else 0
+
+
+def _put(q, item, stop_event):
+    """Put an item in a queue, waiting for room unless the pipeline is stopped. Return the waiting time"""
+    timer = time.time()
+    while True:
+        if stop_event.is_set():
+            raise PipelineAborted()
+        try:
+            q.put(item, timeout=_POLL_INTERVAL)
+            return time.time() - timer
+        except queue.Full:
+            pass
+
+
+def _get(q, stop_event):
+    """Get an item from a queue, waiting for one unless the pipeline is stopped. Return the waiting time and item"""
+    timer = time.time()
+    while True:
+        if stop_event.is_set():
+            raise PipelineAborted()
+        try:
+            item = q.get(timeout=_POLL_INTERVAL)
+            return time.time() - timer, item
+        except queue.Empty:
+            pass
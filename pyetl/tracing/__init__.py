@@ -0,0 +1,6 @@
+from pyetl.utils.lazy import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, [
+    ('.core', ['add_sink', 'remove_sink', 'get_sinks', 'is_enabled', 'emit', 'span', 'query_hash', 'describe_table']),
+    ('.sinks', ['Sink', 'MemorySink', 'JsonLinesSink', 'PrometheusSink']),
+])
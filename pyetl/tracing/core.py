@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import threading
+import time
+from pyetl.utils.chunking import measure_row_size
+from pyetl.utils.sql import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Sinks events are sent to. Tracing is disabled when there is none, instrumented code then checking this tuple only
+_sinks = ()
+_lock = threading.Lock()
+
+
+def add_sink(sink):
+    """
+    Send traced events to a sink, e.g. a MemorySink, JsonLinesSink or PrometheusSink
+    :param sink: object with a handle(event) method
+    """
+    global _sinks
+    with _lock:
+        if sink not in _sinks:
+            _sinks = _sinks + (sink,)
+
+
+def remove_sink(sink):
+    """Stop sending traced events to a sink. The sink is flushed but not closed"""
+    global _sinks
+    with _lock:
+        _sinks = tuple(s for s in _sinks if s is not sink)
+    _call_quietly(sink, 'flush')
+
+
+def get_sinks():
+    return _sinks
+
+
+def is_enabled():
+    """Flag indicating if events are traced, i.e. if there is any sink"""
+    return len(_sinks) > 0
+
+
+def emit(name, **fields):
+    """
+    Send an event to the sinks. Sink failures are logged but not raised
+    :param name: event name, e.g. fetch or chunk
+    :param fields: event fields, e.g. rows or durations (seconds)
+    """
+    sinks = _sinks
+    if not len(sinks):
+        return
+    event = dict(fields, event=name)
+    event.setdefault('timestamp', time.time())
+    event.setdefault('thread', threading.current_thread().name)
+    for sink in sinks:
+        _call_quietly(sink, 'handle', event)
+
+
+def span(name, **fields):
+    """
+    Context manager timing a block of code, whose event is emitted when the block exits. The block can add fields to
+    the event, which also records the error raised if any
+
+    Example:
+    ```python
+    with tracing.span('write', source='FileDataSource') as event:
+        event['rows'] = ds.write(df)
+    ```
+    :param name: event name
+    :param fields: event fields
+    :return: context manager, returning the event fields
+    """
+    if not len(_sinks):
+        return _NullSpan()
+    return _Span(name, fields)
+
+
+def query_hash(query):
+    """Short hash of a normalized query, identifying it in events without exposing its text"""
+    return hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()[:16]
+
+
+def describe_table(df):
+    """
+    Number of rows and estimated memory size of a table, sampled so that text is accounted for
+    :param df: pandas.DataFrame
+    :return: dict
+    """
+    if not hasattr(df, 'memory_usage'):
+        return {}
+    row_size = measure_row_size(df)
+    return {'rows': len(df), 'bytes': int(row_size * len(df)) if row_size is not None else 0}
+
+
+class _Span(object):
+
+    def __init__(self, name, fields):
+        self._name = name
+        self._fields = fields
+        self._timer = None
+
+    def __enter__(self):
+        self._fields['timestamp'] = time.time()
+        self._timer = time.time()
+        return self._fields
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._fields['duration'] = time.time() - self._timer
+        if exc_val is not None:
+            self._fields['error'] = '{}: {}'.format(exc_type.__name__, exc_val)
+        emit(self._name, **self._fields)
+        return False
+
+
+class _NullSpan(object):
+    """Span of disabled tracing: fields added by the block are discarded"""
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+def _call_quietly(sink, method, *args):
+    try:
+        getattr(sink, method)(*args)
+    except Exception as e:
+        logger.warning('Tracing sink {} failed: {}'.format(sink, e))
@@ -0,0 +1,228 @@
+import collections
+import json
+import logging
+import numbers
+import os
+import re
+import tempfile
+import threading
+import time
+import pandas as pd
+from pyetl.utils.files import replace_file, set_default_mode
+
+logger = logging.getLogger(__name__)
+
+# Fields which are not aggregated
+_NON_NUMERIC_FIELDS = ('timestamp',)
+
+
+class Sink(object):
+    """
+    SINK Destination of traced events
+    """
+
+    def handle(self, event):
+        """
+        Process an event
+        :param event: dict with at least the event name and timestamp
+        """
+        raise NotImplementedError()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MemorySink(Sink):
+    """
+    MEMORYSINK Keep traced events in memory, and aggregate their numeric fields by event name
+
+    Example:
+    ```python
+    from pyetl import tracing
+
+    sink = MemorySink()
+    tracing.add_sink(sink)
+    df, _ = ds.read_all()
+    tracing.remove_sink(sink)
+    print(sink.get_summary())  # e.g. parse_time vs conversion_time of the chunks
+    ```
+    """
+
+    # properties (Access = private)
+    _events = None  # last events
+    _totals = None  # number of events and sums of their numeric fields, by event name
+    _lock = None
+
+    # methods (Access = public)
+    def __init__(self, max_events=10000):
+        """
+        :param max_events: maximum number of events kept, the oldest ones being discarded. Aggregates account for
+            all events
+        """
+        self._events = collections.deque(maxlen=max_events)
+        self._totals = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def handle(self, event):
+        with self._lock:
+            self._events.append(event)
+            totals = self._totals.setdefault(event['event'], collections.OrderedDict([('count', 0)]))
+            totals['count'] += 1
+            for field, value in _numeric_fields(event):
+                totals[field] = totals.get(field, 0) + value
+
+    def get_events(self, name=None):
+        """
+        :param name: event name, None for all events
+        :return: list of events
+        """
+        with self._lock:
+            return [e for e in self._events if name is None or e['event'] == name]
+
+    def get_summary(self):
+        """
+        Number of events and sums of their numeric fields (rows, bytes, durations...), by event name
+        :return: pandas.DataFrame
+        """
+        with self._lock:
+            return pd.DataFrame.from_dict(dict((k, dict(v)) for k, v in self._totals.items()), orient='index')
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+            self._totals.clear()
+
+
+class JsonLinesSink(Sink):
+    """
+    JSONLINESSINK Write traced events to a file, one JSON object per line
+    """
+
+    # properties (Access = private)
+    _file = None
+    _lock = None
+
+    # methods (Access = public)
+    def __init__(self, filename, mode='a'):
+        """
+        :param filename:
+        :param mode: 'a' to append to an existing file, 'w' to overwrite it
+        """
+        # Line buffered, so that events can be followed while they are written
+        self._file = open(filename, mode, buffering=1)
+        self._lock = threading.Lock()
+
+    def handle(self, event):
+        line = json.dumps(event, default=str, sort_keys=True) + '\n'
+        with self._lock:
+            self._file.write(line)
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusSink(Sink):
+    """
+    PROMETHEUSSINK Aggregate traced events in a Prometheus text-format file, e.g. for the node exporter's textfile
+    collector
+
+    Counters are labelled by event name and by the event fields given as labels:
+    - <prefix>_events_total: number of events
+    - <prefix>_event_values_total: sums of numeric fields (rows, bytes, durations in seconds...), with a field label
+    The file is rewritten atomically at most every flush interval, and when the sink is flushed or closed.
+    """
+
+    # properties (Access = private)
+    _filename = None
+    _prefix = 'pyetl'
+    _labels = ()  # event fields used as labels
+    _flush_interval = 10.
+    _counts = None
+    _values = None
+    _last_flush = 0.
+    _lock = None
+
+    # methods (Access = public)
+    def __init__(self, filename, prefix='pyetl', labels=('source', 'stage'), flush_interval=10.):
+        """
+        :param filename: output file, e.g. /var/lib/node_exporter/pyetl.prom
+        :param prefix: prefix of the metric names
+        :param labels: event fields used as labels, in addition to the event name. Fields with many distinct values
+            should not be used
+        :param flush_interval: minimum time between two writes of the file (seconds)
+        """
+        self._filename = filename
+        self._prefix = prefix
+        self._labels = tuple(labels)
+        self._flush_interval = flush_interval
+        self._counts = collections.OrderedDict()
+        self._values = collections.OrderedDict()
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+    def handle(self, event):
+        key = (('event', event['event']),) + tuple((l, str(event[l])) for l in self._labels if l in event)
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+            for field, value in _numeric_fields(event):
+                field_key = key + (('field', field),)
+                self._values[field_key] = self._values.get(field_key, 0) + value
+            is_due = time.time() - self._last_flush >= self._flush_interval
+        if is_due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            content = self._render()
+            self._last_flush = time.time()
+        tmp_file = None
+        try:
+            fd, tmp_file = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(self._filename)))
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+            set_default_mode(tmp_file, self._filename)
+            replace_file(tmp_file, self._filename)
+        except Exception:
+            if tmp_file is not None and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+    # methods (Access = private)
+    def _render(self):
+        lines = ['# HELP {}_events_total Number of traced events'.format(self._prefix),
+                 '# TYPE {}_events_total counter'.format(self._prefix)]
+        lines += ['{}_events_total{} {}'.format(self._prefix, _render_labels(k), v) for k, v in self._counts.items()]
+        lines += ['# HELP {}_event_values_total Sums of the numeric fields of traced events'.format(self._prefix),
+                  '# TYPE {}_event_values_total counter'.format(self._prefix)]
+        lines += ['{}_event_values_total{} {!r}'.format(self._prefix, _render_labels(k), float(v))
+                  for k, v in self._values.items()]
+        return '\n'.join(lines) + '\n'
+
+
+def _numeric_fields(event):
+    for field, value in event.items():
+        if field not in _NON_NUMERIC_FIELDS and isinstance(value, numbers.Number) and not isinstance(value, bool):
+            yield field, value
+
+
+def _render_labels(key):
+    return '{' + ','.join('{}="{}"'.format(re.sub(r'\W', '_', l), _escape(v)) for l, v in key) + '}'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,129 @@
+import threading
+import numpy as np
+import pandas as pd
+from pyetl.utils.string import str_to_bool
+
+# Placeholder of missing text values
+_MISSING_TEXT = '\x00'
+
+
+class TableChecksum(object):
+    """
+    TABLECHECKSUM Checksum of a table streamed chunk by chunk
+
+    Rows are hashed and the hashes are summed, so that the checksum depends neither on the order of the rows nor on
+    the way the table is split in chunks, and chunks can be added from several threads. Values are normalized by kind
+    (boolean, number, datetime, timedelta or text) before being hashed, so that a table read back from a data source
+    with other types, e.g. from CSV files without dictionary, has the same checksum as the table which was written.
+    Numbers are compared in single precision, as parsers do not all round decimal numbers the same way.
+
+    Example:
+    ```python
+    from pyetl.utils.checksum import TableChecksum
+
+    written = TableChecksum()
+    for df in chunks:
+        written.update(df)
+    read = TableChecksum(written.get_kinds())
+    read.update(pd.read_csv(filename))
+    assert read == written
+    ```
+    """
+
+    # properties (Access = private)
+    _kinds = None  # kind of each variable, decided from the first chunk unless given
+    _num_rows = 0
+    _value = 0
+    _lock = None
+
+    # methods (Access = public)
+    def __init__(self, kinds=None):
+        """
+        :param kinds: kind of each variable, e.g. those of another checksum to compare with
+        """
+        self._kinds = dict(kinds) if kinds is not None else None
+        self._num_rows = 0
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'TableChecksum({} rows, {})'.format(self._num_rows, self.hexdigest())
+
+    def __eq__(self, other):
+        if not isinstance(other, TableChecksum):
+            return NotImplemented
+        return self._num_rows == other.get_num_rows() and self.hexdigest() == other.hexdigest()
+
+    def __ne__(self, other):
+        is_equal = self.__eq__(other)
+        return is_equal if is_equal is NotImplemented else not is_equal
+
+    def update(self, df):
+        """
+        Add the rows of a table
+        :param df: pandas.DataFrame
+        """
+        with self._lock:
+            if self._kinds is None:
+                self._kinds = dict((c, _get_kind(df[c])) for c in df.columns)
+        unknown = [c for c in df.columns if c not in self._kinds]
+        if len(unknown):
+            raise ValueError('Unknown variable(s): {}'.format(unknown))
+
+        # Variables are hashed in a fixed order
+        names = sorted(df.columns, key=str)
+        normalized = pd.DataFrame(dict((idx, _normalize(df[c], self._kinds[c])) for idx, c in enumerate(names)))
+        value = int(pd.util.hash_pandas_object(normalized, index=False).values.sum(dtype=np.uint64)) if len(df) else 0
+        with self._lock:
+            self._value = (self._value + value) % (1 << 64)
+            self._num_rows += len(df)
+
+    def get_kinds(self):
+        return dict(self._kinds) if self._kinds is not None else None
+
+    def get_num_rows(self):
+        return self._num_rows
+
+    def hexdigest(self):
+        return '{:016x}'.format(self._value)
+
+
+def _get_kind(var):
+    if pd.api.types.is_bool_dtype(var):
+        return 'boolean'
+    if pd.api.types.is_numeric_dtype(var):
+        return 'number'
+    if pd.api.types.is_datetime64_any_dtype(var):
+        return 'datetime'
+    if pd.api.types.is_timedelta64_dtype(var):
+        return 'timedelta'
+    if var.dtype == object and pd.api.types.infer_dtype(var, skipna=True) in ('date', 'datetime'):
+        return 'datetime'
+    return 'text'
+
+
+def _normalize(var, kind):
+    """Normalize values of a variable to a type depending on its kind only"""
+    var = var.reset_index(drop=True)
+    if kind == 'boolean':
+        if not pd.api.types.is_numeric_dtype(var) and not pd.api.types.is_bool_dtype(var):
+            var = str_to_bool(var.where(var.notnull()))
+        return pd.to_numeric(var, errors='coerce').astype(float)
+    if kind == 'number':
+        # Parsers do not all round decimal numbers the same way to the last bit
+        return pd.to_numeric(var, errors='coerce').astype(np.float32)
+    if kind == 'datetime':
+        var = pd.to_datetime(var, errors='coerce')
+        if getattr(var.dt, 'tz', None) is not None:
+            var = var.dt.tz_convert(None)
+        return pd.Series(var.values.astype('M8[ns]').view('i8'))
+    if kind == 'timedelta':
+        return pd.Series(pd.to_timedelta(var, errors='coerce').values.astype('m8[ns]').view('i8'))
+
+    is_missing = var.isnull().values
+    if pd.api.types.is_float_dtype(var) and not np.mod(var.values[~is_missing], 1).any():
+        # Integers with missing values, e.g. codes read from files without dictionary
+        var = pd.Series(np.where(is_missing, 0, var.values).astype(np.int64))
+    text = var.astype(str).str.strip().values.astype(object)
+    text[is_missing | (text == '')] = _MISSING_TEXT
+    return pd.Series(text)
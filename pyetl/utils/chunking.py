@@ -0,0 +1,217 @@
+import copy
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+    logger.debug("psutil is not installed. Available memory will be read from the system configuration")
+
+# Estimated memory used by a single value of each type (bytes). Text values are Python strings: their size is the
+# object overhead plus their length
+_VALUE_SIZES = {'BOOLEAN': 1, 'INTEGER': 8, 'FLOAT': 8, 'DATE': 8, 'TIME': 8, 'TIMESTAMP': 8}
+_TEXT_OVERHEAD = 57  # str object and pointer to it
+_DEFAULT_TEXT_SIZE = 32  # when the size of a text variable is unknown
+_SAMPLE_SIZE = 1000  # number of rows sampled to measure the memory used by a table
+
+
+def estimate_row_size(md):
+    """
+    Estimate the memory used by a row of data, once loaded in a pandas.DataFrame, from a metadata catalog
+    :param md: MetadataCatalog
+    :return: number of bytes
+    """
+    var_name = md.get_variable_names()
+    row_size = 0
+    for name, var_type in zip(var_name, md.get_type(list(var_name))):
+        if var_type in _VALUE_SIZES:
+            row_size += _VALUE_SIZES[var_type]
+        else:
+            try:
+                num_bytes = float(md.get_variable_sizes(name))
+            except (KeyError, TypeError, ValueError):
+                num_bytes = np.nan
+            row_size += _TEXT_OVERHEAD + (_DEFAULT_TEXT_SIZE if np.isnan(num_bytes) else int(num_bytes))
+    return max(row_size, 1)
+
+
+def measure_row_size(df):
+    """
+    Measure the memory used by a row of a table, text included, from a sample of its rows
+    :param df: pandas.DataFrame
+    :return: number of bytes, None for empty tables
+    """
+    if not len(df):
+        return None
+    sample = df.iloc[:_SAMPLE_SIZE]
+    return max(float(sample.memory_usage(index=False, deep=True).sum()) / len(sample), 1.)
+
+
+def get_available_memory():
+    """
+    :return: memory available to the process (bytes), None if unknown
+    """
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class ChunkSizer(object):
+    """
+    CHUNKSIZER Adaptive number of rows per chunk
+
+    Chunks are sized to a memory budget rather than to a fixed number of rows, so that narrow and wide tables are
+    both read and written in chunks of sensible sizes. The size of a row is first estimated from the metadata (or
+    from the first chunk) and then measured on each chunk which is read. The number of rows is also bounded so that
+    reading a chunk takes about the target latency, and the budget never exceeds a fraction of the available memory.
+    Sizes change progressively, by at most a factor 2 between two chunks.
+
+    Example:
+    ```python
+    from pyetl.datasource import FileDataSource
+    from pyetl.utils.chunking import ChunkSizer
+
+    ds = FileDataSource('read-only', 'extract_*.csv', None, chunksize='auto')
+    ds = FileDataSource('read-only', 'extract_*.csv', None, chunksize=ChunkSizer(target_bytes=256 * 1024 ** 2))
+    ```
+    """
+
+    # properties (Access = private)
+    _target_bytes = 64 * 1024 ** 2
+    _target_latency = 1.
+    _min_rows = 1000
+    _max_rows = 10 ** 7
+    _memory_fraction = 0.1
+    _row_size = None  # smoothed size of a row (bytes)
+    _rows_per_second = None  # smoothed read throughput
+    _chunk_size = None
+    _lock = None
+
+    # methods (Access = public)
+    def __init__(self, target_bytes=64 * 1024 ** 2, target_latency=1., min_rows=1000, max_rows=10 ** 7,
+                 memory_fraction=0.1):
+        """
+        :param target_bytes: memory budget of a chunk (bytes)
+        :param target_latency: target time to read a chunk (seconds), None to ignore the read latency
+        :param min_rows: minimum number of rows per chunk
+        :param max_rows: maximum number of rows per chunk
+        :param memory_fraction: maximum fraction of the available memory used by a chunk
+        """
+        if int(min_rows) < 1 or int(max_rows) < int(min_rows):
+            raise ValueError('Invalid chunk size bounds: {} to {} rows'.format(min_rows, max_rows))
+        self._target_bytes = int(target_bytes)
+        self._target_latency = target_latency
+        self._min_rows = int(min_rows)
+        self._max_rows = int(max_rows)
+        self._memory_fraction = memory_fraction
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'ChunkSizer(chunk_size={}, row_size={})'.format(self._chunk_size, self._row_size)
+
+    def __deepcopy__(self, memo):
+        # Copies start from the current estimates, with their own lock
+        other = copy.copy(self)
+        other._lock = threading.Lock()
+        return other
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop('_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def is_initialized(self):
+        return self._row_size is not None
+
+    def initialize(self, row_size):
+        """
+        Set the initial estimate of the size of a row
+        :param row_size: bytes
+        """
+        with self._lock:
+            self._row_size = float(row_size)
+            self._chunk_size = self._clip(self._get_budget() / self._row_size)
+
+    def get_chunk_size(self):
+        """
+        :return: number of rows of the next chunk
+        """
+        if self._chunk_size is None:
+            return self._min_rows
+        return self._chunk_size
+
+    def get_batch_size(self, df):
+        """
+        Number of rows of the batches a table is split in, e.g. when it is written
+        :param df: pandas.DataFrame
+        :return: number of rows
+        """
+        row_size = measure_row_size(df)
+        if row_size is None:
+            return self.get_chunk_size()
+        return self._clip(self._get_budget() / row_size)
+
+    def update(self, df, elapsed_time=None):
+        """
+        Adjust the chunk size after a chunk has been read
+        :param df: chunk
+        :param elapsed_time: time spent reading the chunk (seconds)
+        :return: number of rows of the next chunk
+        """
+        row_size = measure_row_size(df)
+        if row_size is None:
+            return self.get_chunk_size()
+        with self._lock:
+            self._row_size = row_size if self._row_size is None else 0.5 * (self._row_size + row_size)
+            chunk_size = self._get_budget() / self._row_size
+            if self._target_latency is not None and elapsed_time is not None and elapsed_time > 0:
+                rows_per_second = len(df) / elapsed_time
+                self._rows_per_second = rows_per_second if self._rows_per_second is None else \
+                    0.5 * (self._rows_per_second + rows_per_second)
+                chunk_size = min(chunk_size, self._rows_per_second * self._target_latency)
+            if self._chunk_size is not None:
+                # Sizes change progressively
+                chunk_size = min(max(chunk_size, self._chunk_size / 2.), self._chunk_size * 2.)
+            self._chunk_size = self._clip(chunk_size)
+        return self._chunk_size
+
+    # methods (Access = private)
+    def _get_budget(self):
+        """Memory budget of a chunk, within the available memory"""
+        available_memory = get_available_memory()
+        if available_memory is None:
+            return self._target_bytes
+        return min(self._target_bytes, self._memory_fraction * available_memory)
+
+    def _clip(self, chunk_size):
+        return int(min(max(chunk_size, self._min_rows), self._max_rows))
+
+
+def iterate_adaptively(reader, sizer):
+    """
+    Read chunks of sizes decided by a ChunkSizer
+    :param reader: object with a get_chunk(size) method raising StopIteration at the end, e.g. pandas TextFileReader
+    :param sizer: ChunkSizer
+    :return: iterator of chunks
+    """
+    while True:
+        timer = time.time()
+        try:
+            df = reader.get_chunk(sizer.get_chunk_size())
+        except StopIteration:
+            return
+        sizer.update(df, time.time() - timer)
+        yield df
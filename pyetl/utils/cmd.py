@@ -1,27 +1,42 @@
-import subprocess
-import os
+import io
 import logging
+import shlex
+import signal
 import subprocess as sp
+import threading
+from collections import deque
+from pyetl.utils.compression import ThreadedReader
 
 logger = logging.getLogger(__name__)
 
+_BLOCK_SIZE = 1 << 20  # size of the blocks read from the output of a command pipeline (bytes)
+_QUEUE_SIZE = 8  # number of output blocks buffered ahead of the consumer
+_MAX_STDERR_SIZE = 1 << 16  # bytes of error output kept for each command
+_SIGPIPE_RETURN_CODE = -signal.SIGPIPE if hasattr(signal, 'SIGPIPE') else None
 
-def subprocess_cmd(command):
-    command = '{cmd} > tmp_cmd_out.log 2> tmp_cmd_err.log'.format(cmd=command)
-    logger.debug('Executing: {}'.format(command))
-    process = subprocess.Popen(command, stdout=subprocess.PIPE, shell=True)
-    _ = process.communicate()  # proc_stdout
 
-    with open("tmp_cmd_out.log") as f:
-        output = f.read()
+class CommandError(sp.CalledProcessError):
+    """A command of a pipeline exited with a non-zero return code"""
 
-    with open("tmp_cmd_err.log") as f:
-        errors = f.read()
+    def __init__(self, returncode, cmd, stderr=''):
+        super(CommandError, self).__init__(returncode, cmd)
+        self.stderr = stderr
 
-    os.remove("tmp_cmd_out.log")
-    os.remove("tmp_cmd_err.log")
+    def __str__(self):
+        msg = super(CommandError, self).__str__()
+        return '{}: {}'.format(msg, self.stderr.strip()) if self.stderr else msg
 
-    return {'output': output, 'errors': errors}
+
+def subprocess_cmd(command):
+    """
+    Run a shell command and capture its output and errors
+    :param command:
+    :return: dict with output and errors
+    """
+    logger.debug('Executing: {}'.format(command))
+    process = sp.Popen(command, stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
+    output, errors = process.communicate()
+    return {'output': output.decode('utf-8', 'replace'), 'errors': errors.decode('utf-8', 'replace')}
 
 
 def handle_cmd_output(output):
@@ -31,19 +46,171 @@ def handle_cmd_output(output):
         print(output['output'])
 
 
+def split_commands(commands):
+    """
+    Split a shell-like pipeline, e.g. "zcat | grep -v '^#' | cut -d, -f1-3", into the arguments of each command.
+    Pipes within quotes are kept
+    :param commands: string, or list of commands (strings or lists of arguments)
+    :return: list of lists of arguments
+    """
+    if not isinstance(commands, str):
+        return [shlex.split(c) if isinstance(c, str) else list(c) for c in commands]
+    lexer = shlex.shlex(commands, posix=True, punctuation_chars='|')
+    lexer.whitespace_split = True
+    args = [[]]
+    for token in lexer:
+        if token == '|':
+            args.append([])
+        else:
+            args[-1].append(token)
+    if any([not len(a) for a in args]):
+        raise ValueError('Empty command in pipeline: {}'.format(commands))
+    return args
+
+
+class CommandPipeline(object):
+    """
+    COMMANDPIPELINE Pipeline of external commands, whose output is streamed
+
+    Commands are chained as by a shell, without running one, and their output is exposed as a binary file object
+    which can be parsed while the commands are still running. The output is drained by a background thread, so that
+    the commands do not wait for the consumer, and the error output of each command is captured by its own thread.
+    No temporary file is involved, so that any number of pipelines can run at the same time.
+
+    Example:
+    ```python
+    from pyetl.utils.cmd import CommandPipeline
+
+    with CommandPipeline("zcat | grep -v DELETED | cut -d, -f1-3", stdin='extract.csv.gz') as pipeline:
+        df = pd.read_csv(pipeline.stdout)
+    ```
+    """
+
+    # properties (Access = private)
+    _args = None  # arguments of each command
+    _processes = None
+    _stdout = None
+    _stderr = None  # last bytes of the error output of each command
+    _stderr_threads = None
+
+    # methods (Access = public)
+    def __init__(self, commands, stdin=None, cwd=None, env=None):
+        """
+        Start the pipeline
+        :param commands: shell-like pipeline or list of commands, see split_commands
+        :param stdin: input of the first command: file name, file object or None
+        :param cwd:
+        :param env:
+        """
+        self._args = split_commands(commands)
+        self._processes = []
+        self._stderr = [deque() for _ in self._args]
+        self._stderr_threads = []
+        logger.debug('Executing: {}'.format(' | '.join([' '.join(a) for a in self._args])))
+
+        input_file = open(stdin, 'rb') if isinstance(stdin, str) else stdin
+        try:
+            previous_stdout = input_file
+            for idx, args in enumerate(self._args):
+                process = sp.Popen(args, stdin=previous_stdout, stdout=sp.PIPE, stderr=sp.PIPE, cwd=cwd, env=env)
+                if idx > 0:
+                    # The next command is the only reader, so that the previous one gets SIGPIPE if it exits
+                    previous_stdout.close()
+                previous_stdout = process.stdout
+                self._processes.append(process)
+                thread = threading.Thread(target=_capture, args=(process.stderr, self._stderr[idx]))
+                thread.daemon = True
+                thread.start()
+                self._stderr_threads.append(thread)
+        except Exception:
+            self.terminate()
+            raise
+        finally:
+            if isinstance(stdin, str):
+                input_file.close()
+        self._stdout = io.BufferedReader(ThreadedReader(previous_stdout, _BLOCK_SIZE, _QUEUE_SIZE),
+                                         buffer_size=_BLOCK_SIZE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            # The output is no longer consumed
+            self.terminate()
+        else:
+            self.close()
+            self.check()
+
+    @property
+    def stdout(self):
+        """Binary file object of the output of the last command"""
+        return self._stdout
+
+    def poll(self):
+        """
+        :return: return code of each command, None for running ones
+        """
+        return [p.poll() for p in self._processes]
+
+    def wait(self, timeout=None):
+        """
+        Wait for all commands to exit
+        :param timeout: in seconds
+        :return: return code of each command
+        """
+        return_codes = [p.wait(timeout) for p in self._processes]
+        for thread in self._stderr_threads:
+            thread.join()
+        return return_codes
+
+    def get_errors(self):
+        """
+        :return: error output of each command
+        """
+        return [b''.join(e).decode('utf-8', 'replace') for e in self._stderr]
+
+    def check(self):
+        """Wait for all commands to exit and raise an error if any failed"""
+        return_codes = self.wait()
+        for args, return_code, error in zip(self._args, return_codes, self.get_errors()):
+            # Commands stopped because their output was no longer read did not fail
+            if return_code != 0 and return_code != _SIGPIPE_RETURN_CODE:
+                logger.error('Command {} failed with code {}: {}'.format(args, return_code, error))
+                raise CommandError(return_code, args, error)
+
+    def close(self):
+        """Close the output stream, once it has been consumed"""
+        if self._stdout is not None and not self._stdout.closed:
+            self._stdout.close()
+
+    def terminate(self):
+        """Stop all commands, e.g. when their output is no longer consumed"""
+        for p in self._processes:
+            if p.poll() is None:
+                p.terminate()
+        self.close()
+        for p in self._processes:
+            p.wait()
+
+
+def _capture(stream, buffer, max_size=_MAX_STDERR_SIZE):
+    """Read a stream until its end, keeping its last bytes only"""
+    size = 0
+    for line in iter(stream.readline, b''):
+        buffer.append(line)
+        size += len(line)
+        while size > max_size and len(buffer) > 1:
+            size -= len(buffer.popleft())
+    stream.close()
+
+
 def execute_piped_commands(cmd):
     """
     Helper function for running piped Linux commands easily
-    :param cmd:
-    :return:
-    """
-    procs = []
-    for n in range(len(cmd)):
-        subprocess_cmd = cmd[n].split(" ")
-        if n == 0:
-            procs.append(sp.Popen(subprocess_cmd, stdout=sp.PIPE))
-        elif n == len(cmd)-1:
-            out = sp.check_output(subprocess_cmd, stdin=procs[-1].stdout)
-        else:
-            procs.append(sp.Popen(subprocess_cmd, stdin=procs[-1].stdout, stdout=sp.PIPE))
+    :param cmd: list of commands
+    :return: output of the last command
+    """
+    with CommandPipeline(cmd) as pipeline:
+        out = pipeline.stdout.read()
     return out
@@ -0,0 +1,178 @@
+import bz2
+import gzip
+import io
+import logging
+import os
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+    logger.debug("zstandard is not installed. Zstandard compressed files won't be supported")
+
+_EXTENSIONS = {'.gz': 'gzip', '.gzip': 'gzip', '.bz2': 'bz2', '.zst': 'zstd', '.zstd': 'zstd', '.xz': 'xz'}
+_MAGIC_NUMBERS = [(b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\x28\xb5\x2f\xfd', 'zstd'), (b'\xfd7zXZ\x00', 'xz')]
+_BLOCK_SIZE = 1 << 20  # size of the decompressed blocks (bytes)
+_QUEUE_SIZE = 8  # number of decompressed blocks buffered ahead of the parser
+
+
+def detect_compression(filename, use_magic_number=True):
+    """
+    Detect the compression of a file from its extension or, for existing files, from its magic number
+    :param filename:
+    :param use_magic_number: if False, only rely on the file extension
+    :return: 'gzip', 'bz2', 'zstd', 'xz' or None if the file is not compressed
+    """
+    compression = _EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+    if compression is None and use_magic_number and os.path.isfile(filename):
+        with open(filename, 'rb') as f:
+            header = f.read(6)
+        for magic, name in _MAGIC_NUMBERS:
+            if header.startswith(magic):
+                compression = name
+                break
+    return compression
+
+
+def open_compressed(filename, mode='rb', compression='infer', level=None):
+    """
+    Open a (possibly compressed) file in binary mode
+    :param filename:
+    :param mode: 'rb', 'wb' or 'ab'
+    :param compression: 'infer', None, 'gzip', 'bz2', 'zstd' or 'xz'
+    :param level: compression level, only used for writing
+    :return: file object
+    """
+    is_writing = mode[0] in 'wa'
+    if compression == 'infer':
+        # Files being written are identified by their extension only
+        compression = detect_compression(filename, use_magic_number=not is_writing)
+
+    if compression is None:
+        return open(filename, mode)
+    elif compression == 'gzip':
+        return gzip.open(filename, mode, **({'compresslevel': level} if is_writing and level is not None else {}))
+    elif compression == 'bz2':
+        return bz2.BZ2File(filename, mode, **({'compresslevel': level} if is_writing and level is not None else {}))
+    elif compression == 'xz':
+        if lzma is None:
+            raise ValueError('xz compression is not supported by this Python version')
+        return lzma.open(filename, mode, **({'preset': level} if is_writing and level is not None else {}))
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise ValueError('zstandard is required for reading or writing Zstandard compressed files')
+        fh = open(filename, mode)
+        if is_writing:
+            cctx = zstandard.ZstdCompressor(**({'level': level} if level is not None else {}))
+            return cctx.stream_writer(fh, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(fh, closefd=True)
+    raise ValueError('Unsupported compression: {}'.format(compression))
+
+
+class ThreadedReader(io.RawIOBase):
+    """
+    Read-only binary stream filled by a background thread. The thread decompresses blocks ahead of the consumer,
+    so that decompression (which releases the GIL) overlaps with parsing.
+    """
+
+    def __init__(self, fileobj, block_size=_BLOCK_SIZE, queue_size=_QUEUE_SIZE):
+        super(ThreadedReader, self).__init__()
+        self._fileobj = fileobj
+        self._block_size = block_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._buffer = b''
+        self._eof = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _fill(self):
+        try:
+            while not self._stop.is_set():
+                block = self._fileobj.read(self._block_size)
+                self._put(block)
+                if not block:
+                    break
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        # Do not block forever if the consumer has been closed
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._eof:
+            item = self._queue.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self._eof = True
+            self._buffer = item
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._fileobj.close()
+        super(ThreadedReader, self).close()
+
+
+def open_stream(filename, compression='infer', threaded=True):
+    """
+    Open a (possibly compressed) file for streaming reads. Decompression runs in a separate thread by default
+    :param filename:
+    :param compression:
+    :param threaded:
+    :return: buffered binary file object
+    """
+    fileobj = open_compressed(filename, 'rb', compression)
+    if threaded:
+        return io.BufferedReader(ThreadedReader(fileobj), buffer_size=_BLOCK_SIZE)
+    return fileobj
+
+
+def count_lines(filename, compression='infer'):
+    """
+    Count the lines of a (possibly compressed) file without materializing it
+    :param filename:
+    :param compression:
+    :return: num_lines
+    """
+    num_lines = 0
+    last_block = b''
+    with open_stream(filename, compression) as f:
+        block = f.read(_BLOCK_SIZE)
+        while block:
+            num_lines += block.count(b'\n')
+            last_block = block
+            block = f.read(_BLOCK_SIZE)
+    # The last line might not end with a line break
+    if last_block and not last_block.endswith(b'\n'):
+        num_lines += 1
+    return num_lines
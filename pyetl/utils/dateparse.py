@@ -0,0 +1,298 @@
+import re
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+
+# Fixed layouts: strptime formats made of fixed-width numeric fields and literal characters only, e.g. '%Y-%m-%d',
+# possibly followed by a fraction of seconds ('.%f')
+FixedLayout = namedtuple('FixedLayout', ['fields', 'literals', 'length', 'has_date', 'has_time', 'has_fraction'])
+
+_FIELD_WIDTHS = {'%Y': 4, '%y': 2, '%m': 2, '%d': 2, '%H': 2, '%M': 2, '%S': 2}
+_DATE_FIELDS = {'%Y', '%y', '%m', '%d'}
+_TIME_FIELDS = {'%H', '%M', '%S'}
+_LAYOUT_CACHE = {}
+_FRACTION_SUFFIX = '.%f'
+_DATETIME_FORMAT_CACHE = {}
+# Pattern letters of Java style datetime formats and their strptime directives
+_JAVA_DIRECTIVES = {'y': '%Y', 'Y': '%Y', 'M': '%m', 'd': '%d', 'D': '%j', 'H': '%H', 'k': '%H', 'h': '%I', 'K': '%I',
+                    'm': '%M', 's': '%S', 'a': '%p', 'E': '%a'}
+_MAX_FRACTION_DIGITS = 6
+# Number of days of each month, index 0 being used for invalid months
+_DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+# Columns whose first values are mostly repeated are parsed through their distinct values
+_MEMO_SAMPLE_SIZE = 1000
+_MEMO_MAX_UNIQUE_RATIO = 0.5
+
+
+def compile_layout(input_format):
+    """
+    Compile a strptime format into a fixed layout. Layouts are memoized by format
+    :param input_format: e.g. '%Y-%m-%d %H:%M:%S'
+    :return: FixedLayout, None if the format has variable-width fields (e.g. month names). A trailing fraction of
+        seconds is optional in parsed values
+    """
+    if input_format not in _LAYOUT_CACHE:
+        fields, literals, offset = [], [], 0
+        has_fraction = input_format.endswith(_FRACTION_SUFFIX)
+        for token in re.findall(r'%.|[^%]', input_format[:-len(_FRACTION_SUFFIX)] if has_fraction else input_format):
+            if token in _FIELD_WIDTHS:
+                fields.append((token, offset, _FIELD_WIDTHS[token]))
+                offset += _FIELD_WIDTHS[token]
+            elif token == '%%' or (not token.startswith('%') and ord(token) < 128):
+                literals.append((offset, ord(token[-1])))
+                offset += 1
+            else:
+                offset = None
+                break
+        directives = {f[0] for f in fields}
+        _LAYOUT_CACHE[input_format] = None if offset is None or not len(fields) else FixedLayout(
+            fields, literals, offset, bool(directives & _DATE_FIELDS), bool(directives & _TIME_FIELDS), has_fraction)
+    return _LAYOUT_CACHE[input_format]
+
+
+def parse_fixed_layout(values, layout):
+    """
+    Parse text data laid out with a fixed layout by slicing fixed-width byte arrays. Invalid values, e.g. missing
+    values or out-of-range fields, are NaT
+    :param values: numpy array of strings, missing values being empty strings
+    :param layout: FixedLayout
+    :return: numpy datetime64[s] array for dates and timestamps, timedelta64[s] array for times. None if values
+        cannot be represented as ASCII bytes
+    """
+    n = layout.length
+    # One more byte than the layout (and its optional fraction) to detect longer values
+    width = n + 1 + (1 + _MAX_FRACTION_DIGITS if layout.has_fraction else 0)
+    try:
+        raw = np.asarray(values, dtype='S{}'.format(width))
+    except UnicodeEncodeError:
+        return None
+    matrix = raw.view(np.uint8).reshape(len(raw), width)
+    is_valid = matrix[:, width - 1] == 0
+    if layout.has_fraction:
+        microseconds, is_valid_fraction = _parse_fraction(matrix, n)
+        is_valid &= is_valid_fraction
+    else:
+        is_valid &= matrix[:, n] == 0
+    for offset, char in layout.literals:
+        is_valid &= matrix[:, offset] == char
+
+    # Characters which are not digits wrap around to values greater than 9. Digits are transposed so that each
+    # character position is contiguous in memory
+    digits = np.ascontiguousarray((matrix[:, :n] - np.uint8(ord('0'))).T)
+    fields = {}
+    for directive, offset, width in layout.fields:
+        value = np.zeros(len(raw), dtype=np.int64)
+        for k in range(offset, offset + width):
+            is_valid &= digits[k] <= 9
+            value = value * 10 + digits[k]
+        fields[directive] = value
+
+    seconds = fields.get('%H', 0) * 3600 + fields.get('%M', 0) * 60 + fields.get('%S', 0)
+    if layout.has_time:
+        is_valid &= (fields.get('%H', 0) < 24) & (fields.get('%M', 0) < 60) & (fields.get('%S', 0) < 60)
+    if not layout.has_date:
+        out = np.zeros(len(raw), dtype=np.int64) + seconds
+        out = (out * 10 ** 6 + microseconds).view('m8[us]') if layout.has_fraction else out.view('m8[s]')
+        out[~is_valid] = np.timedelta64('NaT')
+        return out
+
+    if '%y' in fields:
+        # Two-digit years follow the POSIX convention: 69-99 are 1969-1999, 00-68 are 2000-2068
+        year = np.where(fields['%y'] < 69, 2000, 1900) + fields['%y']
+    else:
+        year = fields.get('%Y', np.full(len(raw), 1970, dtype=np.int64))
+    month = fields.get('%m', 1)
+    day = fields.get('%d', 1)
+    is_leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    is_valid &= (month >= 1) & (month <= 12) & (day >= 1)
+    is_valid &= day <= _DAYS_IN_MONTH[np.where(is_valid, month, 0)] + ((month == 2) & is_leap)
+    out = _days_from_civil(year, month, day) * 86400 + seconds
+    out = (out * 10 ** 6 + microseconds).view('M8[us]') if layout.has_fraction else out.view('M8[s]')
+    out[~is_valid] = np.datetime64('NaT')
+    return out
+
+
+def _parse_fraction(matrix, offset):
+    """
+    Parse an optional fraction of seconds, e.g. '.0' or '.123456', starting at a given character position
+    :return: microseconds, validity flags
+    """
+    is_end = matrix[:, offset] == 0
+    is_valid = is_end | (matrix[:, offset] == ord('.'))
+    microseconds = np.zeros(len(matrix), dtype=np.int64)
+    for k in range(offset + 1, offset + 1 + _MAX_FRACTION_DIGITS):
+        is_end |= matrix[:, k] == 0
+        digit = matrix[:, k] - np.uint8(ord('0'))
+        is_valid &= is_end | (digit <= 9)
+        microseconds = microseconds * 10 + np.where(is_end, 0, digit)
+    return microseconds, is_valid
+
+
+def _days_from_civil(year, month, day):
+    """Number of days since 1970-01-01 of proleptic Gregorian dates, see http://howardhinnant.github.io/date_algorithms.html"""
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def parse_strptime(values, input_format):
+    """Parse text data with any strptime format, through pandas"""
+    out = pd.to_datetime(pd.Series(values, dtype=object), format=input_format, errors='coerce').values
+    layout_has_date = bool(set(re.findall(r'%.', input_format)) & (_DATE_FIELDS | {'%b', '%B', '%j'}))
+    if not layout_has_date:
+        # Times are durations since midnight
+        out = out - np.datetime64('1900-01-01')
+    return out
+
+
+def parse_time_objects(values):
+    """Convert datetime.time objects to durations since midnight, keeping their microseconds"""
+    is_missing = pd.isnull(values)
+    microseconds = np.array([0 if m else ((t.hour * 60 + t.minute) * 60 + t.second) * 1000000 + t.microsecond
+                             for t, m in zip(values, is_missing)], dtype=np.int64)
+    out = microseconds.astype('timedelta64[us]')
+    out[is_missing] = np.timedelta64('NaT')
+    return out
+
+
+class DatetimeParser(object):
+    """
+    Parser of a datetime variable. The parsing method is decided on the first call only, so that it is shared by
+    all the chunks of the variable read by a data source iterator:
+    - data which is already datetime data is returned as it is
+    - datetime and date objects, e.g. returned by database drivers, are converted with pandas
+    - time objects are converted to durations since midnight
+    - numeric data is converted from epochs, the format being the unit (e.g. 's')
+    - text data with a fixed layout is parsed by slicing byte arrays, other text data with pandas
+    Columns with mostly repeated values are parsed through their distinct values.
+    """
+
+    def __init__(self, input_format, fixed_width=True):
+        """
+        :param input_format: strptime format or, for numeric data, epoch unit
+        :param fixed_width: False if numeric fields might not be zero-padded, which prevents fixed layout parsing
+        """
+        self._input_format = input_format
+        self._fixed_width = fixed_width
+        self._method = None
+
+    def get_method(self):
+        return self._method
+
+    def __call__(self, var):
+        is_series = isinstance(var, pd.Series)
+        values = var.values if is_series else np.asarray(var)
+        if self._method is None:
+            self._method = self._decide_method(values)
+
+        if self._method == 'datetime':
+            return var
+        if self._method == 'unit':
+            out = pd.to_datetime(pd.to_numeric(values, errors='coerce'), unit=self._input_format, errors='coerce')
+        elif self._method == 'objects':
+            out = pd.to_datetime(values, errors='coerce')
+        elif self._method == 'time':
+            out = parse_time_objects(values)
+        else:
+            out = self._parse_text(np.asarray(values, dtype=object))
+        if is_series:
+            return pd.Series(out, index=var.index, name=var.name)
+        return out
+
+    def _decide_method(self, values):
+        if pd.api.types.is_datetime64_any_dtype(values) or pd.api.types.is_timedelta64_dtype(values):
+            return 'datetime'
+        if pd.api.types.infer_dtype(values, skipna=True) in ('datetime', 'datetime64', 'date'):
+            # datetime or date objects, e.g. as returned by database drivers, are not text to be parsed
+            return 'objects'
+        if pd.api.types.infer_dtype(values, skipna=True) == 'time':
+            # time objects are durations since midnight, as times parsed from text
+            return 'time'
+        if '%' not in self._input_format:
+            return 'unit'
+        is_fixed = self._fixed_width and compile_layout(self._input_format) is not None
+        return 'fixed' if is_fixed else 'strptime'
+
+    def _parse_text(self, values):
+        is_missing = pd.isnull(values)
+        sample = values[:_MEMO_SAMPLE_SIZE]
+        if len(values) > _MEMO_SAMPLE_SIZE and len(pd.unique(sample)) <= _MEMO_MAX_UNIQUE_RATIO * len(sample):
+            # Parse each distinct value once
+            codes, uniques = pd.factorize(values)
+            if not len(uniques):
+                return self._parse_values(np.array([''] * len(values), dtype=object))
+            parsed = self._parse_values(np.asarray(uniques, dtype=object))
+            out = parsed.take(codes)
+            out[codes < 0] = parsed.dtype.type('NaT')
+            return out
+        if is_missing.any():
+            values = np.where(is_missing, '', values)
+        return self._parse_values(values)
+
+    def _parse_values(self, values):
+        if self._method == 'fixed':
+            out = parse_fixed_layout(values, compile_layout(self._input_format))
+            if out is not None:
+                return out
+        return parse_strptime(values, self._input_format)
+
+
+def compile_datetime_format(datetime_format):
+    """
+    Translate a dictionary datetime format, i.e. a Java (SimpleDateFormat) style format such as 'dd/MM/yyyy',
+    'ddMMMyyyy:HH:mm:ss' or 'yyyy-MM-dd HH:mm:ss.0', into a strptime format. Translations are memoized by format
+    :param datetime_format:
+    :return: strptime format, flag indicating if numeric fields have a fixed width. None if the format is not supported
+    """
+    if datetime_format not in _DATETIME_FORMAT_CACHE:
+        _DATETIME_FORMAT_CACHE[datetime_format] = _translate_datetime_format(datetime_format)
+    return _DATETIME_FORMAT_CACHE[datetime_format]
+
+
+def _translate_datetime_format(datetime_format):
+    # Quoted literals, runs of the same pattern letter or any other literal character
+    tokens = [m.group(0) for m in re.finditer(r"'(?:[^']|'')*'|([A-Za-z])\1*|.", datetime_format)]
+    # Without AM/PM marker, hours in 1-12 (h) are assumed to be hours of the day, as in SAS TIME formats
+    has_am_pm = any([t.startswith('a') for t in tokens])
+    strptime_format, is_fixed_width = [], True
+    for idx, token in enumerate(tokens):
+        letter, num_letters = token[0], len(token)
+        if letter == "'":
+            strptime_format.append(token[1:-1].replace("''", "'").replace('%', '%%') if num_letters > 2 else "'")
+        elif letter == '.' and re.match(r'(0+|S+)$', ''.join(tokens[idx + 1:])):
+            # Trailing fraction of seconds, e.g. '.0' as written by JDBC drivers
+            strptime_format.append(_FRACTION_SUFFIX)
+            break
+        elif letter in _JAVA_DIRECTIVES:
+            directive = _JAVA_DIRECTIVES[letter]
+            if letter in 'yY':
+                directive = '%y' if num_letters == 2 else '%Y'
+            elif letter == 'M' and num_letters >= 3:
+                directive = '%b' if num_letters == 3 else '%B'
+            elif letter == 'E':
+                directive = '%a' if num_letters <= 3 else '%A'
+            elif letter in 'hK':
+                directive = '%I' if has_am_pm else '%H'
+            if directive in _FIELD_WIDTHS and num_letters < _FIELD_WIDTHS[directive]:
+                # Numbers are not zero-padded
+                is_fixed_width = False
+            strptime_format.append(directive)
+        elif letter.isalpha():
+            return None
+        else:
+            strptime_format.append('%%' if letter == '%' else letter)
+    return ''.join(strptime_format), is_fixed_width
+
+
+def parse_datetime(var, input_format):
+    """
+    Parse datetime data with a strptime format or, for numeric data, an epoch unit
+    :param var: pandas.Series or numpy array
+    :param input_format:
+    :return: datetime data of the same container type
+    """
+    return DatetimeParser(input_format)(var)
@@ -0,0 +1,42 @@
+import os
+import re
+import stat
+
+
+def replace_file(src, dst):
+    """Rename a file, overwriting the destination if it exists"""
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def get_umask():
+    """File mode creation mask of the process"""
+    try:
+        # Read without changing it, as other threads might be creating files (Linux only)
+        with open('/proc/self/status') as f:
+            match = re.search(r'^Umask:\s*([0-7]+)', f.read(), re.MULTILINE)
+        if match:
+            return int(match.group(1), 8)
+    except (IOError, OSError):
+        pass
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def set_default_mode(filename, target):
+    """
+    Set the permissions of a temporary file about to replace a target file, as those of the target if it exists, or
+    as those of a new file otherwise. Temporary files are otherwise only readable by their owner
+    :param filename: temporary file
+    :param target:
+    """
+    if os.path.exists(target):
+        mode = stat.S_IMODE(os.stat(target).st_mode)
+    else:
+        mode = 0o666 & ~get_umask()
+    os.chmod(filename, mode)
@@ -0,0 +1,113 @@
+import operator
+import numpy as np
+import pandas as pd
+
+# Supported comparison operators for read filters. Filters are expressed as a list of (column, operator, value)
+# tuples which are combined with AND
+_OPERATORS = {
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+_SET_OPERATORS = {'in', 'not in'}
+
+
+def normalize_filters(filters):
+    """
+    Validate read filters and return them as a list of (column, operator, value) tuples
+    :param filters: single tuple or list of tuples
+    :return: filters
+    """
+    if filters is None:
+        return []
+    if isinstance(filters, tuple):
+        filters = [filters]
+
+    out = []
+    for f in filters:
+        if len(f) != 3:
+            raise ValueError('Invalid filter, expected (column, operator, value): {}'.format(f))
+        column, op, value = f
+        op = op.lower().strip()
+        if op not in _OPERATORS and op not in _SET_OPERATORS:
+            raise ValueError('Unsupported filter operator: {}'.format(op))
+        if op in _SET_OPERATORS and not pd.api.types.is_list_like(value):
+            raise ValueError('Operator "{}" expects a list of values'.format(op))
+        out.append((column, op, value))
+    return out
+
+
+def filter_columns(filters):
+    """Names of the columns involved in the filters"""
+    return [f[0] for f in normalize_filters(filters)]
+
+
+def evaluate_predicate(value, op, operand):
+    """
+    Evaluate a single predicate on a scalar value
+    :param value:
+    :param op:
+    :param operand:
+    :return: flag
+    """
+    if op == 'in':
+        return value in operand
+    elif op == 'not in':
+        return value not in operand
+    return _OPERATORS[op](value, operand)
+
+
+def filter_mask(df, filters):
+    """
+    Compute the boolean mask of the rows of a table satisfying all filters
+    :param df: pandas.DataFrame
+    :param filters:
+    :return: mask
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, operand in normalize_filters(filters):
+        col = df[column]
+        if op == 'in':
+            mask &= col.isin(operand).values
+        elif op == 'not in':
+            mask &= ~col.isin(operand).values
+        else:
+            mask &= _OPERATORS[op](col, operand).values
+    return mask
+
+
+def range_may_match(op, operand, min_value, max_value):
+    """
+    Indicate if a block of data whose values lie within [min_value, max_value] may contain rows satisfying the
+    predicate. Used to skip whole blocks (e.g. row groups) from their statistics
+    :param op:
+    :param operand:
+    :param min_value:
+    :param max_value:
+    :return: flag
+    """
+    try:
+        if op in ('=', '=='):
+            return min_value <= operand <= max_value
+        elif op == '!=':
+            return not (min_value == max_value == operand)
+        elif op == '<':
+            return min_value < operand
+        elif op == '<=':
+            return min_value <= operand
+        elif op == '>':
+            return max_value > operand
+        elif op == '>=':
+            return max_value >= operand
+        elif op == 'in':
+            return any(min_value <= v <= max_value for v in operand)
+        elif op == 'not in':
+            return not (min_value == max_value and min_value in operand)
+    except TypeError:
+        # Statistics cannot be compared with the operand, the block has to be read
+        return True
+    return True
@@ -0,0 +1,41 @@
+import importlib
+import sys
+
+
+def lazy_exports(package, exports):
+    """
+    Exports of a package loaded from its submodules on first access (PEP 562), so that importing the package does not
+    import all of its submodules and their dependencies (pandas, pyarrow, database drivers...)
+
+    Example, in a package's __init__.py:
+    ```python
+    from pyetl.utils.lazy import lazy_exports
+
+    __getattr__, __dir__, __all__ = lazy_exports(__name__, [
+        ('.file_datasource', ['FileDataSource']),
+    ])
+    ```
+    :param package: name of the package
+    :param exports: list of (submodule relative to the package, names exported from it)
+    :return: __getattr__, __dir__ and __all__ of the package
+    """
+    origin = dict((name, submodule) for submodule, names in exports for name in names)
+    module = sys.modules[package]
+
+    def __getattr__(name):
+        if name not in origin:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(package, name))
+        value = getattr(importlib.import_module(origin[name], package), name)
+        # Later accesses do not go through __getattr__
+        setattr(module, name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(module)) | set(origin))
+
+    names = [name for _, submodule_names in exports for name in submodule_names]
+    if sys.version_info < (3, 7):
+        # Module __getattr__ is not supported: import eagerly
+        for name in names:
+            __getattr__(name)
+    return __getattr__, __dir__, names
@@ -1,6 +1,13 @@
 import os
+import logging
+import multiprocessing
 import subprocess as sp
+import threading
 import time
+import traceback
+from multiprocessing.pool import ThreadPool
+
+logger = logging.getLogger(__name__)
 
 
 #processFile is the function used to simulate the processing of a single file
@@ -15,9 +22,9 @@ import time
 #Inputs:
 #filename: name of the file to process
 #sleepFactor: factor to apply to the file size for determining the sleep command length
-def processFile(filename, sleepFactor, async=False):
+def processFile(filename, sleepFactor, is_async=False):
     p = sp.Popen(["sleep", str(os.path.getsize(filename) * sleepFactor)])
-    if not async:
+    if not is_async:
         p.wait()
         p.communicate()
         if p.returncode != 0:
@@ -25,29 +32,221 @@ def processFile(filename, sleepFactor, async=False):
     return p
 
 
+class TaskResult(object):
+    """Outcome of a task run by a ParallelProcessor: result or error, worker and timing"""
+    __slots__ = ('index', 'result', 'error', 'traceback', 'worker', 'start_time', 'end_time', 'status')
+
+    def __init__(self, index, result=None, error=None, traceback=None, worker=None, start_time=None, end_time=None,
+                 status='pending'):
+        self.index = index
+        self.result = result
+        self.error = error
+        self.traceback = traceback
+        self.worker = worker
+        self.start_time = start_time
+        self.end_time = end_time
+        self.status = status  # pending, done, failed or cancelled
+
+    def __repr__(self):
+        return 'TaskResult(index={}, status={}, worker={}, elapsed_time={})'.format(
+            self.index, self.status, self.worker, self.elapsed_time)
+
+    @property
+    def elapsed_time(self):
+        return None if self.start_time is None or self.end_time is None else self.end_time - self.start_time
+
+    def is_successful(self):
+        return self.status == 'done'
+
+
+def _run_task(task):
+    """
+    Run a task within a worker. Errors are returned along with the timing rather than raised, so that the worker
+    goes on with the next task
+    """
+    index, function, args, kwargs, cancel_event = task
+    if cancel_event is not None and cancel_event.is_set():
+        return TaskResult(index, status='cancelled')
+    worker = '{}/{}'.format(os.getpid(), threading.current_thread().name)
+    start_time = time.time()
+    try:
+        result = function(*args, **kwargs)
+    except Exception as e:
+        return TaskResult(index, error=e, traceback=traceback.format_exc(), worker=worker, start_time=start_time,
+                          end_time=time.time(), status='failed')
+    return TaskResult(index, result=result, worker=worker, start_time=start_time, end_time=time.time(), status='done')
+
+
 class ParallelProcessor(object):
-    pass
+    """
+    PARALLELPROCESSOR Run tasks, i.e. any callables such as per-file or per-partition ETL steps, on a pool of workers.
+
+    Workers share a single queue of pending tasks: each worker takes the next task as soon as it is idle, so that the
+    load is balanced dynamically however skewed the task sizes are. Tasks are timed, errors are propagated to the
+    caller and pending tasks can be cancelled.
 
+    With the process backend, functions and their parameters have to be picklable, e.g. module-level functions.
 
-def start_task(function, parameters, worker, task, verbose=False, async=False):
+    Example:
+    ```python
+    from pyetl.utils.parallel import ParallelProcessor
+
+    processor = ParallelProcessor(num_workers=4, backend='process')
+    for f in files:
+        processor.submit(convert_file, f, compression='gzip')
+    results = processor.run()
+    ```
+    """
+
+    # properties (Access = private)
+    _num_workers = 1
+    _backend = 'thread'
+    _fail_fast = True
+    _tasks = None  # submitted tasks which have not been run yet: (function, args, kwargs)
+    _results = None  # results of the last run, by task index
+    _cancel_event = None
+    _pool = None
+
+    # methods (Access = public)
+    def __init__(self, num_workers=None, backend='thread', fail_fast=True):
+        """
+        :param num_workers: number of workers, by default the number of CPUs
+        :param backend: 'thread' for I/O bound tasks or tasks releasing the GIL, 'process' for CPU bound tasks
+        :param fail_fast: cancel pending tasks as soon as a task fails
+        """
+        if backend not in ('thread', 'process'):
+            raise ValueError('Unsupported backend: {}'.format(backend))
+        self._num_workers = max(int(num_workers or multiprocessing.cpu_count()), 1)
+        self._backend = backend
+        self._fail_fast = fail_fast
+        self._tasks = []
+        self._results = []
+        self._cancel_event = threading.Event()
+
+    def get_num_workers(self):
+        return self._num_workers
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Add a task to be run by the next call to run()
+        :return: task index
+        """
+        self._tasks.append((function, args, kwargs))
+        return len(self._tasks) - 1
+
+    def map(self, function, iterable):
+        """
+        Run a function on each element of an iterable
+        :return: results, in the order of the input elements
+        """
+        for x in iterable:
+            self.submit(function, x)
+        return [r.result for r in self.run()]
+
+    def run(self, raise_errors=True, schedule=None):
+        """
+        Run all submitted tasks
+        :param raise_errors: raise the error of the first failed task, once running tasks are over
+        :param schedule: Schedule of the tasks based on their estimated costs. Tasks are then queued by decreasing
+            cost, otherwise in submission order
+        :return: list of TaskResult, in submission order
+        """
+        tasks, self._tasks = self._tasks, []
+        order = list(range(len(tasks)))
+        if schedule is not None:
+            order = schedule.get_order()
+            if sorted(order) != list(range(len(tasks))):
+                raise ValueError('The schedule does not match the {} submitted tasks'.format(len(tasks)))
+        self._cancel_event.clear()
+        self._results = [TaskResult(idx) for idx in range(len(tasks))]
+        if not len(tasks):
+            return self._results
+
+        num_workers = min(self._num_workers, len(tasks))
+        is_thread_backend = self._backend == 'thread'
+        # Worker processes cannot share the cancellation event: they are terminated instead
+        cancel_event = self._cancel_event if is_thread_backend else None
+        self._pool = ThreadPool(num_workers) if is_thread_backend else multiprocessing.Pool(num_workers)
+        start = time.time()
+        try:
+            # Tasks are handed out one at a time from the shared queue
+            iterator = self._pool.imap_unordered(
+                _run_task, [(idx,) + tasks[idx] + (cancel_event,) for idx in order], chunksize=1)
+            num_pending = len(tasks)
+            while num_pending and not self._cancel_event.is_set():
+                try:
+                    self._collect(iterator.next(timeout=0.1))
+                except multiprocessing.TimeoutError:
+                    continue
+                num_pending -= 1
+        finally:
+            if self._cancel_event.is_set() and not is_thread_backend:
+                self._pool.terminate()
+            else:
+                self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if is_thread_backend:
+            # Collect the tasks which were running or skipped when the run was cancelled
+            while num_pending:
+                self._collect(iterator.next(timeout=0))
+                num_pending -= 1
+
+        for r in self._results:
+            if r.status == 'pending':
+                r.status = 'cancelled'
+        logger.info('Ran {} task(s) on {} {} worker(s) in {:.2f} seconds'.format(
+            len(tasks), num_workers, self._backend, time.time() - start))
+
+        failed = [r for r in self._results if r.status == 'failed']
+        if raise_errors and len(failed):
+            logger.debug(failed[0].traceback)
+            raise failed[0].error
+        return self._results
+
+    def cancel(self):
+        """Cancel pending tasks. With the thread backend, running tasks are completed"""
+        self._cancel_event.set()
+
+    def get_results(self):
+        """Results of the last run"""
+        return self._results
+
+    def get_execution_times(self):
+        """
+        Execution time of each task of the last run, and busy time of each worker
+        :return: task times (list), worker times (dict)
+        """
+        task_times = [r.elapsed_time for r in self._results]
+        worker_times = {}
+        for r in self._results:
+            if r.elapsed_time is not None:
+                worker_times[r.worker] = worker_times.get(r.worker, 0) + r.elapsed_time
+        return task_times, worker_times
+
+    # methods (Access = private)
+    def _collect(self, result):
+        """Store the result of a task, cancelling pending tasks on failure if required"""
+        self._results[result.index] = result
+        if result.status == 'failed':
+            logger.error('Task #{} failed on worker {}: {}'.format(result.index, result.worker, result.error))
+            if self._fail_fast:
+                self.cancel()
+
+
+def start_task(function, parameters, worker, task, verbose=False):
     """
     Starts a new processing task identified by a task index on a worker identified by a worker index
-    :param fileTable: table of files to process
+    :param function: function starting the task asynchronously and returning the associated process, e.g. processFile
+    :param parameters: parameters of the function
     :param worker: worker index, belongs to the [0, (#workers-1)] range
     :param task: task index, belongs to the [0, (#files-1)] range
     :param verbose:
-    :return:
+    :return: process
     """
-    p = sp.Popen(["sleep", str(os.path.getsize(filename) * sleepFactor)])
-    if not async:
-        p.wait()
-        p.communicate()
-        if p.returncode != 0:
-            raise Exception("Processing task errored")
-
     if verbose:
         print("Worker " + str(worker) + " starting task " + str(task))
-    return p
+    return function(*parameters)
 
 #getNextAssignedTask returns the index of the next task a worker has to run
 #If there are no tasks left to run for the worker, the function returns None
@@ -98,7 +297,8 @@ def parallelProcessing(numFiles, numWorkers, fileTable, sleepFactor, taskAssignm
                     #If the current worker does not have any task assigned yet, start a new one
                     if verbose:
                         print("Worker " + str(idx) + ": no task assigned yet")
-                    currentProcess[idx] = start_task(fileTable, sleepFactor, idx, currentTask[idx])
+                    currentProcess[idx] = start_task(
+                        processFile, (fileTable[currentTask[idx]], sleepFactor, True), idx, currentTask[idx], verbose)
                 else:
                     #Otherwise investigate the running process
                     p = currentProcess[idx]
@@ -120,11 +320,15 @@ def parallelProcessing(numFiles, numWorkers, fileTable, sleepFactor, taskAssignm
                         currentTask[idx] = getNextAssignedTask(currentTask[idx], taskAssignment[idx])
                         if currentTask[idx] is not None:
                             #If there is a task left to run, start it
-                            currentProcess[idx] = start_task(fileTable, sleepFactor, idx, currentTask[idx])
+                            currentProcess[idx] = start_task(
+                                processFile, (fileTable[currentTask[idx]], sleepFactor, True), idx, currentTask[idx],
+                                verbose)
                         else:
                             #Otherwise it means that the worker has completed all its tasks
                             #Save the execution time
                             execTimeWorkers[idx] = time.time() - start
+        #Do not spin while all workers are busy
+        time.sleep(0.01)
     #Before exiting, we check that execution went well by comparing the taskAssignment and tasksCompleted variables
     #which are supposed to be equal
     for idx in range(0, numWorkers):
@@ -1,5 +1,7 @@
 from pyetl.utils.cmd import subprocess_cmd
+from pyetl.utils.compression import detect_compression, count_lines
 import logging
+import os
 import re
 
 logger = logging.getLogger(__name__)
@@ -18,6 +20,11 @@ def rowcount(filename):
 
 def rowcount_single_file(filename):
     """Run row count computation"""
+    # Compressed files are decompressed on the fly, without being written to disk
+    # PowerShell is only available on Windows
+    if detect_compression(filename) is not None or os.name != 'nt':
+        return count_lines(filename)
+
     result = subprocess_cmd("Powershell.exe -Command \"Get-content '{}' | Measure-Object –Line\"".format(filename))
     if len(result.get('errors')):
         logger.error('Could not determine number of rows in file: {}'.format(filename))
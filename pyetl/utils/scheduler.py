@@ -0,0 +1,125 @@
+import heapq
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Schedule(object):
+    """
+    SCHEDULE Assignment of tasks with estimated costs (e.g. file sizes or row counts) to workers.
+
+    Built with the longest-processing-time-first rule: tasks are taken by decreasing cost and each one is assigned to
+    the least loaded worker. The predicted makespan is then at most 4/3 of the optimal one. Run by a
+    ParallelProcessor, tasks are queued in the same order so that idle workers take the largest remaining task.
+
+    Example:
+    ```python
+    from pyetl.utils.parallel import ParallelProcessor
+    from pyetl.utils.scheduler import Schedule
+
+    schedule = Schedule([os.path.getsize(f) for f in files], num_workers=4)
+    processor = ParallelProcessor(num_workers=4)
+    for f in files:
+        processor.submit(process_file, f)
+    processor.run(schedule=schedule)
+    print(schedule.report(processor))
+    ```
+    """
+
+    # properties (Access = private)
+    _costs = None
+    _num_workers = 1
+    _assignment = None  # task indexes assigned to each worker, in execution order
+    _loads = None  # predicted load of each worker
+
+    # methods (Access = public)
+    def __init__(self, costs, num_workers):
+        """
+        :param costs: estimated cost of each task, in any unit proportional to its execution time
+        :param num_workers:
+        """
+        self._costs = np.asarray(costs, dtype=float)
+        if np.any(self._costs < 0) or np.any(np.isnan(self._costs)):
+            raise ValueError('Task costs are expected to be non-negative numbers')
+        self._num_workers = max(int(num_workers), 1)
+        self._assignment, self._loads = _longest_processing_time_first(self._costs, self._num_workers)
+
+    def __repr__(self):
+        return 'Schedule({} tasks, {} workers, predicted makespan={})'.format(
+            len(self._costs), self._num_workers, self.get_predicted_makespan())
+
+    def get_order(self):
+        """Task indexes by decreasing cost, i.e. the order in which tasks are to be started"""
+        return [int(i) for i in np.argsort(-self._costs, kind='mergesort')]
+
+    def get_assignment(self):
+        """Task indexes assigned to each worker"""
+        return self._assignment
+
+    def get_predicted_loads(self):
+        return list(self._loads)
+
+    def get_predicted_makespan(self):
+        """Predicted makespan, in cost units"""
+        return max(self._loads) if len(self._loads) else 0.
+
+    def report(self, processor):
+        """
+        Compare the prediction with the last run of a processor. Costs are converted to seconds with the average
+        execution time per cost unit
+        :param processor: ParallelProcessor which ran the tasks
+        :return: dict with predicted and actual makespans (in seconds) and utilization of each worker
+        """
+        results = processor.get_results()
+        started = [r for r in results if r.elapsed_time is not None]
+        if not len(started):
+            raise ValueError('No task has been run')
+        actual_makespan = max([r.end_time for r in started]) - min([r.start_time for r in started])
+        busy_time = sum([r.elapsed_time for r in started])
+        total_cost = sum([self._costs[r.index] for r in started])
+        seconds_per_cost = busy_time / total_cost if total_cost > 0 else 0.
+
+        _, worker_times = processor.get_execution_times()
+        predicted_makespan = self.get_predicted_makespan()
+        return {
+            'predicted_makespan': float(predicted_makespan * seconds_per_cost),
+            'actual_makespan': actual_makespan,
+            'predicted_utilization': [float(l / predicted_makespan) if predicted_makespan else 1. for l in self._loads],
+            'worker_utilization': {w: t / actual_makespan if actual_makespan else 1. for w, t in worker_times.items()},
+        }
+
+
+def pack_tasks(costs, capacity):
+    """
+    Group tasks into batches whose cost does not exceed a capacity (first-fit decreasing bin packing), e.g. to run
+    many small files as a single task
+    :param costs: estimated cost of each task
+    :param capacity: maximum cost of a batch, tasks costing more are alone in their batch
+    :return: list of batches of task indexes
+    """
+    costs = np.asarray(costs, dtype=float)
+    batches, batch_costs = [], []
+    for idx in np.argsort(-costs, kind='mergesort'):
+        for b in range(len(batches)):
+            if batch_costs[b] + costs[idx] <= capacity:
+                batches[b].append(int(idx))
+                batch_costs[b] += costs[idx]
+                break
+        else:
+            batches.append([int(idx)])
+            batch_costs.append(costs[idx])
+    return batches
+
+
+def _longest_processing_time_first(costs, num_workers):
+    """Assign tasks by decreasing cost to the least loaded worker"""
+    assignment = [[] for _ in range(num_workers)]
+    loads = [0.] * num_workers
+    heap = [(0., w) for w in range(num_workers)]
+    for idx in np.argsort(-costs, kind='mergesort'):
+        load, worker = heapq.heappop(heap)
+        assignment[worker].append(int(idx))
+        loads[worker] = load + costs[idx]
+        heapq.heappush(heap, (loads[worker], worker))
+    return assignment, loads
@@ -0,0 +1,120 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Quoted literals, embedded quotes being escaped by doubling them
+_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+_FROM_PATTERN = re.compile(r'\b(FROM|JOIN)\b', re.IGNORECASE)
+# Schema-qualified table name, optionally followed by an alias, e.g. MYSCHEMA.MYTABLE AS T
+_TABLE_PATTERN = re.compile(
+    r'\s*((?:"[^"]+"|[A-Z_][\w$]*)\.(?:"[^"]+"|[A-Z_][\w$]*))'
+    r'(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|USING|INNER|LEFT|RIGHT|FULL|CROSS|NATURAL|GROUP|ORDER|LIMIT|UNION|'
+    r'INTERSECT|EXCEPT|HAVING|OFFSET)\b)[A-Z_][\w$]*)?\s*', re.IGNORECASE)
+
+
+def to_sql_literals(values):
+    """
+    Render values as SQL literals, column-wise rather than element by element:
+    - numbers as they are, booleans as TRUE/FALSE
+    - dates and timestamps as quoted ISO strings, e.g. '2020-01-31' or '2020-01-31 12:30:00'
+    - text as quoted strings, embedded quotes being escaped
+    Missing values are rendered as NULL
+    :param values: list-like of values of the same type
+    :return: numpy array of literals
+    """
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values.reset_index(drop=True)
+    if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) in ('date', 'datetime', 'datetime64'):
+        # Python dates and datetimes
+        values = pd.to_datetime(values)
+    is_missing = values.isnull().values
+
+    if pd.api.types.is_bool_dtype(values):
+        literals = np.where(values.values.astype(bool), 'TRUE', 'FALSE').astype(object)
+    elif pd.api.types.is_numeric_dtype(values):
+        if pd.api.types.is_float_dtype(values):
+            numbers = values.to_numpy(dtype=float, na_value=np.nan)
+            is_finite = np.isfinite(numbers)
+            if not np.mod(numbers[is_finite], 1).any() and (np.abs(numbers[is_finite]) < 2. ** 63).all():
+                # Integers with missing values, within the range of 64-bit integers
+                literals = np.where(is_finite, numbers, 0).astype(np.int64).astype(str).astype(object)
+            else:
+                literals = numbers.astype(str).astype(object)
+            # Infinite values have no numeric literal
+            literals[numbers == np.inf] = "CAST('Infinity' AS FLOAT)"
+            literals[numbers == -np.inf] = "CAST('-Infinity' AS FLOAT)"
+        else:
+            literals = values.values.astype(str).astype(object)
+    elif pd.api.types.is_datetime64_any_dtype(values):
+        datetimes = values.values.astype('M8[us]')
+        # Dates are rendered without time of day, timestamps with their time of day (and fraction of seconds)
+        is_date = not (datetimes[~is_missing] - datetimes[~is_missing].astype('M8[D]')).any()
+        has_fraction = not is_date and bool((datetimes[~is_missing] - datetimes[~is_missing].astype('M8[s]')).any())
+        unit = 'D' if is_date else 'us' if has_fraction else 's'
+        literals = np.char.add(np.char.add("'", np.datetime_as_string(datetimes, unit=unit)), "'").astype(object)
+        if not is_date:
+            literals = pd.Series(literals).str.replace('T', ' ', n=1, regex=False).values
+    else:
+        text = values.astype(str).str.replace("'", "''", regex=False)
+        literals = ("'" + text + "'").values.astype(object)
+
+    literals[is_missing] = 'NULL'
+    return literals
+
+
+def render_in_list(values):
+    """
+    Render values as the list of an IN condition, e.g. ('A', 'B')
+    :param values:
+    :return: statement
+    """
+    return '({})'.format(', '.join(to_sql_literals(values)))
+
+
+def normalize_query(query):
+    """
+    Normalize a query so that equivalent spellings compare equal: whitespace outside of quoted literals and
+    identifiers is collapsed to single spaces, and a trailing semicolon is removed
+    :param query:
+    :return: normalized query
+    """
+    parts = []
+    quote = None
+    is_space = False
+    for c in query.strip().rstrip(';').strip():
+        if quote is None and c.isspace():
+            is_space = True
+            continue
+        if is_space:
+            parts.append(' ')
+            is_space = False
+        if quote is None and c in ('"', "'"):
+            quote = c
+        elif c == quote:
+            # Escaped quotes ('') end and reopen the literal
+            quote = None
+        parts.append(c)
+    return ''.join(parts)
+
+
+def get_referenced_tables(query):
+    """
+    Tables a query reads from: the schema-qualified tables following FROM (comma-separated lists included) and JOIN
+    keywords, including those of subqueries
+    :param query:
+    :return: list of table names in upper case, None if any FROM or JOIN is not followed by a table name, e.g. a
+        subquery in a FROM clause, as the tables read cannot be determined reliably
+    """
+    text = _LITERAL_PATTERN.sub("''", query)
+    tables = []
+    for keyword in _FROM_PATTERN.finditer(text):
+        pos = keyword.end()
+        while True:
+            match = _TABLE_PATTERN.match(text, pos)
+            if match is None:
+                return None
+            tables.append(match.group(1).upper())
+            pos = match.end()
+            if keyword.group(1).upper() != 'FROM' or not text.startswith(',', pos):
+                break
+            pos += 1
+    return sorted(set(tables))
@@ -4,5 +4,14 @@ import numpy as np
 def string_concat(*args):
     buffer = ''
     for a in args:
-        buffer = np.core.defchararray.add(buffer, a)
+        buffer = np.char.add(buffer, a)
     return buffer
+
+
+# Text representations of boolean values, in lower case
+BOOLEAN_STRINGS = {'true': True, 'false': False, 't': True, 'f': False, 'yes': True, 'no': False, 'y': True, 'n': False}
+
+
+def str_to_bool(var):
+    """Convert text data to booleans, values which do not represent booleans being missing"""
+    return var.astype(str).str.strip().str.lower().map(BOOLEAN_STRINGS)